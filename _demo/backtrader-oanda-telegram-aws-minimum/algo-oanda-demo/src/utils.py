@@ -1,5 +1,9 @@
 import logging
 import json
+import time
+import atexit
+import threading
+from collections import deque
 import requests
 
 # logger
@@ -17,6 +21,14 @@ TELEGRAM_TOKEN = d_telegram_config['telegram_api_token']
 TELEGRAM_API_URL = f'https://api.telegram.org/bot{TELEGRAM_TOKEN}/'
 CHAT_ID = d_telegram_config['telegram_chat_id']
 
+# notifier
+TELEGRAM_MAX_CHARS = 4096 # telegram message length limit
+NOTIFIER_QUEUE_SIZE = 1000 # messages waiting to be sent, beyond that the least important are dropped
+NOTIFIER_BATCH_SECONDS = 1.0 # messages of a burst within this window are sent as one, telegram allows ~1 / s per chat
+NOTIFIER_TIMEOUT_SECONDS = 10
+NOTIFIER_MAX_RETRIES = 5
+NOTIFIER_MAX_BACKOFF_SECONDS = 60
+
 # Function to send a message to telegram
 def send_telegram(text: str, chat_id: str=CHAT_ID) -> requests.models.Response:
     payload = {
@@ -25,12 +37,194 @@ def send_telegram(text: str, chat_id: str=CHAT_ID) -> requests.models.Response:
     }
     return requests.post(TELEGRAM_API_URL + 'sendMessage', data=payload)
 
+
+class TelegramNotifier:
+    """
+    Send messages to telegram from a background thread, the caller never waits on the network.
+
+    * Messages are put in a bounded queue. When it is full, the oldest message below `priority_level` is dropped
+      to make room, or the new message if it is below `priority_level` too. The number of dropped messages is
+      reported in the next message sent.
+    * The worker thread waits `batch_seconds` after the first message of a burst, and sends everything queued
+      meanwhile as one message (split at `max_chars`), over one keep-alive session.
+    * HTTP 429 waits the full `retry_after` given by telegram, network errors and 5xx back off exponentially up to
+      `max_backoff`, up to `max_retries` attempts before the batch is dropped. Other errors drop the batch.
+
+    `api_url` can point to a local fake endpoint for testing, it receives POST {api_url}sendMessage.
+    """
+
+    def __init__(
+        self,
+        api_url: str=TELEGRAM_API_URL,
+        chat_id: str=CHAT_ID,
+        queue_size: int=NOTIFIER_QUEUE_SIZE,
+        batch_seconds: float=NOTIFIER_BATCH_SECONDS,
+        max_chars: int=TELEGRAM_MAX_CHARS,
+        priority_level: int=logging.WARNING,
+        timeout: float=NOTIFIER_TIMEOUT_SECONDS,
+        max_retries: int=NOTIFIER_MAX_RETRIES,
+        max_backoff: float=NOTIFIER_MAX_BACKOFF_SECONDS,
+    ):
+        self.api_url = api_url
+        self.chat_id = chat_id
+        self.queue_size = queue_size
+        self.batch_seconds = batch_seconds
+        self.max_chars = max_chars
+        self.priority_level = priority_level
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        self.queue = deque() # (level, text)
+        self.cond = threading.Condition()
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.busy = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+        self.thread.start()
+
+    def put(self, text: str, level: int=logging.INFO) -> bool:
+        """Queue a message without blocking, return False if it was dropped"""
+        with self.cond:
+            if self.closed:
+                return False
+            if len(self.queue) >= self.queue_size:
+                victim = next((i for i, (lvl, _) in enumerate(self.queue) if lvl < self.priority_level), None)
+                if victim is None and level < self.priority_level:
+                    self.dropped += 1
+                    return False
+                del self.queue[victim if victim is not None else 0]
+                self.dropped += 1
+            self.queue.append((level, text))
+            self.cond.notify_all()
+        return True
+
+    def flush(self, timeout: float=None) -> bool:
+        """Wait until every queued message is sent or dropped, return False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while len(self.queue) > 0 or self.busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float=None) -> None:
+        """Send the queued messages and stop the worker thread"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        if not self.thread.is_alive(): # a worker still posting keeps its session
+            self.session.close()
+
+    def _next_batch(self) -> list:
+        # wait for a message, then for the rest of the burst
+        with self.cond:
+            while len(self.queue) == 0 and not self.closed:
+                self.cond.wait()
+            if len(self.queue) == 0:
+                return None
+            self.busy = True
+        if not self.closed:
+            time.sleep(self.batch_seconds)
+
+        with self.cond:
+            texts = []
+            if self.dropped > 0:
+                texts.append(f"[{self.dropped} messages dropped]")
+                self.dropped = 0
+            while len(self.queue) > 0:
+                texts.append(self.queue.popleft()[1])
+        return texts
+
+    def _chunks(self, texts: list) -> list:
+        # join messages up to max_chars, a longer message is cut
+        chunks, current = [], ''
+        for text in texts:
+            while len(text) > self.max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(text[:self.max_chars])
+                text = text[self.max_chars:]
+            if current and len(current) + 1 + len(text) > self.max_chars:
+                chunks.append(current)
+                current = ''
+            current = f"{current}\n{text}" if current else text
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _post(self, text: str) -> bool:
+        backoff = 1.0
+        for attempt in range(self.max_retries):
+            retry_after = None
+            try:
+                response = self.session.post(
+                    self.api_url + 'sendMessage',
+                    data={'chat_id': self.chat_id, 'text': text},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                logger.warning(f"Failed to send message to telegram, attempt {attempt + 1}: {e}")
+                wait = backoff
+            else:
+                if response.status_code == 200:
+                    return True
+                if response.status_code == 429:
+                    try:
+                        retry_after = float(response.json()['parameters']['retry_after'])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+                    wait = retry_after if retry_after is not None else backoff
+                elif response.status_code >= 500:
+                    wait = backoff
+                else:
+                    logger.warning(f"Failed to send message to telegram: {response.status_code} {response.text}")
+                    return False
+                logger.warning(f"Telegram returned {response.status_code}, retrying in {wait:.1f} s.")
+            # telegram rejects any retry before retry_after, however long
+            time.sleep(retry_after if retry_after is not None else min(wait, self.max_backoff))
+            backoff = min(backoff * 2, self.max_backoff)
+        logger.warning(f"Giving up sending a message to telegram after {self.max_retries} attempts.")
+        return False
+
+    def _run(self) -> None:
+        while True:
+            texts = self._next_batch()
+            if texts is None:
+                return
+            for chunk in self._chunks(texts):
+                if self._post(chunk):
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+def get_notifier() -> TelegramNotifier:
+    """The notifier of send_log, started on first use and flushed at exit"""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = TelegramNotifier()
+            atexit.register(_notifier.close, NOTIFIER_TIMEOUT_SECONDS)
+    return _notifier
+
 # Function to log and send a message to telegram
 def send_log(text: str, level=logging.INFO) -> None:
 
     logger.log(msg=text, level=level)
-    
+
     if level > logging.DEBUG:
-        response = send_telegram(text)
-        if response.status_code != 200:
-            logger.log(f"WARNING: failed to send message to telegram: {response.text}", level=logging.warning)
+        get_notifier().put(text, level)
@@ -0,0 +1,150 @@
+"""
+`TelegramNotifier` against a local fake telegram endpoint
+
+Usage:
+    cd algo-oanda-demo
+    python -m pytest tests/test_notifier.py
+"""
+
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from src.utils import TelegramNotifier
+
+
+class FakeTelegram:
+    """Records the text of every sendMessage, scripted failures are returned first, in order"""
+
+    def __init__(self):
+        self.requests = [] # (monotonic time, text) of every request
+        self.delivered = [] # texts answered with 200
+        self.failures = [] # (status, body)
+        self.delay = 0 # seconds before answering
+        self.lock = threading.Lock()
+
+    def respond(self, text: str) -> tuple:
+        time.sleep(self.delay)
+        with self.lock:
+            self.requests.append((time.monotonic(), text))
+            if len(self.failures) > 0:
+                return self.failures.pop(0)
+            self.delivered.append(text)
+        return 200, {'ok': True}
+
+
+@pytest.fixture
+def telegram():
+    fake = FakeTelegram()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            assert self.path == '/botTOKEN/sendMessage'
+            form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+            assert form['chat_id'] == ['42']
+            status, body = fake.respond(form['text'][0])
+            body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f'http://127.0.0.1:{server.server_address[1]}/botTOKEN/'
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def _notifier(url: str, **kwargs) -> TelegramNotifier:
+    kwargs = {'chat_id': '42', 'batch_seconds': 0.2, 'timeout': 5, 'max_retries': 3, 'max_backoff': 0.05, **kwargs}
+    return TelegramNotifier(url, **kwargs)
+
+
+def test_burst_is_batched(telegram):
+    notifier = _notifier(telegram.url, max_chars=200)
+    texts = [f'message {i}' for i in range(101)]
+    start = time.perf_counter()
+    assert all(notifier.put(text) for text in texts)
+    assert time.perf_counter() - start < 0.1 # the caller never waits on the network
+    notifier.close(5)
+
+    assert not notifier.thread.is_alive()
+    assert 1 < len(telegram.delivered) < 10
+    assert all(len(text) <= 200 for text in telegram.delivered)
+    assert '\n'.join(telegram.delivered).split('\n') == texts
+    assert (notifier.sent, notifier.failed, notifier.dropped) == (len(telegram.delivered), 0, 0)
+
+
+def test_retries_429_and_500(telegram):
+    retry_after = 0.5 # longer than max_backoff, still waited in full
+    telegram.failures = [
+        (429, {'ok': False, 'parameters': {'retry_after': retry_after}}),
+        (500, {'ok': False}),
+    ]
+    notifier = _notifier(telegram.url)
+    notifier.put('hello')
+    assert notifier.flush(5)
+    notifier.close(5)
+
+    assert [text for _, text in telegram.requests] == ['hello'] * 3
+    assert telegram.requests[1][0] - telegram.requests[0][0] >= retry_after
+    assert telegram.delivered == ['hello']
+    assert (notifier.sent, notifier.failed) == (1, 0)
+
+
+def test_gives_up_after_max_retries(telegram):
+    telegram.failures = [(500, {'ok': False})] * 3 + [(400, {'ok': False})]
+    notifier = _notifier(telegram.url)
+    notifier.put('lost')
+    assert notifier.flush(5)
+    notifier.put('bad request')
+    assert notifier.flush(5)
+    notifier.close(5)
+
+    assert [text for _, text in telegram.requests] == ['lost'] * 3 + ['bad request']
+    assert telegram.delivered == []
+    assert (notifier.sent, notifier.failed) == (0, 2)
+
+
+def test_full_queue_drops_low_priority_first(telegram):
+    notifier = _notifier(telegram.url, queue_size=3, batch_seconds=0.5)
+    assert notifier.put('info 1')
+    assert notifier.put('info 2')
+    assert notifier.put('warning 1', logging.WARNING)
+    assert notifier.put('warning 2', logging.WARNING) # drops info 1
+    assert notifier.put('error 1', logging.ERROR) # drops info 2
+    assert not notifier.put('info 3') # nothing below WARNING queued, the new one is dropped
+    assert notifier.put('error 2', logging.ERROR) # drops warning 1, the oldest
+    notifier.close(5)
+
+    assert telegram.delivered == ['[4 messages dropped]\nwarning 2\nerror 1\nerror 2']
+
+
+def test_close_keeps_the_session_of_a_busy_worker(telegram):
+    telegram.delay = 0.5
+    notifier = _notifier(telegram.url, batch_seconds=0)
+    closed = []
+    notifier.session.close = lambda: closed.append(True)
+    notifier.put('slow')
+    time.sleep(0.1)
+    notifier.close(0.05)
+    assert notifier.thread.is_alive() and closed == []
+
+    notifier.close(5)
+    assert not notifier.thread.is_alive() and closed == [True]
+    assert telegram.delivered == ['slow']
+    assert not notifier.put('after close')
@@ -0,0 +1,97 @@
+"""
+Benchmark candle page parsing: per-candle dicts (download_data.ipynb) vs `src.candles.parse_candles`
+
+Usage:
+    python -m benchmarks.bench_candles --candles 5000 --repeat 20
+"""
+
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.candles import parse_candles, candles_to_table
+
+
+def _extract_single_candle(c):
+    return {
+        "time": c["time"],
+        "complete": c["complete"],
+        "volume": float(c["volume"]),
+        "bid_o": float(c["bid"]["o"]),
+        "bid_h": float(c["bid"]["h"]),
+        "bid_l": float(c["bid"]["l"]),
+        "bid_c": float(c["bid"]["c"]),
+        "ask_o": float(c["ask"]["o"]),
+        "ask_h": float(c["ask"]["h"]),
+        "ask_l": float(c["ask"]["l"]),
+        "ask_c": float(c["ask"]["c"]),
+    }
+
+
+def parse_candles_legacy(page: bytes) -> pd.DataFrame:
+    """Parsing as done in download_data.ipynb"""
+    data = json.loads(page)
+    df = pd.DataFrame([_extract_single_candle(c) for c in data["candles"]])
+    df["time"] = pd.to_datetime(df["time"])
+    return df
+
+
+def make_page(n_candles: int, seed: int = 0) -> bytes:
+    """Synthetic M1 candles page in the OANDA wire format"""
+    rng = np.random.default_rng(seed)
+    mid = 1.05 + np.cumsum(rng.normal(0, 0.0001, n_candles))
+    times = pd.date_range("2022-12-19", periods=n_candles, freq="min")
+
+    def _prices(p):
+        return {"o": f"{p:.5f}", "h": f"{p + 0.0002:.5f}", "l": f"{p - 0.0002:.5f}", "c": f"{p + 0.0001:.5f}"}
+
+    candles = [
+        {
+            "complete": True,
+            "volume": int(v),
+            "time": t.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"),
+            "bid": _prices(p - 0.00005),
+            "ask": _prices(p + 0.00005),
+        }
+        for t, p, v in zip(times, mid, rng.integers(1, 200, n_candles))
+    ]
+    return json.dumps({"instrument": "EUR_USD", "granularity": "M1", "candles": candles}).encode()
+
+
+def _best_of(func, page: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(page)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark candle page parsing.")
+    parser.add_argument("--candles", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    page = make_page(args.candles)
+
+    # both parsers must agree
+    df_legacy = parse_candles_legacy(page)
+    columns = parse_candles(page)
+    assert (df_legacy["time"].values.view(np.int64) == columns["time"]).all()
+    for col in ["bid_o", "bid_h", "bid_l", "bid_c", "ask_o", "ask_h", "ask_l", "ask_c"]:
+        assert (df_legacy[col].values == columns[col]).all()
+
+    for name, func in [
+        ("legacy dict per candle", parse_candles_legacy),
+        ("parse_candles", parse_candles),
+        ("candles_to_table", candles_to_table),
+    ]:
+        t = _best_of(func, page, args.repeat)
+        print(f"{name:<24} {t * 1000:8.2f} ms / page, {args.candles / t / 1e6:6.2f} M candles/s")
+
+
+if __name__ == "__main__":
+    main()
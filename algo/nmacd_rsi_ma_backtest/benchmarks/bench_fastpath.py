@@ -0,0 +1,73 @@
+"""
+Parity and speed of `src.fastpath.run_fastpath` against MyStrategy in backtrader
+
+Both engines run the bundled EUR_USD files as plain bars (H1, and M1 without replay), with the default params and
+`--samples` random param sets. The trade lists and final values must be identical, and a param set failing in
+backtrader must fail the same way in the fast path. The command exits 1 on any mismatch, `tests/test_fastpath.py`
+asserts the same parity.
+
+Usage:
+    python -m benchmarks.bench_fastpath --samples 20
+"""
+
+import sys
+import time
+import argparse
+import numpy as np
+
+from src.utils import load_oanda_parquet
+from src.fastpath import run_fastpath, run_backtrader, same_result, parity_param_sets
+
+DATA_FILES = [
+    "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz",
+    "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz",
+]
+
+
+def _timed(func, *args) -> tuple:
+    """(result or raised exception type, seconds)"""
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    except Exception as e:  # e.g. a zero stop distance, both engines must fail the same way
+        result = type(e)
+    return result, time.perf_counter() - start
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Parity and speed of the fast path against backtrader.")
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    param_sets = parity_param_sets(args.samples, args.seed)
+
+    n_mismatches = 0
+    for file in DATA_FILES:
+        df = load_oanda_parquet(file, validate=False)
+        n_trades, t_bt, t_fast, mismatches = 0, 0.0, 0.0, []
+        for params in param_sets:
+            expected, t = _timed(run_backtrader, df, params)
+            t_bt += t
+            result, t = _timed(run_fastpath, df, params)
+            t_fast += t
+
+            if not same_result(expected, result):
+                mismatches.append(params)
+            elif isinstance(expected, dict):
+                n_trades += len(expected["trade_log"]) // 2
+
+        print(
+            f"{file}: {len(df)} bars, {len(param_sets)} param sets, {n_trades} trades, "
+            f"{len(mismatches)} mismatches, backtrader {t_bt / len(param_sets) * 1000:.0f} ms / run, "
+            f"fast path {t_fast / len(param_sets) * 1000:.1f} ms / run"
+        )
+        for params in mismatches:
+            print(f"    mismatch: {params}")
+        n_mismatches += len(mismatches)
+    return 1 if n_mismatches > 0 else 0
+
+
+if __name__ == "__main__":
+    np.seterr(all="ignore")
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Benchmark the indicator cache on a fast path sweep of risk params
+
+Runs a grid of `rrr` x `sl_pct` (x `high_low_period` with --high-low) over the bundled M1 file with `src.fastpath`,
+once computing the indicators every run and once through an `IndicatorCache`. Results must be identical.
+
+Usage:
+    python -m benchmarks.bench_indicator_cache --high-low
+"""
+
+import time
+import argparse
+
+from src.utils import load_oanda_parquet
+from src.optimize import param_grid
+from src.fastpath import run_fastpath
+from src.indicator_cache import IndicatorCache
+
+DATA_FILE = "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz"
+
+
+def _run(df, params: dict, cache: IndicatorCache = None):
+    try:
+        return run_fastpath(df, params, cache=cache, fingerprint="bench")["final_value"]
+    except ZeroDivisionError as e:  # a zero stop distance fails the run, as in backtrader
+        return type(e)
+
+
+def _sweep(df, param_sets: list, cache: IndicatorCache = None) -> tuple:
+    start = time.perf_counter()
+    values = [_run(df, params, cache) for params in param_sets]
+    return values, time.perf_counter() - start
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the indicator cache on a risk param sweep.")
+    parser.add_argument("--high-low", action="store_true", help="also sweep high_low_period")
+    args = parser.parse_args(argv)
+
+    grid = {"rrr": [0.5 + 0.25 * i for i in range(11)], "sl_pct": [0.5, 1.0, 1.5, 2.0]}
+    if args.high_low:
+        grid["high_low_period"] = [4, 8, 12, 16]
+    param_sets = param_grid(grid)
+    df = load_oanda_parquet(DATA_FILE, validate=False)
+
+    expected, t_plain = _sweep(df, param_sets)
+    cache = IndicatorCache()
+    values, t_cached = _sweep(df, param_sets, cache)
+
+    print(f"{len(param_sets)} runs on {len(df)} bars, identical results: {values == expected}")
+    print(f"no cache   {t_plain / len(param_sets) * 1000:6.2f} ms / run")
+    print(
+        f"cache      {t_cached / len(param_sets) * 1000:6.2f} ms / run, {cache.hits} hits, {cache.misses} misses, "
+        f"{cache.n_bytes / 2**20:.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark intrabar fills against `cerebro.replaydata`
+
+Runs MyStrategy on the bundled M1 file replayed into H1 bars (`next()` on every minute, as in `main.ipynb`), and on
+H1 bars resampled in bulk with stop / limit fills resolved on the M1 bars by `IntrabarBroker` (`next()` once per
+hour). Signals are only taken at the H1 close in the intrabar mode, so trades differ from the replay.
+
+Usage:
+    python -m benchmarks.bench_intrabar --samples 5
+"""
+
+import time
+import argparse
+
+from src.utils import load_oanda_parquet
+from src.optimize import CASH, LEVERAGE, run_backtest
+from src.fastpath import parity_param_sets
+
+DATA_FILE = "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz"
+COMPRESSION = 60
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark intrabar fills against replaydata.")
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    df = load_oanda_parquet(DATA_FILE, validate=False)
+    param_sets = parity_param_sets(args.samples, args.seed)
+    settings = {
+        "instrument": "EUR_USD",
+        "cash": CASH,
+        "leverage": LEVERAGE,
+        "compression": COMPRESSION,
+        "bid_ask": False,
+    }
+
+    print(f"{len(df)} M1 bars, {len(param_sets)} param sets")
+    for name, intrabar in [("replaydata", False), ("intrabar", True)]:
+        start = time.perf_counter()
+        rows = [run_backtest(df, params, {**settings, "intrabar": intrabar}) for params in param_sets]
+        elapsed = time.perf_counter() - start
+        values = ", ".join(f"{row['final_value']:.2f}" for row in rows)
+        trades = sum(row["trades"] for row in rows)
+        print(f"{name:<10} {elapsed / len(param_sets) * 1000:8.0f} ms / run, {trades} trades, final values {values}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark memory of `load_oanda_parquet` dtypes on a synthetic M1 history
+
+For each dtype, reports the size of the loaded frame, the peak of numpy / pandas allocations while loading (traced
+by `tracemalloc`, the parquet reader's own buffers are not included), the load time, and the largest mid price
+error against float64, in pips.
+
+Usage:
+    python -m benchmarks.bench_memory --years 10 --digits 5
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.candles import CANDLE_SCHEMA, PRICE_COLS
+from src.utils import PRICE_DTYPES, load_oanda_parquet
+
+
+def make_history(file: str, years: float, digits: int = 5, seed: int = 0) -> int:
+    """Write a synthetic M1 history of weekday bars in the candle schema, return the number of bars"""
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2010-01-04", periods=int(years * 365 * 1440), freq="min", tz="UTC")
+    times = times[times.dayofweek < 5]
+    n = len(times)
+
+    mid = np.round(1.1 + np.cumsum(rng.normal(0, 0.0001, n)), digits)
+    half_spread = 10.0**-digits
+    columns = {
+        "time": pa.array(times.asi8 // 1000, type=CANDLE_SCHEMA.field("time").type),
+        "complete": pa.array(np.ones(n, dtype=bool)),
+        "volume": pa.array(rng.integers(1, 200, n).astype(np.float64)),
+    }
+    offsets = {"o": 0.0, "h": 2 * half_spread, "l": -2 * half_spread, "c": half_spread}
+    for col in PRICE_COLS:
+        side, k = col.split("_")
+        sign = -1 if side == "bid" else 1
+        columns[col] = pa.array(np.round(mid + offsets[k] + sign * half_spread, digits))
+
+    pq.write_table(pa.Table.from_pydict(columns, schema=CANDLE_SCHEMA), file, compression="zstd")
+    return n
+
+
+def _load(file: str, dtype: str, digits: int) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = load_oanda_parquet(file, validate=False, dtype=dtype, digits=digits)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return df, peak, elapsed
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark memory of compact bar dtypes.")
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--digits", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = os.path.join(tmp_dir, "history.parquet")
+        n = make_history(file, args.years, args.digits)
+        print(f"{n} M1 bars, {os.path.getsize(file) / 2**20:.1f} MiB parquet")
+
+        reference = None
+        for dtype in PRICE_DTYPES:
+            df, peak, elapsed = _load(file, dtype, args.digits)
+            close = df["close"].to_numpy(dtype=np.float64) / df.attrs.get("price_scale", 1)
+            if reference is None:
+                reference = close
+            error_pips = np.abs(close - reference).max() * 10 ** (args.digits - 1)
+            size = df.memory_usage(index=True, deep=True).sum()
+            print(
+                f"{dtype:<8} frame {size / 2**20:8.1f} MiB, {size / n:5.1f} B/bar, peak {peak / 2**20:8.1f} MiB, "
+                f"{elapsed:6.2f} s, max error {error_pips:.2g} pip"
+            )
+            del df
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Parity and speed of the streaming indicators of `src.streaming`
+
+On the bundled M1 file, `StrategyIndicators` is warmed up on the first half of the bars and updated bar by bar on
+the rest. Every indicator must match the batch `src.fastpath.compute_indicators` values (within float rounding,
+the SMA running sum is not added in the same order), and the signals must be identical.
+
+Usage:
+    python -m benchmarks.bench_streaming
+"""
+
+import time
+import argparse
+import numpy as np
+
+from src.utils import load_oanda_parquet
+from src.fastpath import compute_indicators, compute_signal
+from src.streaming import StrategyIndicators
+
+DATA_FILE = "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz"
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Parity and speed of the streaming indicators.")
+    parser.add_argument("--warmup", type=float, default=0.5, help="fraction of the bars to warm up on")
+    args = parser.parse_args(argv)
+
+    df = load_oanda_parquet(DATA_FILE, validate=False)
+    high, low, close = (df[col].to_numpy(dtype=np.float64) for col in ["high", "low", "close"])
+    expected = compute_indicators(close, high, low, {})
+    _, expected_signal = compute_signal(close, expected)
+
+    n, k = len(close), int(len(close) * args.warmup)
+    indicators = StrategyIndicators()
+    start = time.perf_counter()
+    signal = list(indicators.warmup(high[:k], low[:k], close[:k]))
+    t_warmup = time.perf_counter() - start
+
+    values = {name: [] for name in expected}
+    bars = list(zip(high[k:].tolist(), low[k:].tolist(), close[k:].tolist()))
+    start = time.perf_counter()
+    for bar in bars:
+        signal.append(indicators.update(*bar))
+        for name, value in indicators.values().items():
+            values[name].append(value)
+    t_update = time.perf_counter() - start
+
+    print(f"{n} bars, warm-up on {k} in {t_warmup * 1000:.1f} ms, {(t_update / (n - k)) * 1e6:.1f} us / update")
+    for name, streamed in values.items():
+        error = np.nanmax(np.abs(np.array(streamed) - expected[name][k:]))
+        print(f"    {name:<15} max abs error {error:.3g}")
+    print(f"signals identical: {np.array_equal(np.array(signal), expected_signal)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Benchmark suite of the backtest pipeline, with regression tracking
+
+Every case times one stage of the pipeline: parquet load, mid prices, indicators, M1 to H1 replay / resampling, and
+full MyStrategy runs on the bundled EUR_USD files, plus synthetic M1 histories of `--sizes` years. A case is set up
+untimed, then run `--repeat` times, the minimum and median wall times are kept.
+
+Results are saved as JSON with the machine and version info. Given a `--baseline` JSON from an earlier run, a case
+whose minimum time is over `--threshold` times the baseline is flagged as a regression, and the command exits 1.
+`benchmarks/baseline.json` is the committed baseline, its `info` records the machine it was timed on: compare on
+comparable hardware, and refresh it with `--save-baseline` after an intended speedup or slowdown.
+
+Usage:
+    python -m benchmarks.suite --output bench.json --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --cases "load_*" "strategy_h1"
+    python -m benchmarks.suite --sizes 1 5 10 --cases "synthetic_*"
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import backtrader as bt
+
+from src.utils import INPUT_COLS, mid_prices, load_oanda_parquet, resample_bars
+from src.fastpath import compute_indicators, run_fastpath
+from src.optimize import CASH, LEVERAGE, run_backtest
+from src.cache import load_oanda_bars
+from src.plotting import BacktestChart, strategy_lines
+from benchmarks.bench_memory import make_history
+
+H1_FILE = "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz"
+M1_FILE = "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz"
+SETTINGS = {"instrument": "EUR_USD", "cash": CASH, "leverage": LEVERAGE, "bid_ask": False, "intrabar": False}
+
+# name -> (setup returning the function to time, default repeat)
+CASES = {}
+
+
+def case(name: str, repeat: int = None):
+    def register(setup):
+        CASES[name] = (setup, repeat)
+        return setup
+
+    return register
+
+
+def _columns(file: str) -> dict:
+    table = pq.read_table(file, columns=INPUT_COLS)
+    return {c: table[c].to_numpy() for c in INPUT_COLS if c != "time"}
+
+
+def _arrays(df: pd.DataFrame) -> tuple:
+    return tuple(df[col].to_numpy(dtype=np.float64) for col in ["close", "high", "low"])
+
+
+@case("load_h1")
+def _load_h1():
+    return lambda: load_oanda_parquet(H1_FILE, validate=False)
+
+
+@case("load_m1")
+def _load_m1():
+    return lambda: load_oanda_parquet(M1_FILE, validate=False)
+
+
+@case("load_m1_validate")
+def _load_m1_validate():
+    return lambda: load_oanda_parquet(M1_FILE, validate=True)
+
+
+@case("mid_prices_m1")
+def _mid_prices_m1():
+    columns = _columns(M1_FILE)
+    return lambda: [mid_prices(columns[f"bid_{k}"], columns[f"ask_{k}"], "float64") for k in "ohlc"]
+
+
+@case("indicators_m1")
+def _indicators_m1():
+    close, high, low = _arrays(load_oanda_parquet(M1_FILE, validate=False))
+    return lambda: compute_indicators(close, high, low, {})
+
+
+@case("resample_m1_h1")
+def _resample_m1_h1():
+    df = load_oanda_parquet(M1_FILE, validate=False)
+    return lambda: resample_bars(df, 60)
+
+
+@case("replay_m1_h1", repeat=1)
+def _replay_m1_h1():
+    """`cerebro.replaydata` of M1 into H1 without a strategy"""
+    df = load_oanda_parquet(M1_FILE, validate=False)
+
+    def replay():
+        from src.feeds import FastPandasData
+
+        cerebro = bt.Cerebro(stdstats=False)
+        cerebro.replaydata(FastPandasData(dataname=df), timeframe=bt.TimeFrame.Minutes, compression=60)
+        cerebro.run()
+
+    return replay
+
+
+@case("strategy_h1")
+def _strategy_h1():
+    df = load_oanda_parquet(H1_FILE, validate=False)
+    return lambda: run_backtest(df, {}, {**SETTINGS, "compression": None})
+
+
+@case("strategy_m1_replay", repeat=1)
+def _strategy_m1_replay():
+    df = load_oanda_parquet(M1_FILE, validate=False)
+    return lambda: run_backtest(df, {}, {**SETTINGS, "compression": 60})
+
+
+@case("strategy_m1_intrabar")
+def _strategy_m1_intrabar():
+    df = load_oanda_parquet(M1_FILE, validate=False)
+    return lambda: run_backtest(df, {}, {**SETTINGS, "compression": 60, "intrabar": True})
+
+
+@case("fastpath_m1")
+def _fastpath_m1():
+    df = load_oanda_parquet(M1_FILE, validate=False)
+    return lambda: run_fastpath(df, {})
+
+
+def synthetic_cases(years: float, tmp_dir: str) -> None:
+    """Register the cases of a synthetic M1 history of `years`, written to `tmp_dir` when first set up"""
+    file = os.path.join(tmp_dir, f"synthetic_{years:g}y.parquet")
+    prefix = f"synthetic_{years:g}y"
+
+    def _file() -> str:
+        if not os.path.exists(file):
+            make_history(file, years)
+        return file
+
+    @case(f"{prefix}_load", repeat=1)
+    def _load():
+        path = _file()
+        return lambda: load_oanda_parquet(path, validate=False)
+
+    @case(f"{prefix}_indicators", repeat=1)
+    def _indicators():
+        close, high, low = _arrays(resample_bars(load_oanda_parquet(_file(), validate=False), 60))
+        return lambda: compute_indicators(close, high, low, {})
+
+    @case(f"{prefix}_fastpath_h1", repeat=1)
+    def _fastpath_h1():
+        bars = resample_bars(load_oanda_parquet(_file(), validate=False), 60)
+        return lambda: run_fastpath(bars, {})
+
+    @case(f"{prefix}_strategy_intrabar", repeat=1)
+    def _strategy_intrabar():
+        df = load_oanda_parquet(_file(), validate=False)
+        bars = resample_bars(df, 60)
+        return lambda: run_backtest(df, {}, {**SETTINGS, "compression": 60, "intrabar": True}, bars=bars)
+
+    @case(f"{prefix}_chart", repeat=1)
+    def _chart():
+        bars = load_oanda_bars(_file(), cache_dir=os.path.join(tmp_dir, "bar_cache"))
+        path = os.path.join(tmp_dir, f"{prefix}_chart.html")
+        return lambda: BacktestChart(bars, lines=strategy_lines(bars, {}, 60)).save(path)
+
+
+def run_case(name: str, repeat: int = None) -> dict:
+    setup, default_repeat = CASES[name]
+    func = setup()
+    times = []
+    for _ in range(repeat or default_repeat or 5):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": float(np.median(times)), "repeat": len(times)}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def machine_info() -> dict:
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "backtrader": bt.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Names of the cases over `threshold` times their baseline minimum"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base is not None and result["min"] > base["min"] * threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark suite of the backtest pipeline.")
+    parser.add_argument("--cases", nargs="*", default=["*"], help="glob patterns of the cases to run")
+    parser.add_argument("--sizes", nargs="*", type=float, default=[1], help="years of synthetic M1 history")
+    parser.add_argument("--repeat", type=int, help="runs per case, default per case")
+    parser.add_argument("--output", help="json file of the results")
+    parser.add_argument("--baseline", help="json results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio flagged as regression")
+    parser.add_argument("--save-baseline", help="also save the results as this baseline")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for years in args.sizes:
+            synthetic_cases(years, tmp_dir)
+        names = [name for name in CASES if any(fnmatch.fnmatch(name, pattern) for pattern in args.cases)]
+        if args.list:
+            print("\n".join(names))
+            return 0
+
+        baseline = None
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        results = {}
+        for name in names:
+            results[name] = run_case(name, args.repeat)
+            line = f"{name:<36} min {results[name]['min'] * 1000:10.1f} ms, median {results[name]['median'] * 1000:10.1f} ms"
+            base = (baseline or {}).get("cases", {}).get(name)
+            if base is not None:
+                line += f", {results[name]['min'] / base['min']:5.2f}x baseline"
+            print(line, flush=True)
+
+    report = {"info": machine_info(), "cases": results}
+    for path in [args.output, args.save_baseline]:
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for name in regressions:
+        print(f"REGRESSION {name}: {results[name]['min'] / baseline['cases'][name]['min']:.2f}x baseline")
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
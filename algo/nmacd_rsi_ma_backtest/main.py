@@ -1,9 +1,10 @@
 import os
 import pandas as pd
 from datetime import datetime
-from src.defs import PRICE_DIGITS
+from src.defs import BROKER
 from src.utils import logger, load_oanda_parquet
 from src.notifications import log_order, log_trade
+from src.trades import OPEN, CLOSE, TradeRecorder
 
 # from backtrader_bokeh import bt
 import backtrader as bt
@@ -11,7 +12,7 @@ import backtrader as bt
 logger.setLevel(10)  # debug
 
 INSTRUMENT = "EUR_USD"
-DIGITS = PRICE_DIGITS[INSTRUMENT]
+DIGITS = BROKER.PRICE_DIGITS[INSTRUMENT]
 
 
 class MyStrategy(bt.Strategy):
@@ -59,6 +60,8 @@ class MyStrategy(bt.Strategy):
         # others
         self.close_price = None
         self.order = None
+        self.trade_num = 0
+        self.trades = TradeRecorder()  # executed orders, the trade markers of the decimated chart
 
     def update_signal(self):
         if self.macd_crossover[0] != 0:
@@ -120,6 +123,21 @@ class MyStrategy(bt.Strategy):
     def notify_order(self, order: bt.order.Order) -> None:
         log_order(order=order, digits=DIGITS, log_func=self.log)
 
+        if order.status == order.Completed:
+            # a fill leaving a position open is the entry, the stop loss or take profit fill closes the trade
+            type_ = OPEN if self.position else CLOSE
+            if type_ == OPEN:
+                self.trade_num += 1
+            self.trades.append(
+                self.data.datetime[0],
+                self.trade_num,
+                type_,
+                1 if order.isbuy() else -1,
+                self.data.close[0],
+                order.created.price,
+                order.executed.price,
+            )
+
         # no pending order unless partially filled
         if order.status != order.Partial:
             self.order = None
@@ -146,6 +164,22 @@ class MyStrategy(bt.Strategy):
 
 
 DATA_FILE = "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz"
+# html file of a decimated `BacktestChart` instead of `cerebro.plot`, e.g. "chart.html" for long histories
+CHART_FILE = None
+
+
+def indicator_lines(strategy: MyStrategy, index: pd.DatetimeIndex) -> dict:
+    """The strategy indicators as `BacktestChart` lines, in the panels of `cerebro.plot`"""
+    lines = {
+        "price": {"sma": strategy.sma},
+        "rsi": {"rsi": strategy.rsi, "rsi_ma": strategy.rsi_ma},
+        "macd": {"macd": strategy.macd.macd, "signal": strategy.macd.signal},
+    }
+    return {
+        panel: {name: pd.Series(line.array, index=index) for name, line in panel_lines.items()}
+        for panel, panel_lines in lines.items()
+    }
+
 
 # initialize
 cerebro = bt.Cerebro()
@@ -168,6 +202,14 @@ cerebro.addstrategy(MyStrategy)
 # add sizer
 cerebro.addsizer(bt.sizers.FixedSize, stake=10)
 
-cerebro.run()
+strategy = cerebro.run()[0]
+
+if CHART_FILE is None:
+    cerebro.plot(style="candles", barup="green", bardown="red")
+else:
+    from src.plotting import BacktestChart
 
-cerebro.plot(style="candles", barup="green", bardown="red")
+    chart = BacktestChart(
+        df, lines=indicator_lines(strategy, df.index), trades=strategy.trades.to_frame(), title="EUR_USD_H1"
+    )
+    chart.save(CHART_FILE)
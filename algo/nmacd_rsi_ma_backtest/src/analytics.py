@@ -0,0 +1,244 @@
+"""
+Vectorized performance analytics of a run
+
+During the run, `PerformanceAnalyzer` only records the broker value, the position size and the bar high / low
+into preallocated NumPy columns, once per bar (a replayed bar overwrites its row on every tick). It also records
+the open / close bar, direction, entry price and net PnL of every closed trade. All metrics are computed from
+these arrays when the run stops:
+    returns     total return, CAGR, annualized volatility, Sharpe, Sortino and Calmar of the `freq` returns
+    drawdown    max depth in % and in account currency, longest time under water in bars and as a duration
+    trades      closed trades, win rate, profit factor, average win / loss, expectancy, MAE / MFE per trade,
+                time in market
+
+The functions take plain arrays and Series, so they also analyze equity curves and trades produced outside
+backtrader, e.g. by `src.fastpath` or a broker statement.
+
+Usage:
+    cerebro.addanalyzer(PerformanceAnalyzer, _name="Performance")
+    result = cerebro.run()[0]
+    result.analyzers.Performance.get_analysis()  # {"returns": {...}, "drawdown": {...}, "trades": {...}}
+    result.analyzers.Performance.trade_frame()  # one row per closed trade, with MAE / MFE
+
+    analyze(equity, pnl=pnl)  # equity Series indexed by datetime, per-trade net PnL
+"""
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from src.events import num_to_datetime
+
+PERIODS_PER_YEAR = 252  # trading days, of the default daily returns
+BAR_CAPACITY = 1 << 16
+BAR_COLS = ["datetime", "value", "position", "high", "low"]
+TRADE_COLS = ["open_bar", "close_bar", "direction", "entry_price", "pnl"]
+
+
+def _annual_years(index, n: int, periods_per_year: float) -> float:
+    if isinstance(index, pd.DatetimeIndex) and n > 1:
+        return (index[-1] - index[0]) / pd.Timedelta(days=365.25)
+    return (n - 1) / periods_per_year
+
+
+def drawdown_metrics(equity) -> dict:
+    """Max drawdown in % and in value, and the longest time under water, of an equity array or Series"""
+    values = np.asarray(equity, dtype=np.float64)
+    if len(values) == 0:
+        return {
+            "max_drawdown_pct": np.nan,
+            "max_drawdown": np.nan,
+            "max_drawdown_bars": 0,
+            "max_drawdown_duration": None,
+        }
+    peak = np.maximum.accumulate(values)
+    drawdown = peak - values
+    bars = np.arange(len(values))
+    last_peak = np.maximum.accumulate(np.where(values >= peak, bars, 0))
+    under_water = bars - last_peak
+
+    duration = None
+    if isinstance(getattr(equity, "index", None), pd.DatetimeIndex):
+        index = equity.index.asi8
+        duration = pd.Timedelta(int((index - index[last_peak]).max()))
+    return {
+        "max_drawdown_pct": float((drawdown / peak).max() * 100),
+        "max_drawdown": float(drawdown.max()),
+        "max_drawdown_bars": int(under_water.max()),
+        "max_drawdown_duration": duration,
+    }
+
+
+def returns_metrics(
+    equity, freq: str = "D", periods_per_year: float = PERIODS_PER_YEAR, risk_free: float = 0.0
+) -> dict:
+    """Return, CAGR, volatility, Sharpe, Sortino and Calmar of an equity Series
+
+    freq: returns of the last value of each `freq` period of a Series indexed by datetime (days without bars are
+        skipped), None for the returns between consecutive values, e.g. of an array
+    periods_per_year: `freq` periods per year, to annualize
+    risk_free: annual risk-free rate, e.g. 0.02
+    """
+    values = np.asarray(equity, dtype=np.float64)
+    index = getattr(equity, "index", None)
+    n = len(values)
+    if n == 0:
+        return {
+            name: np.nan for name in ["total_return_pct", "cagr_pct", "volatility_pct", "sharpe", "sortino", "calmar"]
+        }
+
+    sampled = values
+    if freq is not None and isinstance(index, pd.DatetimeIndex):
+        sampled = pd.Series(values, index=index).resample(freq).last().dropna().to_numpy()
+    returns = sampled[1:] / sampled[:-1] - 1
+    excess = returns - risk_free / periods_per_year
+    sqrt_periods = np.sqrt(periods_per_year)
+
+    std = excess.std(ddof=1) if len(excess) > 1 else np.nan
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2)) if len(excess) > 0 else np.nan
+    years = _annual_years(index, n, periods_per_year)
+    cagr = (values[-1] / values[0]) ** (1 / years) - 1 if years > 0 else np.nan
+    max_drawdown = drawdown_metrics(values)["max_drawdown_pct"]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "total_return_pct": float((values[-1] / values[0] - 1) * 100),
+            "cagr_pct": float(cagr * 100),
+            "volatility_pct": float(returns.std(ddof=1) * sqrt_periods * 100) if len(returns) > 1 else np.nan,
+            "sharpe": float(excess.mean() / std * sqrt_periods) if std > 0 else np.nan,
+            "sortino": float(excess.mean() / downside * sqrt_periods) if downside > 0 else np.nan,
+            "calmar": float(cagr * 100 / max_drawdown) if max_drawdown > 0 else np.nan,
+        }
+
+
+def trade_metrics(pnl) -> dict:
+    """Win rate, profit factor, average win / loss and expectancy of the net PnL of closed trades"""
+    pnl = np.asarray(pnl, dtype=np.float64)
+    wins, losses = pnl[pnl > 0], pnl[pnl <= 0]
+    gross_loss = -losses.sum()
+    with np.errstate(invalid="ignore"):
+        return {
+            "trades": len(pnl),
+            "won": len(wins),
+            "lost": len(losses),
+            "win_rate_pct": len(wins) / len(pnl) * 100 if len(pnl) > 0 else np.nan,
+            "net_pnl": float(pnl.sum()),
+            "profit_factor": float(wins.sum() / gross_loss) if gross_loss > 0 else np.nan,
+            "avg_win": float(wins.mean()) if len(wins) > 0 else np.nan,
+            "avg_loss": float(losses.mean()) if len(losses) > 0 else np.nan,
+            "largest_win": float(wins.max()) if len(wins) > 0 else np.nan,
+            "largest_loss": float(losses.min()) if len(losses) > 0 else np.nan,
+            "expectancy": float(pnl.mean()) if len(pnl) > 0 else np.nan,
+        }
+
+
+def excursions(high, low, open_bar, close_bar, direction, entry_price) -> tuple:
+    """MAE and MFE of trades in % of the entry price, from the bar high / low of the entry bar to the exit bar
+
+    open_bar, close_bar: positions in `high` / `low` of the first and last bar of each trade
+    direction: 1 long, -1 short
+    Returns (mae, mfe), the adverse and favorable excursions as positive moves
+    """
+    high, low = np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64)
+    open_bar, close_bar = np.asarray(open_bar, dtype=np.int64), np.asarray(close_bar, dtype=np.int64)
+    direction, entry_price = np.asarray(direction), np.asarray(entry_price, dtype=np.float64)
+    if len(open_bar) == 0:
+        return np.empty(0), np.empty(0)
+
+    # reduceat over [open, close + 1) of every trade, the odd slices between trades are dropped
+    bounds = np.column_stack([open_bar, close_bar + 1]).ravel()
+    highest = np.maximum.reduceat(np.append(high, np.nan), bounds)[::2]
+    lowest = np.minimum.reduceat(np.append(low, np.nan), bounds)[::2]
+    up, down = (highest / entry_price - 1) * 100, (1 - lowest / entry_price) * 100
+    long = direction > 0
+    return np.where(long, down, up), np.where(long, up, down)
+
+
+def analyze(
+    equity,
+    pnl=None,
+    freq: str = "D",
+    periods_per_year: float = PERIODS_PER_YEAR,
+    risk_free: float = 0.0,
+) -> dict:
+    """{"returns", "drawdown", "trades"} metrics of an equity curve and the net PnL of its closed trades"""
+    metrics = {
+        "returns": returns_metrics(equity, freq, periods_per_year, risk_free),
+        "drawdown": drawdown_metrics(equity),
+    }
+    if pnl is not None:
+        metrics["trades"] = trade_metrics(pnl)
+    return metrics
+
+
+class PerformanceAnalyzer(bt.Analyzer):
+    """Per-bar equity / position columns and closed trades, metrics computed at stop, see `src.analytics`"""
+
+    params = (
+        ("freq", "D"),  # returns period of the Sharpe / Sortino
+        ("periods_per_year", PERIODS_PER_YEAR),
+        ("risk_free", 0.0),  # annual rate
+        ("capacity", BAR_CAPACITY),  # bars preallocated, doubled when full
+    )
+
+    def start(self):
+        self.n = 0
+        self.bars = np.empty((len(BAR_COLS), self.p.capacity), dtype=np.float64)
+        self.trades = []
+
+    def next(self):
+        # with replaydata `next` runs on every tick of a bar, the last one wins
+        i = len(self.strategy) - 1
+        if i == self.bars.shape[1]:
+            bars = np.empty((len(BAR_COLS), 2 * i), dtype=np.float64)
+            bars[:, :i] = self.bars
+            self.bars = bars
+        data = self.data
+        self.bars[:, i] = (
+            data.datetime[0],
+            self.strategy.broker.getvalue(),
+            self.strategy.position.size,
+            data.high[0],
+            data.low[0],
+        )
+        self.n = i + 1
+
+    def notify_trade(self, trade: bt.Trade):
+        if trade.isclosed:
+            self.trades.append(
+                (trade.baropen - 1, trade.barclose - 1, 1 if trade.long else -1, trade.price, trade.pnlcomm)
+            )
+
+    def stop(self):
+        trades = self.trade_frame()
+        self.rets.update(analyze(self.equity(), trades["pnl"], self.p.freq, self.p.periods_per_year, self.p.risk_free))
+        position = self.bars[2, : self.n]
+        self.rets["trades"].update(
+            {
+                "open_trades": int(self.n > 0 and position[-1] != 0),
+                "avg_mae_pct": float(trades["mae_pct"].mean()),
+                "avg_mfe_pct": float(trades["mfe_pct"].mean()),
+                "time_in_market_pct": float(np.mean(position != 0) * 100) if self.n > 0 else np.nan,
+            }
+        )
+
+    def equity(self) -> pd.Series:
+        """Broker value at the end of every bar, indexed by bar datetime"""
+        return pd.Series(self.bars[1, : self.n], index=num_to_datetime(self.bars[0, : self.n]), name="value")
+
+    def positions(self) -> pd.Series:
+        """Position size at the end of every bar, indexed by bar datetime"""
+        return pd.Series(self.bars[2, : self.n], index=num_to_datetime(self.bars[0, : self.n]), name="position")
+
+    def trade_frame(self) -> pd.DataFrame:
+        """Closed trades: open / close datetime, direction, entry price, net PnL, MAE / MFE in %"""
+        trades = pd.DataFrame(self.trades, columns=TRADE_COLS)
+        open_bar = trades["open_bar"].to_numpy(dtype=np.int64)
+        close_bar = trades["close_bar"].to_numpy(dtype=np.int64)
+        datetimes = num_to_datetime(self.bars[0, : self.n])
+        trades.insert(0, "open_datetime", datetimes[open_bar])
+        trades.insert(1, "close_datetime", datetimes[close_bar])
+        high, low = self.bars[3, : self.n], self.bars[4, : self.n]
+        trades["mae_pct"], trades["mfe_pct"] = excursions(
+            high, low, open_bar, close_bar, trades["direction"], trades["entry_price"]
+        )
+        return trades
@@ -0,0 +1,262 @@
+"""
+Batch backtests of MyStrategy over instruments, granularities and date ranges
+
+A job is one run of MyStrategy:
+    {"instrument", "granularity", "start", "end", "params", "compression", "intrabar", "engine"}
+on the bars of a `MarketDataStore` root (or a single parquet file), through the memory-mapped bar cache. Bars of a
+granularity at least `compression` minutes run as they are, finer bars are replayed into `compression` minutes
+(resampled with `engine="fastpath"`).
+
+Jobs are queued and run in up to `max_workers` processes, one process per job, so a job over its `timeout` is
+terminated without stopping the others. The result row of every successful job is saved as
+`{results_dir}/{key}.json`, the key hashing the job and the contents of the partitions it reads. Jobs with a saved
+result are skipped, so a rerun only runs new jobs, and jobs whose data has changed since.
+
+Usage:
+    python -m src.batch --data data --granularities M1 --ranges 2022-01-01:2022-07-01 2022-07-01:2023-01-01 \
+        --timeout 1800 --output nightly.csv
+    python -m src.batch --data data --jobs jobs.json --workers 4
+"""
+
+import os
+import json
+import time
+import argparse
+import itertools
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+
+import pandas as pd
+
+from src.defs import BROKER
+from src.utils import logger
+from src.cache import BAR_CACHE_DIR, source_files, cache_key, open_bars
+from src.optimize import RESULT_COLS, sweep_settings, run_backtest, run_fast_backtest
+
+RESULTS_DIR = ".batch_results"
+JOB_COLS = ["instrument", "granularity", "start", "end"]
+GRANULARITY_MINUTES = {"M1": 1, "M5": 5, "M15": 15, "M30": 30, "H1": 60, "H4": 240, "D": 1440}
+
+
+def make_jobs(
+    instruments: list,
+    granularities: list,
+    ranges: list,
+    params: dict = None,
+    compression: int = 60,
+    intrabar: bool = False,
+    engine: str = "backtrader",
+) -> list:
+    """Jobs of every instrument x granularity x (start, end) range, with the same params and run settings"""
+    return [
+        {
+            "instrument": instrument,
+            "granularity": granularity,
+            "start": start,
+            "end": end,
+            "params": params or {},
+            "compression": compression,
+            "intrabar": intrabar,
+            "engine": engine,
+        }
+        for instrument, granularity, (start, end) in itertools.product(instruments, granularities, ranges)
+    ]
+
+
+def job_key(data: str, job: dict, cache_dir: str = BAR_CACHE_DIR) -> str:
+    """Hash of the job and of the contents of the files it reads"""
+    files = source_files(data, job["instrument"], job["granularity"], job["start"], job["end"])
+    return cache_key(files, job, cache_dir)
+
+
+def run_job(data: str, job: dict, cache_dir: str = BAR_CACHE_DIR) -> dict:
+    """Run one job in this process, return the result row of `src.optimize`"""
+    compression = job["compression"]
+    if compression is not None and GRANULARITY_MINUTES.get(job["granularity"], 0) >= compression:
+        compression = None
+    cache_path, settings = sweep_settings(
+        data,
+        instrument=job["instrument"],
+        granularity=job["granularity"],
+        start_time=job["start"],
+        end_time=job["end"],
+        compression=compression,
+        intrabar=job["intrabar"],
+        engine=job["engine"],
+        cache_dir=cache_dir,
+    )
+    df = open_bars(cache_path)
+    if settings["engine"] == "fastpath":
+        return run_fast_backtest(df, job["params"], settings)
+    return run_backtest(df, job["params"], settings)
+
+
+def _error_row(job: dict, error: str) -> dict:
+    return {**job["params"], **{col: None for col in RESULT_COLS}, "error": error}
+
+
+def _job_process(data: str, job: dict, cache_dir: str, conn) -> None:
+    try:
+        row = run_job(data, job, cache_dir)
+    except Exception as e:  # reported in the result row, like a failed sweep run
+        row = _error_row(job, f"{type(e).__name__}: {e}")
+    conn.send(row)
+    conn.close()
+
+
+def _save_result(path: str, record: dict) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def run_batch(
+    data: str,
+    jobs: list,
+    results_dir: str = RESULTS_DIR,
+    timeout: float = None,
+    max_workers: int = None,
+    force: bool = False,
+    cache_dir: str = BAR_CACHE_DIR,
+) -> pd.DataFrame:
+    """Run `jobs` on the bars of `data`, skipping the jobs with a saved result unless `force`
+
+    timeout: seconds a job may run before it is terminated and reported as failed, None for no limit
+
+    Returns one row per job, in job order: instrument, granularity, start, end, params, result columns, elapsed
+    seconds and whether the result was cached.
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    keys = [job_key(data, job, cache_dir) for job in jobs]
+    records = [None] * len(jobs)
+    queue = deque()
+    for i, key in enumerate(keys):
+        path = os.path.join(results_dir, f"{key}.json")
+        if not force and os.path.exists(path):
+            with open(path) as f:
+                records[i] = {**json.load(f), "cached": True}
+        else:
+            queue.append(i)
+    logger.info(f"Running {len(queue)} of {len(jobs)} jobs, {len(jobs) - len(queue)} cached.")
+
+    def finish(i: int, row: dict, elapsed: float) -> None:
+        record = {"job": jobs[i], "result": row, "elapsed": elapsed}
+        records[i] = {**record, "cached": False}
+        if row["error"] is None:
+            _save_result(os.path.join(results_dir, f"{keys[i]}.json"), record)
+            logger.info(f"Job {i + 1}/{len(jobs)} {jobs[i]} finished in {elapsed:.1f} s.")
+        else:
+            logger.warning(f"Job {i + 1}/{len(jobs)} {jobs[i]} failed: {row['error']}")
+
+    ctx = mp.get_context()
+    max_workers = max_workers or os.cpu_count() or 1
+    running = {}  # result pipe -> (job index, process, start time)
+    while len(queue) > 0 or len(running) > 0:
+        while len(queue) > 0 and len(running) < max_workers:
+            i = queue.popleft()
+            reader, writer = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_job_process, args=(data, jobs[i], cache_dir, writer), daemon=True)
+            process.start()
+            writer.close()
+            running[reader] = (i, process, time.monotonic())
+
+        wait_time = None
+        if timeout is not None:
+            wait_time = max(0.0, min(start for _, _, start in running.values()) + timeout - time.monotonic())
+        for reader in wait(list(running), timeout=wait_time):
+            i, process, start = running.pop(reader)
+            try:
+                row = reader.recv()
+            except EOFError:  # the process died before sending its result
+                process.join()
+                row = _error_row(jobs[i], f"ProcessError: job process exited with code {process.exitcode}")
+            reader.close()
+            process.join()
+            finish(i, row, time.monotonic() - start)
+
+        if timeout is None:
+            continue
+        for reader, (i, process, start) in list(running.items()):
+            if time.monotonic() - start >= timeout:
+                process.terminate()
+                process.join()
+                reader.close()
+                del running[reader]
+                finish(i, _error_row(jobs[i], f"TimeoutError: job over {timeout} s"), time.monotonic() - start)
+
+    rows = []
+    for record in records:
+        job = record["job"]
+        rows.append(
+            {
+                **{col: job[col] for col in JOB_COLS},
+                "params": json.dumps(job["params"], sort_keys=True),
+                **{col: record["result"][col] for col in RESULT_COLS},
+                "elapsed": record["elapsed"],
+                "cached": record["cached"],
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def _date_range(value: str) -> tuple:
+    start, _, end = value.partition(":")
+    return start or None, end or None
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Batch backtests of MyStrategy over instruments and date ranges.")
+    parser.add_argument("--data", required=True, help="MarketDataStore root or parquet file")
+    parser.add_argument("--jobs", help="json list of jobs, instead of the instrument x granularity x range grid")
+    parser.add_argument("--instruments", nargs="*", help="default every instrument fully defined in BROKER")
+    parser.add_argument("--granularities", nargs="*", default=["M1"])
+    parser.add_argument("--ranges", nargs="*", type=_date_range, default=[(None, None)], help="start:end, UTC")
+    parser.add_argument("--params", default="{}", help='json MyStrategy params, e.g. {"rrr": 1.5}')
+    parser.add_argument("--compression", type=int, default=60, help="replay into bars of N minutes, 0 to disable")
+    parser.add_argument("--intrabar", action="store_true", help="run resampled bars, fill stops / limits intrabar")
+    parser.add_argument("--engine", choices=["backtrader", "fastpath"], default="backtrader")
+    parser.add_argument("--timeout", type=float, help="seconds per job")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--force", action="store_true", help="rerun the jobs with a saved result")
+    parser.add_argument("--output", help="csv file of the results")
+    args = parser.parse_args(argv)
+
+    if args.jobs is not None:
+        with open(args.jobs) as f:
+            defaults = make_jobs([None], [None], [(None, None)], compression=args.compression or None)[0]
+            jobs = [{**defaults, **job} for job in json.load(f)]
+    else:
+        instruments = args.instruments or BROKER.instruments()
+        incomplete = [instrument for instrument in BROKER.PRICE_DIGITS if instrument not in BROKER.instruments()]
+        if args.instruments is None and len(incomplete) > 0:
+            logger.warning(f"Skipping instruments missing BROKER definitions: {incomplete}.")
+        jobs = make_jobs(
+            instruments,
+            args.granularities,
+            args.ranges,
+            params=json.loads(args.params),
+            compression=args.compression or None,
+            intrabar=args.intrabar,
+            engine=args.engine,
+        )
+
+    for instrument in sorted({job["instrument"] for job in jobs}):
+        BROKER.definitions(instrument)  # fail before any job starts
+    df = run_batch(
+        args.data,
+        jobs,
+        results_dir=args.results_dir,
+        timeout=args.timeout,
+        max_workers=args.workers,
+        force=args.force,
+    )
+    if args.output is not None:
+        df.to_csv(args.output, index=False)
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Backtrader brokers with finer fills than `BackBroker`
+
+`BidAskBroker` fills orders on the bid / ask side.
+
+With a `BidAskPandasData` feed, buy orders are matched against the ask OHLC and sell orders against the bid OHLC
+of the bar, so market buys fill at the ask open, a long stop-loss triggers when the bid trades through it, and so
+on. Spread costs then come from the data instead of a constant. Feeds without bid/ask lines fill on mid prices as
+in `BackBroker`.
+
+`IntrabarBroker` resolves stop and limit fills on the finer bars of an `IntrabarPandasData` feed.
+"""
+
+import numpy as np
+import backtrader as bt
+from backtrader.order import Order
+
+_BID_LINES = ("bid_open", "bid_high", "bid_low", "bid_close")
+_ASK_LINES = ("ask_open", "ask_high", "ask_low", "ask_close")
+
+
+class BidAskBroker(bt.brokers.BackBroker):
+    def _try_exec(self, order):
+        data = order.data
+        side = _ASK_LINES if order.isbuy() else _BID_LINES
+        if not hasattr(data.lines, side[0]):
+            return super(BidAskBroker, self)._try_exec(order)
+
+        # as in BackBroker, prefer the tick values, which hold the latest sub-bar when replaying
+        prices = []
+        for name in side:
+            price = getattr(data, f"tick_{name}", None)
+            prices.append(price if price is not None else getattr(data.lines, name)[0])
+        popen, phigh, plow, pclose = prices
+        pcreated = order.created.price
+        plimit = order.created.pricelimit
+
+        if order.exectype == Order.Market:
+            self._try_exec_market(order, popen, phigh, plow)
+
+        elif order.exectype == Order.Close:
+            self._try_exec_close(order, pclose)
+
+        elif order.exectype == Order.Limit:
+            self._try_exec_limit(order, popen, phigh, plow, pcreated)
+
+        elif order.triggered and order.exectype in [Order.StopLimit, Order.StopTrailLimit]:
+            self._try_exec_limit(order, popen, phigh, plow, plimit)
+
+        elif order.exectype in [Order.Stop, Order.StopTrail]:
+            self._try_exec_stop(order, popen, phigh, plow, pcreated, pclose)
+
+        elif order.exectype in [Order.StopLimit, Order.StopTrailLimit]:
+            self._try_exec_stoplimit(order, popen, phigh, plow, pclose, pcreated, plimit)
+
+        elif order.exectype == Order.Historical:
+            self._try_exec_historical(order)
+
+
+class IntrabarBroker(bt.brokers.BackBroker):
+    """Fill stop and limit orders at the first finer bar touching their price
+
+    With an `IntrabarPandasData` feed, e.g. H1 bars with their M1 bars, the strategy and its indicators run once per
+    H1 bar, while stop and limit orders are matched against the M1 bars inside it, as `cerebro.replaydata` would,
+    without calling `next()` every minute:
+        - an order fills on the first M1 bar touching its price, at the M1 open on a gap, else at its price
+        - of a stop-loss and take-profit pair, the one touched first fills and cancels the other. When both are
+          touched in the same M1 bar, the stop fills, as in `BackBroker`
+        - the children of a bracket are active from the M1 bar after the parent fill, in the same H1 bar
+    Market orders fill at the H1 open, the open of its first M1 bar. Other feeds fill as in `BackBroker`.
+    """
+
+    def __init__(self):
+        super(IntrabarBroker, self).__init__()
+        self._fill_rows = {}  # order ref -> intrabar row of its fill
+        self._first_rows = {}  # order ref -> first intrabar row it can fill at
+
+    @staticmethod
+    def _is_intrabar(order) -> bool:
+        return hasattr(order.data, "intrabar_rows") and order.exectype in (Order.Stop, Order.Limit)
+
+    def _first_touch(self, order) -> int:
+        """First intrabar row of the current bar touching the order price, None if not touched"""
+        first, end = order.data.intrabar_rows()
+        first = max(first, self._first_rows.get(order.ref, first))
+        if first >= end:
+            return None
+
+        popen, phigh, plow = (values[first:end] for values in order.data.intrabar_prices)
+        price = order.created.price
+        if order.exectype == Order.Stop:
+            touched = (popen >= price) | (phigh >= price) if order.isbuy() else (popen <= price) | (plow <= price)
+        else:
+            touched = (price >= popen) | (price >= plow) if order.isbuy() else (price <= popen) | (price <= phigh)
+        if not touched.any():
+            return None
+        return first + int(np.argmax(touched))
+
+    def _siblings(self, order) -> list:
+        """Other alive children of the bracket of `order`"""
+        if order.parent is None:
+            return []
+        return [o for o in self._pchildren.get(order.parent.ref, []) if o is not order and o.alive()]
+
+    def _try_exec(self, order):
+        if not self._is_intrabar(order):
+            super(IntrabarBroker, self)._try_exec(order)
+            if order.status == Order.Completed and hasattr(order.data, "intrabar_rows"):
+                self._fill_rows[order.ref] = order.data.intrabar_rows()[0]
+            return
+
+        row = self._first_touch(order)
+        if row is None:
+            return
+        for sibling in self._siblings(order):
+            if self._is_intrabar(sibling) and sibling.active():
+                sibling_row = self._first_touch(sibling)
+                if sibling_row is not None and sibling_row < row:
+                    return  # the sibling fills first and cancels this order
+
+        popen, phigh, plow = (float(values[row]) for values in order.data.intrabar_prices)
+        if order.exectype == Order.Stop:
+            self._try_exec_stop(order, popen, phigh, plow, order.created.price, order.data.close[0])
+        else:
+            self._try_exec_limit(order, popen, phigh, plow, order.created.price)
+        if order.status == Order.Completed:
+            self._fill_rows[order.ref] = row
+
+    def _bracketize(self, order, cancel=False):
+        children = [o for o in self._pchildren.get(order.ref, []) if o is not order]
+        super(IntrabarBroker, self)._bracketize(order, cancel=cancel)
+
+        fill_row = self._fill_rows.pop(order.ref, None)
+        self._first_rows.pop(order.ref, None)
+        if cancel or fill_row is None or len(children) == 0:
+            return
+        # parent filled: activate the children now, from the next intrabar row, instead of on the next bar
+        refs = {o.ref for o in children}
+        self._toactivate = type(self._toactivate)(o for o in self._toactivate if o.ref not in refs)
+        for child in children:
+            child.activate()
+            self._first_rows[child.ref] = fill_row + 1
@@ -0,0 +1,215 @@
+"""
+Memory-mapped bar cache
+
+The output of `load_oanda_parquet` is saved once as raw numpy arrays:
+    {cache_dir}/{key}/datetime.npy  int64 epoch ns
+    {cache_dir}/{key}/values.npy    shape (n_columns, n_bars), one contiguous row per column
+    {cache_dir}/{key}/meta.json     columns, timezone, frame attrs, source and loader arguments
+
+Compact frames (`dtype="float32"` or `"ticks"`) keep their dtypes: each run of consecutive columns of one dtype is
+saved in its own `values_{i}.npy`.
+
+Later runs open the arrays with `np.load(mmap_mode="r")` and wrap them in a DataFrame without copying, so a second
+run, or N worker processes, share the same OS pages with near-zero load time.
+
+The key is a hash of the contents of the source files the range reads plus the loader arguments, so an entry is
+invalidated when either changes, and appending partitions outside the range keeps it. File hashes are memoized by
+(size, mtime) so unchanged sources are not re-read.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+from src.utils import logger, load_oanda_parquet
+
+BAR_CACHE_DIR = ".bar_cache"
+HASH_MEMO_FILE = "hashes.json"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def source_files(
+    file: str, instrument: str = None, granularity: str = None, start_time: str = None, end_time: str = None
+) -> list:
+    """Files the loader reads for a parquet file or a `MarketDataStore` root"""
+    if not os.path.isdir(file):
+        return [file]
+
+    from src.store import MarketDataStore
+
+    return MarketDataStore(file).paths(instrument, granularity, start_time, end_time)
+
+
+def _hash_file(path: str, memo: dict) -> str:
+    stat = os.stat(path)
+    path = os.path.abspath(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    if path in memo and memo[path]["signature"] == signature:
+        return memo[path]["sha256"]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            h.update(block)
+    memo[path] = {"signature": signature, "sha256": h.hexdigest()}
+    return memo[path]["sha256"]
+
+
+def cache_key(files: list, loader_args: dict, cache_dir: str = BAR_CACHE_DIR) -> str:
+    """Hash of the source file contents plus the loader arguments"""
+    memo_path = os.path.join(cache_dir, HASH_MEMO_FILE)
+    memo = {}
+    if os.path.exists(memo_path):
+        with open(memo_path) as f:
+            memo = json.load(f)
+
+    h = hashlib.sha256()
+    for path in files:
+        h.update(_hash_file(path, memo).encode())
+    h.update(json.dumps(loader_args, sort_keys=True, default=str).encode())
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{memo_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(memo, f)
+    os.replace(tmp_path, memo_path)
+
+    return h.hexdigest()[:32]
+
+
+def _dtype_blocks(df: pd.DataFrame) -> list:
+    """Runs of consecutive columns with the same dtype"""
+    blocks = []
+    for col, dtype in df.dtypes.items():
+        if len(blocks) > 0 and blocks[-1]["dtype"] == str(dtype):
+            blocks[-1]["columns"].append(col)
+        else:
+            blocks.append({"dtype": str(dtype), "columns": [col]})
+
+    for i, block in enumerate(blocks):
+        block["file"] = "values.npy" if len(blocks) == 1 else f"values_{i}.npy"
+    return blocks
+
+
+def save_bars(df: pd.DataFrame, path: str, meta: dict = None) -> None:
+    """Save a bar frame (datetime index, numeric columns) as a cache entry, atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+
+    index = df.index
+    np.save(os.path.join(tmp_path, "datetime.npy"), index.asi8)
+    blocks = _dtype_blocks(df)
+    for block in blocks:
+        values = df[block["columns"]].to_numpy(dtype=block["dtype"])
+        np.save(os.path.join(tmp_path, block["file"]), np.ascontiguousarray(values.T))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        meta = {
+            "columns": list(df.columns),
+            "blocks": blocks,
+            "index_name": index.name,
+            "tz": str(index.tz) if index.tz is not None else None,
+            "attrs": df.attrs,
+            **(meta or {}),
+        }
+        json.dump(meta, f, indent=2, default=str)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:  # another process has written the same entry
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def open_bars(path: str) -> pd.DataFrame:
+    """Open a cache entry as a read-only DataFrame backed by memory-mapped arrays"""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+
+    datetimes = np.load(os.path.join(path, "datetime.npy"), mmap_mode="r").view("datetime64[ns]")
+    dtype = pd.DatetimeTZDtype(tz=meta["tz"]) if meta["tz"] is not None else datetimes.dtype
+    index = pd.DatetimeIndex(pd.arrays.DatetimeArray(datetimes, dtype=dtype), name=meta["index_name"], copy=False)
+
+    # one frame per block, concatenating frames of different dtypes keeps the memory-mapped blocks as they are
+    blocks = meta.get("blocks", [{"file": "values.npy", "columns": meta["columns"]}])
+    frames = [
+        pd.DataFrame(
+            np.load(os.path.join(path, block["file"]), mmap_mode="r").T,
+            index=index,
+            columns=block["columns"],
+            copy=False,
+        )
+        for block in blocks
+    ]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, axis=1, copy=False)
+    df.attrs.update(meta.get("attrs", {}))
+    return df
+
+
+def _remove_stale_entries(cache_dir: str, source: str, loader_args: dict, key: str) -> None:
+    """Remove older entries built from the same source and arguments"""
+    for entry in os.listdir(cache_dir):
+        meta_path = os.path.join(cache_dir, entry, "meta.json")
+        if entry == key or not os.path.exists(meta_path):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("source") == source and meta.get("loader_args") == loader_args:
+            logger.debug(f"Removing stale bar cache {entry}.")
+            shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+
+
+def bar_cache_path(
+    file: str,
+    start_time: str = None,
+    end_time: str = None,
+    instrument: str = None,
+    granularity: str = None,
+    repair: bool = False,
+    bid_ask: bool = False,
+    dtype: str = "float64",
+    digits: int = None,
+    cache_dir: str = BAR_CACHE_DIR,
+) -> str:
+    """Path of the cache entry of `load_oanda_parquet` with these arguments, built if missing"""
+    loader_args = {
+        "start_time": start_time,
+        "end_time": end_time,
+        "instrument": instrument,
+        "granularity": granularity,
+        "repair": repair,
+        "bid_ask": bid_ask,
+        "dtype": dtype,
+        "digits": digits,
+    }
+    key = cache_key(source_files(file, instrument, granularity, start_time, end_time), loader_args, cache_dir)
+    path = os.path.join(cache_dir, key)
+
+    if not os.path.exists(path):
+        logger.debug(f"Bar cache miss, building {path}.")
+        df = load_oanda_parquet(file, **loader_args)
+        source = os.path.abspath(file)
+        save_bars(df, path, meta={"source": source, "loader_args": loader_args})
+        _remove_stale_entries(cache_dir, source, loader_args, key)
+
+    return path
+
+
+def load_oanda_bars(
+    file: str,
+    start_time: str = None,
+    end_time: str = None,
+    instrument: str = None,
+    granularity: str = None,
+    repair: bool = False,
+    bid_ask: bool = False,
+    dtype: str = "float64",
+    digits: int = None,
+    cache_dir: str = BAR_CACHE_DIR,
+) -> pd.DataFrame:
+    """`load_oanda_parquet` through the memory-mapped bar cache"""
+    path = bar_cache_path(
+        file, start_time, end_time, instrument, granularity, repair, bid_ask, dtype, digits, cache_dir=cache_dir
+    )
+    return open_bars(path)
@@ -27,3 +27,23 @@ class BROKER:
     LEVERAGE = {
         "EUR_USD": 50,
     }
+
+    TABLES = ["PRICE_DIGITS", "POSITION_UNIT", "SPREAD", "COMMISSION", "LEVERAGE"]
+
+    @classmethod
+    def instruments(cls) -> list:
+        """Instruments defined in every table"""
+        return [
+            instrument for instrument in cls.PRICE_DIGITS if all(instrument in getattr(cls, t) for t in cls.TABLES)
+        ]
+
+    @classmethod
+    def definitions(cls, instrument: str) -> dict:
+        """{"price_digits", "position_unit", "spread", "commission", "leverage"} of `instrument`
+
+        Raises ValueError naming the tables missing the instrument.
+        """
+        missing = [f"BROKER.{t}" for t in cls.TABLES if instrument not in getattr(cls, t)]
+        if len(missing) > 0:
+            raise ValueError(f"Instrument {instrument} is not defined in {', '.join(missing)}.")
+        return {t.lower(): getattr(cls, t)[instrument] for t in cls.TABLES}
@@ -0,0 +1,345 @@
+"""
+Download historical candles from OANDA V20 API
+
+The requested range is split into chunks of `BAR_COUNT_LIMIT` bars (the API limit per request). Chunks are fetched
+by a bounded pool of worker threads with retry and exponential backoff, and every chunk is written to its own
+parquet file in `chunk_dir` as soon as it arrives. Chunks already on disk are skipped, so a crashed run resumes
+where it stopped. Chunks holding incomplete bars are not checkpointed and are fetched again. The chunk files are
+finally merged into a `MarketDataStore` or a single parquet file.
+
+Usage:
+    python -m src.downloader --instrument EUR_USD --granularity M1 --start 2020-01-01 --end 2021-01-01 \
+        --account-file ../../_data/oandapyV20/demo_account.json --root data
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.utils import logger
+from src.store import MarketDataStore, STORE_COMPRESSION
+from src.candles import CANDLE_SCHEMA, candles_to_table
+
+OANDA_PRACTICE_URL = "https://api-fxpractice.oanda.com"
+OANDA_LIVE_URL = "https://api-fxtrade.oanda.com"
+OANDA_TIMEZONE = "US/Eastern"
+BAR_COUNT_LIMIT = 5000
+
+GRANULARITY_SEC = {
+    "S5": 5,
+    "S10": 10,
+    "S15": 15,
+    "S30": 30,
+    "M1": 60,
+    "M2": 120,
+    "M4": 240,
+    "M5": 300,
+    "M10": 600,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H2": 7200,
+    "H3": 10800,
+    "H4": 14400,
+    "H6": 21600,
+    "H8": 28800,
+    "H12": 43200,
+    "D": 86400,
+}
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def to_unix(t: str, tz: str = OANDA_TIMEZONE) -> int:
+    """Unix seconds of a time string, naive times are read in `tz`"""
+    ts = pd.Timestamp(t)
+    ts = ts.tz_localize(tz) if ts.tz is None else ts
+    return int(ts.timestamp())
+
+
+def retry_after_seconds(value: str) -> float:
+    """Seconds to wait of a `Retry-After` header, in seconds or as an HTTP date, None if it cannot be parsed"""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:  # "-0000" dates are UTC
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def incomplete_chunk_path(path: str) -> str:
+    """File of a chunk holding incomplete bars, not a checkpoint"""
+    return path[: -len(".parquet")] + ".incomplete.parquet"
+
+
+def split_chunks(start_unix: int, end_unix: int, granularity: str, bar_count: int = BAR_COUNT_LIMIT) -> list:
+    """Split [start_unix, end_unix) into (from, to) ranges of at most `bar_count` bars"""
+    step = GRANULARITY_SEC[granularity] * bar_count
+    return [(s, min(s + step, end_unix)) for s in range(start_unix, end_unix, step)]
+
+
+class CandleDownloader:
+    def __init__(
+        self,
+        token: str,
+        base_url: str = OANDA_PRACTICE_URL,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 30,
+    ):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._local = threading.local()  # one keep-alive session per worker thread
+
+    @property
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            session = requests.Session()
+            session.headers.update({"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"})
+            self._local.session = session
+        return self._local.session
+
+    def _sleep_before_retry(self, attempt: int, response: requests.Response = None) -> None:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        delay = retry_after_seconds(retry_after) if retry_after is not None else None
+        if delay is None:
+            delay = self.backoff * 2**attempt * (1 + random.random())
+        time.sleep(delay)
+
+    def fetch_chunk(self, instrument: str, granularity: str, from_unix: int, to_unix: int) -> bytes:
+        """Request one chunk of candles and return the raw JSON page
+
+        Network errors, rate limit and server errors are retried with exponential backoff.
+        """
+        url = f"{self.base_url}/v3/instruments/{instrument}/candles"
+        params = {
+            "from": str(from_unix),
+            "to": str(to_unix),
+            "granularity": granularity,
+            "price": "AB",  # 'A' for ask, 'B' for bid, 'AB' for both.
+        }
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Request {from_unix}-{to_unix} failed ({e}), retry {attempt + 1}.")
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code == 200:
+                return response.content
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                response.raise_for_status()
+            logger.warning(f"Request {from_unix}-{to_unix} got HTTP {response.status_code}, retry {attempt + 1}.")
+            self._sleep_before_retry(attempt, response)
+
+    def _download_chunk(self, instrument: str, granularity: str, from_unix: int, to_unix: int, path: str) -> str:
+        page = self.fetch_chunk(instrument, granularity, from_unix, to_unix)
+        table = candles_to_table(page)
+
+        # a chunk still holding incomplete bars is not checkpointed, the next run fetches it again
+        if not pc.all(table["complete"]).as_py():
+            path = incomplete_chunk_path(path)
+        elif os.path.exists(incomplete_chunk_path(path)):
+            os.remove(incomplete_chunk_path(path))
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression=STORE_COMPRESSION)
+        os.replace(tmp_path, path)
+        return path
+
+    def download(
+        self,
+        instrument: str,
+        granularity: str,
+        start_time: str,
+        end_time: str,
+        chunk_dir: str,
+        tz: str = OANDA_TIMEZONE,
+    ) -> list:
+        """Download [start_time, end_time) into checkpointed chunk files, return the chunk files in time order
+
+        Only the chunks whose bars are all complete are checkpointed and skipped by a later run.
+        """
+        chunks = split_chunks(to_unix(start_time, tz), to_unix(end_time, tz), granularity)
+        paths = [os.path.join(chunk_dir, f"{start}_{end}.parquet") for start, end in chunks]
+
+        os.makedirs(chunk_dir, exist_ok=True)
+        pending = [(chunk, path) for chunk, path in zip(chunks, paths) if not os.path.exists(path)]
+        logger.info(f"{len(chunks) - len(pending)} of {len(chunks)} chunks already downloaded in {chunk_dir}.")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self._download_chunk, instrument, granularity, *chunk, path) for chunk, path in pending
+            ]
+            for i, future in enumerate(as_completed(futures), 1):
+                logger.debug(f"Downloaded {future.result()} ({i}/{len(futures)}).")
+
+        return [path if os.path.exists(path) else incomplete_chunk_path(path) for path in paths]
+
+
+def _iter_chunk_tables(paths: list, drop_incomplete: bool = False):
+    """Yield chunk tables in time order, without the bars already yielded by the previous chunk"""
+    last_time = None
+    for path in paths:
+        table = pq.read_table(path)
+        if drop_incomplete:
+            table = table.filter(table["complete"])
+        if last_time is not None and len(table) > 0:
+            table = table.filter(pc.greater(table["time"], last_time))
+        if len(table) > 0:
+            last_time = table["time"][-1]
+            yield table
+
+
+def merge_chunks_to_file(paths: list, output_file: str) -> int:
+    """Stream chunk files into a single parquet file, return the number of rows"""
+    n_rows = 0
+    with pq.ParquetWriter(output_file, CANDLE_SCHEMA, compression=STORE_COMPRESSION) as writer:
+        for table in _iter_chunk_tables(paths):
+            writer.write_table(table)
+            n_rows += len(table)
+    return n_rows
+
+
+def merge_chunks_to_store(
+    paths: list, store: MarketDataStore, instrument: str, granularity: str, drop_incomplete: bool = False
+) -> int:
+    """Write chunk files into a data store one month at a time, return the number of rows"""
+    n_rows = 0
+    month_tables = []
+    month = None
+    for table in _iter_chunk_tables(paths, drop_incomplete=drop_incomplete):
+        df = table.to_pandas()
+        for ym, df_month in df.groupby(df["time"].dt.year * 100 + df["time"].dt.month, sort=True):
+            if month is not None and ym != month:
+                store.write(pd.concat(month_tables, ignore_index=True), instrument, granularity)
+                month_tables = []
+            month = ym
+            month_tables.append(df_month)
+            n_rows += len(df_month)
+    if len(month_tables) > 0:
+        store.write(pd.concat(month_tables, ignore_index=True), instrument, granularity)
+    return n_rows
+
+
+def update_store(
+    downloader: CandleDownloader,
+    store: MarketDataStore,
+    instrument: str,
+    granularity: str,
+    end_time: str = None,
+    keep_incomplete: bool = False,
+    tz: str = OANDA_TIMEZONE,
+) -> int:
+    """Fetch only the candles after the last complete bar stored, return the number of rows written
+
+    Fetched bars replace stored bars with the same `time`, so a stored incomplete bar is overwritten once it is
+    complete. Incomplete bars are not written unless `keep_incomplete`. Each partition and the manifest are
+    replaced atomically.
+    """
+    last_complete = store.last_complete_time(instrument, granularity)
+    if last_complete is None:
+        raise LookupError(f"No data stored for {instrument} {granularity} in {store.root}, download history first.")
+
+    start = last_complete + pd.Timedelta(seconds=GRANULARITY_SEC[granularity])
+    end_unix = int(time.time()) if end_time is None else to_unix(end_time, tz)
+    end = pd.Timestamp(end_unix, unit="s", tz="UTC")
+    if start >= end:
+        logger.info(f"{instrument} {granularity} is up to date, last complete bar at {last_complete}.")
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix=f"{instrument}_{granularity}_") as chunk_dir:
+        paths = downloader.download(instrument, granularity, start, end, chunk_dir)
+        n_rows = merge_chunks_to_store(paths, store, instrument, granularity, drop_incomplete=not keep_incomplete)
+
+    logger.info(f"Appended {n_rows} rows to {instrument} {granularity}, from {start}.")
+    return n_rows
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Download historical candles from OANDA V20 API.")
+    parser.add_argument("--instrument", required=True)
+    parser.add_argument("--granularity", required=True, choices=list(GRANULARITY_SEC))
+    parser.add_argument("--start", help="start time, in --tz if no offset is given")
+    parser.add_argument("--end", help="end time, in --tz if no offset is given, default now with --update")
+    parser.add_argument("--update", action="store_true", help="fetch only the bars after the last complete one")
+    parser.add_argument("--keep-incomplete", action="store_true", help="also store incomplete bars with --update")
+    parser.add_argument("--tz", default=OANDA_TIMEZONE)
+    parser.add_argument("--account-file", help="json file with the OANDA 'token'")
+    parser.add_argument("--token")
+    parser.add_argument("--base-url", default=OANDA_PRACTICE_URL)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--chunk-dir", help="checkpoint directory, default .download/{instrument}_{granularity}")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--root", help="MarketDataStore root to write into")
+    output.add_argument("--output", help="single parquet file to write into")
+    args = parser.parse_args(argv)
+
+    if args.update and args.root is None:
+        parser.error("--update requires --root")
+    if not args.update and (args.start is None or args.end is None):
+        parser.error("--start and --end are required unless --update")
+
+    token = args.token
+    if token is None:
+        if args.account_file is None:
+            parser.error("one of --token or --account-file is required")
+        with open(args.account_file) as f:
+            token = json.load(f)["token"]
+
+    chunk_dir = args.chunk_dir or os.path.join(".download", f"{args.instrument}_{args.granularity}")
+
+    downloader = CandleDownloader(token, base_url=args.base_url, max_workers=args.workers, max_retries=args.retries)
+
+    if args.update:
+        update_store(
+            downloader,
+            MarketDataStore(args.root),
+            args.instrument,
+            args.granularity,
+            end_time=args.end,
+            keep_incomplete=args.keep_incomplete,
+            tz=args.tz,
+        )
+        return
+
+    paths = downloader.download(args.instrument, args.granularity, args.start, args.end, chunk_dir, tz=args.tz)
+
+    if args.root is not None:
+        n_rows = merge_chunks_to_store(paths, MarketDataStore(args.root), args.instrument, args.granularity)
+        logger.info(f"Wrote {n_rows} rows into {args.root}.")
+    else:
+        n_rows = merge_chunks_to_file(paths, args.output)
+        logger.info(f"Wrote {n_rows} rows into {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Structured event log of a strategy run
+
+Events are typed records, one tuple of `FIELDS` each, written into a preallocated ring of `capacity` slots (the
+oldest events are overwritten when it is full). Recording an event below the log `level` returns before anything
+is built, and recording one above it only stores numbers: no timestamp or text is formatted unless a sink is
+attached. Sinks are called with the record, e.g. `print_sink` formats it for humans as the former print logs.
+
+The records are exported in bulk as a DataFrame, Parquet or JSON lines, bar datetimes as naive UTC timestamps.
+
+Usage:
+    events = EventLog()
+    cerebro.addstrategy(MyStrategy, event_log=events, verbose=False)
+    cerebro.run()
+    events.to_parquet("events.parquet")
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from src.trades import EPOCH_NUM
+from src.notifications import ORDER_TYPES, ORDER_STATUSES
+
+DEBUG, INFO, WARNING = logging.DEBUG, logging.INFO, logging.WARNING
+EVENT_CAPACITY = 1 << 16
+
+# event kinds
+MESSAGE, START, STOP, TRIGGER, ORDER, TRADE = range(6)
+KIND_NAMES = ["message", "start", "stop", "trigger", "order", "trade"]
+
+FIELDS = [
+    "datetime",  # backtrader date number of the bar, nan outside of bars
+    "level",
+    "kind",
+    "ref",  # order / trade ref
+    "status",  # bt.Order status
+    "direction",  # 1 buy, -1 sell
+    "exectype",  # bt.Order exectype
+    "price",  # order created price, trigger close price
+    "size",  # order created size, trade size
+    "executed_price",
+    "executed_size",
+    "margin",
+    "commission",
+    "pnl",  # closed trade gross / net profit
+    "pnlcomm",
+    "value",  # broker value at start / stop
+    "cash",  # broker cash at start / stop
+    "stop_loss",
+    "take_profit",
+    "text",
+]
+FLOAT_FIELDS = FIELDS[7:19]
+_EMPTY = (np.nan,) * len(FLOAT_FIELDS)
+
+
+def num_to_datetime(num: np.ndarray) -> pd.DatetimeIndex:
+    # date numbers near 7.4e5 days are exact to ~10 us, round to ms
+    ms = np.round((num - EPOCH_NUM) * 86400e3)
+    ns = np.full(len(num), np.iinfo(np.int64).min)  # NaT
+    valid = ~np.isnan(ms)
+    ns[valid] = ms[valid].astype(np.int64) * 1_000_000
+    return pd.DatetimeIndex(ns.view("datetime64[ns]"))
+
+
+class EventLog:
+    """Ring buffer of typed event records, with optional sinks"""
+
+    def __init__(self, level: int = INFO, capacity: int = EVENT_CAPACITY):
+        self.level = level
+        self.capacity = capacity
+        self.records = [None] * capacity
+        self.count = 0  # events recorded, `count - capacity` of them overwritten if over capacity
+        self.sinks = []
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def add_sink(self, sink, level: int = None) -> None:
+        """Call `sink(record)` for every event at or above `level`, default the log level"""
+        self.sinks.append((sink, self.level if level is None else level))
+
+    def _add(self, record: tuple) -> None:
+        self.records[self.count % self.capacity] = record
+        self.count += 1
+        for sink, level in self.sinks:
+            if record[1] >= level:
+                sink(record)
+
+    def message(self, dt: float, text: str, level: int = INFO) -> None:
+        if level < self.level:
+            return
+        self._add((dt, level, MESSAGE, -1, -1, 0, -1) + _EMPTY + (text,))
+
+    def account(self, dt: float, kind: int, value: float, cash: float) -> None:
+        if INFO < self.level:
+            return
+        self._add((dt, INFO, kind, -1, -1, 0, -1) + (np.nan,) * 8 + (value, cash, np.nan, np.nan, None))
+
+    def trigger(self, dt: float, direction: int, price: float, stop_loss: float, take_profit: float) -> None:
+        if INFO < self.level:
+            return
+        record = (dt, INFO, TRIGGER, -1, -1, direction, bt.Order.Market, price) + (np.nan,) * 9
+        self._add(record + (stop_loss, take_profit, None))
+
+    def order(self, dt: float, order: bt.Order) -> None:
+        status = order.status
+        if status in (order.Created, order.Submitted):
+            level = DEBUG
+        elif status in (order.Rejected, order.Margin) or order.exectype not in ORDER_TYPES:
+            level = WARNING
+        else:
+            level = INFO
+        if level < self.level:
+            return
+        created, executed = order.created, order.executed
+        self._add(
+            (
+                dt,
+                level,
+                ORDER,
+                order.ref,
+                status,
+                1 if order.isbuy() else -1,
+                order.exectype if order.exectype is not None else -1,
+                created.price,
+                created.size,
+                executed.price,
+                executed.size,
+                executed.margin if status in (order.Partial, order.Completed) else created.margin,
+                executed.comm,
+                np.nan,
+                np.nan,
+                np.nan,
+                np.nan,
+                np.nan,
+                np.nan,
+                None,
+            )
+        )
+
+    def trade(self, dt: float, trade: bt.Trade) -> None:
+        if INFO < self.level or not trade.isclosed:
+            return
+        record = (dt, INFO, TRADE, trade.ref, -1, 1 if trade.long else -1, -1, np.nan, trade.size) + (np.nan,) * 4
+        self._add(record + (trade.pnl, trade.pnlcomm) + (np.nan,) * 4 + (None,))
+
+    def iter_records(self):
+        """Records in order, oldest first"""
+        start = max(0, self.count - self.capacity)
+        for i in range(start, self.count):
+            yield self.records[i % self.capacity]
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame.from_records(list(self.iter_records()), columns=FIELDS)
+        df["datetime"] = num_to_datetime(df["datetime"].to_numpy(dtype=np.float64))
+        df["level"] = df["level"].map(logging.getLevelName)
+        df["kind"] = pd.Categorical.from_codes(df["kind"].to_numpy(dtype=np.int64), KIND_NAMES)
+        df[FLOAT_FIELDS] = df[FLOAT_FIELDS].astype(np.float64)
+        return df
+
+    def to_parquet(self, path: str) -> None:
+        self.to_frame().to_parquet(path, index=False)
+
+    def to_jsonl(self, path: str) -> None:
+        self.to_frame().to_json(path, orient="records", lines=True, date_format="iso")
+
+
+def format_event(record: tuple, digits: int = 5) -> str:
+    """Human readable line of an event record"""
+    dt, level, kind, ref, status, direction, exectype, price, size, executed_price, executed_size = record[:11]
+    margin, commission, pnl, pnlcomm, value, cash, stop_loss, take_profit, text = record[11:]
+    side = "BUY" if direction == 1 else "SELL"
+    order_type = ORDER_TYPES.get(exectype, "")
+
+    if kind == MESSAGE:
+        txt = text
+    elif kind in (START, STOP):
+        name = "START" if kind == START else "COMPLETE"
+        txt = f"STRATEGY {name}: value = {round(value, digits)}, cash = {round(cash, digits)}."
+    elif kind == TRIGGER:
+        txt = f"{side} MKT ORDER TRIGGERED."
+    elif kind == TRADE:
+        txt = f"TRADE {ref} CLOSED: gross_pnl = {round(pnl, digits)}, net_pnl = {round(pnlcomm, digits)}."
+    elif status == bt.Order.Accepted:
+        txt = f"{side} {order_type} ORDER ACCEPTED: price = {price}, size = {abs(size)}, margin = {margin}."
+    elif status in (bt.Order.Partial, bt.Order.Completed):
+        if direction == 1:
+            slippage = round((executed_price / price - 1) * 10000, 1)
+        else:
+            slippage = round((1 - executed_price / price) * 10000, 1)
+        partial = "PARTIALLY " if status == bt.Order.Partial else ""
+        txt = (
+            f"{side} {order_type} ORDER {partial}EXECUTED: "
+            f"order_price = {round(price, digits)}, execute_price = {round(executed_price, digits)}, "
+            f"slippage = {slippage} %%, size = {abs(executed_size)}, "
+            f"value = {round(abs(executed_price * executed_size), digits)}, "
+            f"margin = {margin}, commission = {round(commission, digits)}."
+        )
+    elif status in (bt.Order.Rejected, bt.Order.Margin):
+        txt = f"WARNING: {side} {order_type} ORDER {ORDER_STATUSES[status]}!"
+    else:
+        txt = f"{side} {order_type} ORDER {ORDER_STATUSES.get(status, status)}."
+
+    if dt != dt:  # nan, no bar yet
+        return txt
+    return f"[{bt.num2date(dt).strftime('%Y-%m-%d %H:%M:%S')}] {txt}"
+
+
+def print_sink(digits: int = 5):
+    """Sink printing `format_event` lines"""
+
+    def sink(record: tuple) -> None:
+        print(format_event(record, digits))
+
+    return sink
@@ -0,0 +1,477 @@
+"""
+Vectorized fast path of MyStrategy, for screening
+
+Runs MyStrategy on plain bars (`cerebro.adddata`, no replay) without backtrader:
+    1. every indicator is computed over the whole bar arrays, following backtrader's definitions (SMA seeded
+       exponential smoothing for EMA and SMMA, Wilder RSI, CrossOver on the last non-zero difference)
+    2. the latched signal of `MyStrategy.update_signal` is computed as an array, it does not depend on positions
+    3. the bracket orders are simulated event by event: the entry fills at the next bar's open, the stop and limit
+       children are active from the bar after, and the first bar touching either is found with a vectorized search
+
+Cash, margin checks and commission follow `BackBroker` with the percentage commission set up in `main.ipynb`, so
+the result has the same trade list as `MyStrategy.trade_log` and the same final value.
+
+The exponential smoothing and mark-to-market recursions run in numba if installed, otherwise in a plain python loop.
+
+`run_backtrader` runs the same bars and params through MyStrategy in backtrader, the reference the fast path must
+match: `same_result` compares two runs, `parity_param_sets` gives the params checked by `tests/test_fastpath.py` and
+`benchmarks/bench_fastpath.py`.
+
+Usage:
+    from src.fastpath import run_fastpath
+    result = run_fastpath(df, {"rsi_period": 14})
+    result["final_value"], result["trade_log"]
+"""
+
+import math
+import numpy as np
+import pandas as pd
+import backtrader as bt
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.defs import BROKER
+from src.feeds import FastPandasData
+from src.strategy import INSTRUMENT, MyStrategy
+from src.indicator_cache import data_fingerprint
+
+try:
+    from numba import njit
+except ImportError:  # optional dependency
+    njit = None
+
+DEFAULT_PARAMS = dict(MyStrategy.params._getitems())
+EXIT_SEARCH_STEP = 256
+# param space of the parity checks against backtrader
+PARITY_PARAM_SPACE = {
+    "macd_fast_period": (5, 20),
+    "macd_slow_period": (15, 40),
+    "macd_signal_period": (5, 15),
+    "rsi_period": (7, 28),
+    "rsi_ma_period": (10, 60),
+    "ma_period": (5, 50),
+    "high_low_period": (3, 20),
+    "rrr": (0.5, 3.0),
+    "sl_pct": (0.5, 2.0),
+}
+
+
+def _smooth_loop(values, out, start: int, alpha: float, alpha1: float) -> None:
+    prev = out[start - 1]
+    for i in range(start, len(values)):
+        prev = prev * alpha1 + values[i] * alpha
+        out[i] = prev
+
+
+_smooth_kernel = njit(cache=True)(_smooth_loop) if njit is not None else None
+
+
+def _first_valid(x: np.ndarray) -> int:
+    valid = np.flatnonzero(~np.isnan(x))
+    return int(valid[0]) if len(valid) > 0 else len(x)
+
+
+def sma(x: np.ndarray, period: int) -> np.ndarray:
+    """backtrader `SimpleMovingAverage`, NaN before the first full window"""
+    out = np.full(len(x), np.nan)
+    first = _first_valid(x)
+    if len(x) - first >= period:
+        out[first + period - 1 :] = sliding_window_view(x[first:], period).sum(axis=1) / period
+    return out
+
+
+def exp_smoothing(x: np.ndarray, period: int, alpha: float) -> np.ndarray:
+    """backtrader `ExponentialSmoothing`: seeded with the mean of the first `period` values"""
+    out = np.full(len(x), np.nan)
+    first = _first_valid(x)
+    seed = first + period - 1
+    if seed >= len(x):
+        return out
+
+    out[seed] = math.fsum(x[first : seed + 1]) / period
+    if _smooth_kernel is not None:
+        _smooth_kernel(x, out, seed + 1, alpha, 1.0 - alpha)
+    else:
+        values, smoothed = x.tolist(), out.tolist()
+        _smooth_loop(values, smoothed, seed + 1, alpha, 1.0 - alpha)
+        out[:] = smoothed
+    return out
+
+
+def ema(x: np.ndarray, period: int) -> np.ndarray:
+    return exp_smoothing(x, period, 2.0 / (1.0 + period))
+
+
+def smma(x: np.ndarray, period: int) -> np.ndarray:
+    return exp_smoothing(x, period, 1.0 / period)
+
+
+def rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """backtrader `RSI` with the default Wilder smoothing and lookback of 1"""
+    diff = np.full(len(close), np.nan)
+    diff[1:] = close[1:] - close[:-1]
+    with np.errstate(invalid="ignore"):
+        up = np.where(np.isnan(diff), np.nan, np.maximum(diff, 0.0))
+        down = np.where(np.isnan(diff), np.nan, np.maximum(-diff, 0.0))
+    rs = smma(up, period) / smma(down, period)
+    return 100.0 - 100.0 / (1.0 + rs)
+
+
+def highest(x: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1 :] = sliding_window_view(x, period).max(axis=1)
+    return out
+
+
+def lowest(x: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1 :] = sliding_window_view(x, period).min(axis=1)
+    return out
+
+
+def crossover(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """backtrader `CrossOver`: 1 / -1 where `a` crosses `b` up / down since the last non-zero difference, NaN
+    until one bar after both are valid"""
+    n = len(a)
+    out = np.full(n, np.nan)
+    start = max(_first_valid(a), _first_valid(b))
+    if start + 1 >= n:
+        return out
+
+    # last non-zero difference, seeded with the first difference even if zero
+    diff = a[start:] - b[start:]
+    positions = np.where(diff != 0, np.arange(len(diff)), 0)
+    nzd = diff[np.maximum.accumulate(positions)]
+
+    up = (nzd[:-1] < 0.0) & (a[start + 1 :] > b[start + 1 :])
+    down = (nzd[:-1] > 0.0) & (a[start + 1 :] < b[start + 1 :])
+    out[start + 1 :] = up.astype(np.float64) - down.astype(np.float64)
+    return out
+
+
+def compute_indicators(
+    close: np.ndarray, high: np.ndarray, low: np.ndarray, params: dict, cache=None, fingerprint: str = None
+) -> dict:
+    """Indicator arrays of MyStrategy
+
+    With an `IndicatorCache`, every series is looked up by the data `fingerprint` (hashed from the arrays if not
+    given), its kind and periods, so runs sharing periods compute it once.
+    """
+    p = {**DEFAULT_PARAMS, **params}
+    if cache is not None and fingerprint is None:
+        fingerprint = data_fingerprint(close, high, low)
+
+    def get(key: tuple, compute) -> np.ndarray:
+        return compute() if cache is None else cache.get(fingerprint, key, compute)
+
+    fast, slow, signal = p["macd_fast_period"], p["macd_slow_period"], p["macd_signal_period"]
+    rsi_period, rsi_ma_period, high_low_period = p["rsi_period"], p["rsi_ma_period"], p["high_low_period"]
+
+    macd = get(
+        ("macd", fast, slow),
+        lambda: get(("ema", fast), lambda: ema(close, fast)) - get(("ema", slow), lambda: ema(close, slow)),
+    )
+    macd_signal = get(("macd_signal", fast, slow, signal), lambda: ema(macd, signal))
+    rsi_ = get(("rsi", rsi_period), lambda: rsi(close, rsi_period))
+    rsi_ma = get(("rsi_ma", rsi_period, rsi_ma_period), lambda: sma(rsi_, rsi_ma_period))
+    return {
+        "sma": get(("sma", p["ma_period"]), lambda: sma(close, p["ma_period"])),
+        "macd": macd,
+        "macd_signal": macd_signal,
+        "rsi": rsi_,
+        "rsi_ma": rsi_ma,
+        "recent_high": get(("highest", high_low_period), lambda: highest(high, high_low_period)),
+        "recent_low": get(("lowest", high_low_period), lambda: lowest(low, high_low_period)),
+        "macd_crossover": get(("macd_crossover", fast, slow, signal), lambda: crossover(macd, macd_signal)),
+        "rsi_crossover": get(("rsi_crossover", rsi_period, rsi_ma_period), lambda: crossover(rsi_, rsi_ma)),
+    }
+
+
+def compute_signal(close: np.ndarray, indicators: dict) -> tuple:
+    """(first bar of `next()`, signal array) of `MyStrategy.update_signal`
+
+    `next()` starts once every indicator is valid, macd cross-overs before that are not seen.
+    """
+    n = len(close)
+    first = max(_first_valid(values) for values in indicators.values())
+    signal = np.zeros(n, dtype=np.int8)
+    if first >= n:
+        return first, signal
+
+    # latch the last macd cross-over since the first `next()`
+    macd_crossover = indicators["macd_crossover"][first:]
+    positions = np.where(macd_crossover != 0, np.arange(n - first), -1)
+    positions = np.maximum.accumulate(positions)
+    had_macd_cross = np.where(positions >= 0, macd_crossover[np.maximum(positions, 0)], 0)
+
+    rsi_crossover = indicators["rsi_crossover"][first:]
+    above = close[first:] > indicators["sma"][first:]
+    below = close[first:] < indicators["sma"][first:]
+    signal[first:][(had_macd_cross == 1) & (rsi_crossover == 1) & above] = 1
+    signal[first:][(had_macd_cross == -1) & (rsi_crossover == -1) & below] = -1
+    return first, signal
+
+
+def _executed_price(size: float, price: float) -> float:
+    """`Order.executed.price` of a single fill, averaged the way `OrderData.addbit` does"""
+    return (0.0 * 0.0 + size * price) / size
+
+
+def _find_exit(open_, high, low, start: int, is_long: bool, stop_price: float, limit_price: float) -> tuple:
+    """(bar, price, by_stop) of the first stop or limit fill from bar `start`, None if never filled
+
+    Same as `BackBroker`: the stop is tried before the limit, a gap through the price fills at the open.
+    """
+    n = len(open_)
+    step = EXIT_SEARCH_STEP
+    while start < n:
+        end = min(start + step, n)
+        o, h, l = open_[start:end], high[start:end], low[start:end]
+        if is_long:
+            stop_hit = (o <= stop_price) | (l <= stop_price)
+            limit_hit = (limit_price <= o) | (limit_price <= h)
+        else:
+            stop_hit = (o >= stop_price) | (h >= stop_price)
+            limit_hit = (limit_price >= o) | (limit_price >= l)
+        hit = stop_hit | limit_hit
+        if hit.any():
+            k = int(np.argmax(hit))
+            bar, o = start + k, float(o[k])
+            if stop_hit[k]:
+                gapped = o <= stop_price if is_long else o >= stop_price
+                return bar, o if gapped else stop_price, True
+            gapped = limit_price <= o if is_long else limit_price >= o
+            return bar, o if gapped else limit_price, False
+        start = end
+        step *= 2
+    return None
+
+
+def _mark_to_market_loop(close, start: int, end: int, size: float, adjbase: float, cash: float) -> float:
+    for i in range(start, end):
+        cash += size * (close[i] - adjbase) * 1.0
+        adjbase = close[i]
+    return cash
+
+
+_mark_to_market_kernel = njit(cache=True)(_mark_to_market_loop) if njit is not None else None
+
+
+class _Account:
+    """Cash of a `BackBroker` account set up as in `main.ipynb`
+
+    `setcommission(commtype=COMM_PERC, percabs=True, leverage=...)` makes a futures-like commission info with a margin
+    of 1.0 per unit: opening or closing moves `abs(size) / leverage` of cash, and the profit and loss of an open
+    position is added to cash at every bar close and at the exit price, instead of when the trade closes. The float
+    operations are done in the same order as `BackBroker`, for identical results.
+    """
+
+    def __init__(self, cash: float, commission: float, leverage: float):
+        self.cash = cash
+        self.commission = commission
+        self.leverage = leverage
+
+    def _comm(self, size: float, price: float) -> float:
+        return abs(size) * self.commission * price
+
+    def open(self, cash: float, size: float, price: float) -> float:
+        """Cash after opening `size` (negative for short) at `price`"""
+        cash -= abs(size) * 1.0 / self.leverage
+        cash -= self._comm(size, price)
+        return cash
+
+    def close(self, cash: float, size: float, price: float, adjbase: float = None) -> float:
+        """Cash after closing a position of `size` at `price`, marked to market last at `adjbase`"""
+        cash += abs(size) * 1.0 / self.leverage
+        cash -= self._comm(size, price)
+        if adjbase is not None:
+            cash += size * (price - adjbase) * 1.0
+        return cash
+
+    def mark_to_market(self, close: np.ndarray, start: int, end: int, size: float, adjbase: float) -> None:
+        """Add the profit and loss of a position of `size` at the close of bars [start, end)"""
+        if _mark_to_market_kernel is not None:
+            self.cash = _mark_to_market_kernel(close, start, end, size, adjbase, self.cash)
+        else:
+            self.cash = _mark_to_market_loop(close[start:end].tolist(), 0, end - start, size, adjbase, self.cash)
+
+    def bracket_accepted(self, size: float, price: float, stop_price: float, limit_price: float) -> bool:
+        """Margin check of a bracket at submission, each order pseudo-executed at its created price"""
+        cash = self.open(self.cash, size, price)
+        if cash < 0.0:
+            return False
+        cash = self.close(cash, size, stop_price)
+        if cash < 0.0:
+            return False
+        return self.open(cash, -size, limit_price) >= 0.0
+
+    def value(self, size: float, entry_price: float, price: float) -> float:
+        """Broker value with a position of `size` opened at `entry_price`, at the bar close `price`"""
+        if size == 0:
+            return self.cash + 0.0
+        unrealized = size * (price - entry_price) * 1.0
+        return self.cash + (0.0 + (abs(size) * 1.0 - unrealized) / self.leverage + unrealized)
+
+
+def run_fastpath(
+    df: pd.DataFrame,
+    params: dict = None,
+    cash: float = 1000,
+    commission: float = None,
+    leverage: float = 50,
+    instrument: str = None,
+    indicators: dict = None,
+    cache=None,
+    fingerprint: str = None,
+) -> dict:
+    """Run MyStrategy with `params` on the bars of `df`
+
+    df: bars with open / high / low / close, as loaded by `load_oanda_parquet` (any dtype)
+    instrument: BROKER instrument, default the `instrument` of `params`
+    commission: percentage commission, default `BROKER.COMMISSION[instrument]`
+    indicators: precomputed `compute_indicators` arrays for `params`
+    cache, fingerprint: `IndicatorCache` and data fingerprint passed to `compute_indicators`
+
+    Returns {"final_value", "cash", "trade_log", "indicators"}, `trade_log` as `MyStrategy.trade_log`, `indicators`
+    the `compute_indicators` arrays of the run.
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    instrument = p["instrument"] = instrument or p["instrument"]
+    broker = BROKER.definitions(instrument)
+    digits, spread, unit = broker["price_digits"], broker["spread"], broker["position_unit"]
+    commission = broker["commission"] if commission is None else commission
+
+    scale = df.attrs.get("price_scale")
+    prices = {}
+    for col in ["open", "high", "low", "close"]:
+        values = df[col].to_numpy(dtype=np.float64)
+        prices[col] = values / scale if scale else values
+    open_, high, low, close = prices["open"], prices["high"], prices["low"], prices["close"]
+
+    index = df.index
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    if indicators is None:
+        indicators = compute_indicators(close, high, low, p, cache=cache, fingerprint=fingerprint)
+    first, signal = compute_signal(close, indicators)
+    candidates = np.flatnonzero(signal)
+    recent_high, recent_low = indicators["recent_high"], indicators["recent_low"]
+
+    n = len(close)
+    account = _Account(cash, commission, leverage)
+    trade_log = []
+    position, entry_price = 0.0, 0.0
+    next_bar = first  # first bar a new order can be placed at
+    if p["trade_start"] is not None:
+        next_bar = max(first, int(index.searchsorted(pd.Timestamp(p["trade_start"]))))
+    while True:
+        k = np.searchsorted(candidates, next_bar)
+        if k >= len(candidates):
+            break
+        bar = int(candidates[k])
+        is_long = signal[bar] == 1
+        close_price = float(close[bar])
+
+        if is_long:
+            stop_price = round(float(recent_low[bar]) + spread, digits)
+            sl_dist = abs(close_price - stop_price)
+            limit_price = round(close_price + sl_dist * p["rrr"], digits)
+        else:
+            stop_price = round(float(recent_high[bar]) + spread, digits)
+            sl_dist = abs(close_price - stop_price)
+            limit_price = round(close_price - sl_dist * p["rrr"], digits)
+        size = ((account.cash * p["sl_pct"] / 100 / sl_dist) // unit) * unit
+        size = size if is_long else -size
+
+        entry_bar = bar + 1
+        if entry_bar >= n:
+            break
+        next_bar = entry_bar  # if the bracket is rejected, a new one can be placed at the entry bar
+        if not account.bracket_accepted(size, close_price, stop_price, limit_price):
+            continue
+        entry_cash = account.open(account.cash, size, float(open_[entry_bar]))
+        if entry_cash < 0.0:
+            continue
+
+        account.cash = entry_cash
+        position, entry_price = size, float(open_[entry_bar])
+        trade_log.append(
+            {
+                "datetime": index[entry_bar].strftime("%Y-%m-%d %H:%M:%S"),
+                "trade_num": len(trade_log) // 2 + 1,
+                "type": "open",
+                "direction": "BUY" if is_long else "SELL",
+                "last_close_price": close_price,
+                "created_price": close_price,
+                "executed_price": _executed_price(size, entry_price),
+                "stop_lose_price": stop_price,
+                "take_profit_price": limit_price,
+            }
+        )
+
+        # the stop and limit children are activated on the bar after the entry
+        exit_ = _find_exit(open_, high, low, entry_bar + 1, is_long, stop_price, limit_price)
+        if exit_ is None:
+            account.mark_to_market(close, entry_bar, n, position, entry_price)
+            break
+        exit_bar, exit_price, by_stop = exit_
+
+        account.mark_to_market(close, entry_bar, exit_bar, position, entry_price)
+        adjbase = float(close[exit_bar - 1])
+        account.cash = account.close(account.cash, position, exit_price, adjbase)
+        trade_log.append(
+            {
+                "datetime": index[exit_bar].strftime("%Y-%m-%d %H:%M:%S"),
+                "trade_num": trade_log[-1]["trade_num"],
+                "type": "close",
+                "direction": "SELL" if is_long else "BUY",
+                "last_close_price": close_price,
+                "created_price": stop_price if by_stop else limit_price,
+                "executed_price": _executed_price(-position, exit_price),
+                "stop_lose_price": np.nan,
+                "take_profit_price": np.nan,
+            }
+        )
+        position = 0.0
+        next_bar = exit_bar
+
+    final_value = account.value(position, entry_price, float(close[-1])) if n > 0 else account.cash
+    return {"final_value": final_value, "cash": account.cash, "trade_log": trade_log, "indicators": indicators}
+
+
+def run_backtrader(df: pd.DataFrame, params: dict = None, cash: float = 1000, leverage: float = 50) -> dict:
+    """MyStrategy with `params` in backtrader on the plain bars of `df`, set up as `run_fastpath` assumes
+
+    Returns {"final_value", "trade_log"}.
+    """
+    params = params or {}
+    instrument = params.get("instrument", INSTRUMENT)
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(
+        commission=BROKER.definitions(instrument)["commission"],
+        commtype=bt.CommInfoBase.COMM_PERC,
+        percabs=True,
+        leverage=leverage,
+    )
+    cerebro.adddata(FastPandasData(dataname=df, name=instrument))
+    cerebro.addstrategy(MyStrategy, verbose=False, **params)
+    strategy = cerebro.run()[0]
+    return {"final_value": cerebro.broker.getvalue(), "trade_log": strategy.trade_log}
+
+
+def same_result(expected, result) -> bool:
+    """Whether two runs, results or raised exception types, have the same trade list and final value"""
+    if not isinstance(expected, dict) or not isinstance(result, dict):
+        return expected is result
+    same_log = pd.DataFrame(expected["trade_log"]).equals(pd.DataFrame(result["trade_log"]))
+    return same_log and expected["final_value"] == result["final_value"]
+
+
+def parity_param_sets(samples: int, seed: int = 0) -> list:
+    """The default params and the valid ones of `samples` random param sets of `PARITY_PARAM_SPACE`"""
+    from src.optimize import param_samples, is_valid
+
+    return [{}] + [p for p in param_samples(PARITY_PARAM_SPACE, samples, seed=seed) if is_valid(p)]
@@ -0,0 +1,149 @@
+"""
+Backtrader data feeds over pandas frames
+
+`PandasData._load` reads every field of every bar with `DataFrame.iloc` and converts every timestamp with
+`date2num`. The feeds here convert the columns to numpy arrays and the index to backtrader date numbers once in
+`start()`, so loading a bar is a few array reads.
+
+Compact frames from `load_oanda_parquet(..., dtype="float32" | "ticks")` are read as they are, without a float64
+copy, and prices in ticks are divided by the frame's `price_scale` bar by bar.
+"""
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+from backtrader.utils import date2num
+
+# ordinal of 1970-01-01, backtrader date numbers are float days since 0001-01-01 + 1
+_EPOCH_ORDINAL = 719163
+_NS_PER_DAY = 86400 * 10**9
+
+
+def date2num_array(index: pd.DatetimeIndex) -> np.ndarray:
+    """Vectorized `backtrader.utils.date2num`, tz-aware times are converted to UTC
+
+    `date2num` adds the day and the hour/minute/second/microsecond fractions with `math.fsum`. The same fractions
+    are summed in extended precision and rounded once, which gives identical floats when `np.longdouble` has a
+    wider mantissa than float64. Otherwise it falls back to `date2num` per timestamp.
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    if np.finfo(np.longdouble).nmant <= np.finfo(np.float64).nmant:
+        return np.array([date2num(dt) for dt in index.to_pydatetime()], dtype=np.float64)
+
+    days, ns = np.divmod(index.asi8, _NS_PER_DAY)
+    seconds, microseconds = np.divmod(ns // 1000, 10**6)
+    hours, seconds = np.divmod(seconds, 3600)
+    minutes, seconds = np.divmod(seconds, 60)
+
+    total = (days + _EPOCH_ORDINAL).astype(np.longdouble)
+    for part in (hours / 24.0, minutes / 1440.0, seconds / 86400.0, microseconds / 86400e6):
+        total += part.astype(np.longdouble)
+    return total.astype(np.float64)
+
+
+# lines that are not prices, never scaled
+_UNSCALED_LINES = ("volume", "openinterest")
+
+
+class FastPandasData(bt.feeds.PandasData):
+    """`PandasData` loading bars from preconverted numpy arrays
+
+    price_scale: prices are integers in units of 1 / price_scale, default `dataname.attrs["price_scale"]` if any
+    """
+
+    params = (("price_scale", None),)
+
+    def start(self):
+        super(FastPandasData, self).start()
+
+        df = self.p.dataname
+        price_scale = self.p.price_scale or df.attrs.get("price_scale")
+        self._n_rows = len(df)
+        self._line_arrays = []
+        self._scaled_arrays = []
+        for datafield, colindex in self._colmapping.items():
+            if datafield == "datetime" or colindex is None:
+                continue
+            values = df.iloc[:, colindex].to_numpy()
+            if values.dtype.kind not in "fiu":
+                values = values.astype(np.float64)
+            if price_scale and datafield not in _UNSCALED_LINES:
+                self._scaled_arrays.append((getattr(self.lines, datafield), values, float(price_scale)))
+            else:
+                self._line_arrays.append((getattr(self.lines, datafield), values))
+
+        coldtime = self._colmapping["datetime"]
+        timestamps = df.index if coldtime is None else df.iloc[:, coldtime]
+        self._dtnums = date2num_array(timestamps)
+
+    def _load(self):
+        self._idx += 1
+        i = self._idx
+        if i >= self._n_rows:
+            return False
+
+        for line, values in self._line_arrays:
+            line[0] = float(values[i])
+        for line, values, scale in self._scaled_arrays:
+            line[0] = values[i] / scale
+        self.lines.datetime[0] = self._dtnums[i]
+        return True
+
+
+class BidAskPandasData(FastPandasData):
+    """Mid OHLC plus bid and ask OHLC lines, from `load_oanda_parquet(..., bid_ask=True)`"""
+
+    lines = (
+        "bid_open",
+        "bid_high",
+        "bid_low",
+        "bid_close",
+        "ask_open",
+        "ask_high",
+        "ask_low",
+        "ask_close",
+    )
+
+    params = (
+        ("bid_open", -1),
+        ("bid_high", -1),
+        ("bid_low", -1),
+        ("bid_close", -1),
+        ("ask_open", -1),
+        ("ask_high", -1),
+        ("ask_low", -1),
+        ("ask_close", -1),
+    )
+
+
+class IntrabarPandasData(FastPandasData):
+    """Bars of `dataname` plus the finer bars they were built from, for `src.broker.IntrabarBroker`
+
+    intrabar: the finer bars, e.g. M1 for H1 `dataname = resample_bars(intrabar, 60)`. Each bar of `dataname` must
+        be labelled by its open time and cover the finer bars up to the next label.
+    """
+
+    params = (("intrabar", None),)
+
+    def start(self):
+        super(IntrabarPandasData, self).start()
+
+        intrabar = self.p.intrabar
+        if intrabar is None:
+            raise ValueError("IntrabarPandasData needs the finer bars in `intrabar`.")
+        price_scale = self.p.price_scale or intrabar.attrs.get("price_scale")
+        self.intrabar_prices = []
+        for col in ["open", "high", "low"]:
+            values = intrabar[col].to_numpy(dtype=np.float64)
+            self.intrabar_prices.append(values / price_scale if price_scale else values)
+
+        starts = intrabar.index.searchsorted(self.p.dataname.index)
+        self._intrabar_bounds = np.r_[starts, len(intrabar)]
+
+    def intrabar_rows(self) -> tuple:
+        """[first, end) rows of `intrabar` inside the current bar"""
+        i = len(self) - 1
+        return int(self._intrabar_bounds[i]), int(self._intrabar_bounds[i + 1])
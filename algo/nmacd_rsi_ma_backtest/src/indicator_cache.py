@@ -0,0 +1,111 @@
+"""
+Indicator cache shared by the runs of a parameter sweep
+
+Indicator series are keyed by (data fingerprint, indicator kind, periods...), e.g. ("3f2a...", "ema", 12). A sweep
+over risk params (`rrr`, `sl_pct`) or `high_low_period` asks for the same MACD / RSI / SMA series every run, so each
+distinct series is computed once per dataset and then served from memory.
+
+Memory is bounded by `max_bytes`, least recently used series are evicted first. With a `cache_dir`, every computed
+series is also saved as
+    {cache_dir}/{fingerprint}/{kind}_{period}_....npy
+and evicted or unseen series are opened from there memory-mapped, so worker processes and later sweeps share them.
+
+Cached arrays are read-only.
+
+Usage:
+    cache = IndicatorCache(cache_dir=".indicator_cache")
+    fingerprint = data_fingerprint(close, high, low)
+    ema_12 = cache.get(fingerprint, ("ema", 12), lambda: ema(close, 12))
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+from src.utils import logger
+
+INDICATOR_CACHE_DIR = ".indicator_cache"
+INDICATOR_CACHE_BYTES = 256 * 2**20
+
+
+def data_fingerprint(*arrays: np.ndarray) -> str:
+    """Hash of the contents of the bar arrays an indicator is computed from"""
+    h = hashlib.blake2b(digest_size=16)
+    for values in arrays:
+        values = np.ascontiguousarray(values)
+        h.update(str((values.dtype, values.shape)).encode())
+        h.update(values.data)
+    return h.hexdigest()
+
+
+class IndicatorCache:
+    """Bounded LRU of indicator arrays, optionally backed by `.npy` files in `cache_dir`"""
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_BYTES, cache_dir: str = None):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, fingerprint: str, key: tuple) -> str:
+        return os.path.join(self.cache_dir, fingerprint, "_".join(str(k) for k in key) + ".npy")
+
+    def _load(self, fingerprint: str, key: tuple) -> np.ndarray:
+        if self.cache_dir is None:
+            return None
+        path = self._path(fingerprint, key)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def _save(self, fingerprint: str, key: tuple, values: np.ndarray) -> None:
+        path = self._path(fingerprint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, values)
+        os.replace(tmp_path, path)
+
+    def _put(self, full_key: tuple, values: np.ndarray) -> None:
+        self._entries[full_key] = values
+        self.n_bytes += values.nbytes
+        while self.n_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.n_bytes -= evicted.nbytes
+
+    def get(self, fingerprint: str, key: tuple, compute) -> np.ndarray:
+        """Series `key` of the data `fingerprint`, `compute()` it on a miss"""
+        full_key = (fingerprint, *key)
+        values = self._entries.get(full_key)
+        if values is not None:
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return values
+
+        values = self._load(fingerprint, key)
+        if values is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            values = np.asarray(compute())
+            if self.cache_dir is not None:
+                self._save(fingerprint, key, values)
+            values.flags.writeable = False
+        self._put(full_key, values)
+        return values
+
+    def clear(self) -> None:
+        """Drop the in-memory entries, files in `cache_dir` are kept"""
+        self._entries.clear()
+        self.n_bytes = 0
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Indicator cache: {self.hits} hits, {self.misses} misses, {len(self)} series, "
+            f"{self.n_bytes / 2**20:.1f} MiB."
+        )
@@ -0,0 +1,221 @@
+"""
+Monte Carlo robustness of the MyStrategy trade sequence
+
+MyStrategy risks `sl_pct` of its cash on every trade (`calc_size`), so a trade is summed up by its R multiple, the
+profit and loss over the stop-loss amount, net of commission. The R multiples of a `trade_log` (or of per-trade
+PnL) are resampled into many alternative trade sequences, each compounded at a given `sl_pct`:
+    bootstrap: trades drawn independently with replacement
+    block: circular blocks of `block` consecutive trades drawn with replacement, keeps streaks of wins and losses
+    shuffle: the same trades in a random order, the final equity is the same for every path, the drawdowns are not
+
+Paths run in chunks of a bounded number of cells, as one NumPy matrix of log returns per chunk: a cumulative sum
+gives the equity, a running maximum the drawdowns. Chunks are spread over a process pool, each with its own seed
+spawned from `seed`, so results do not depend on the number of workers.
+
+Usage:
+    from src.montecarlo import r_multiples, monte_carlo, summarize
+    paths = monte_carlo(r_multiples(result.trade_log), sl_pct=1, n_paths=100_000, seed=0)
+    summarize(paths)
+
+    python -m src.montecarlo --trade-log __temp_trade_log.parquet --sl-pct 0.5 1 2 --paths 100000 --method block
+"""
+
+import os
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.defs import BROKER
+from src.utils import logger
+from src.strategy import INSTRUMENT
+
+METHODS = ["bootstrap", "block", "shuffle"]
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+MAX_CHUNK_BYTES = 64 * 2**20
+
+
+def r_multiples(trade_log, commission: float = None, instrument: str = INSTRUMENT) -> np.ndarray:
+    """R multiples of the closed trades of a `MyStrategy.trade_log` (list of dicts or DataFrame)
+
+    The stop-loss distance is the one of `MyStrategy.calc_size`, from the last close to the stop-loss price.
+    commission: percentage commission, default `BROKER.COMMISSION[instrument]`, charged on both fills
+    """
+    commission = BROKER.definitions(instrument)["commission"] if commission is None else commission
+    log = pd.DataFrame(trade_log)
+    if len(log) == 0:
+        return np.empty(0)
+    opens = log[log["type"] == "open"].set_index("trade_num")
+    closes = log[log["type"] == "close"].set_index("trade_num")
+    opens = opens.loc[opens.index.intersection(closes.index)]  # drop the trade still open at the end
+    closes = closes.loc[opens.index]
+
+    entry = opens["executed_price"].to_numpy(dtype=np.float64)
+    exit_ = closes["executed_price"].to_numpy(dtype=np.float64)
+    sl_dist = np.abs(opens["last_close_price"].to_numpy(dtype=np.float64) - opens["stop_lose_price"].to_numpy())
+    if np.any(sl_dist == 0):
+        raise ValueError("Trade with a zero stop-loss distance.")
+    sign = np.where(opens["direction"].to_numpy() == "BUY", 1.0, -1.0)
+    return (sign * (exit_ - entry) - commission * (entry + exit_)) / sl_dist
+
+
+def r_multiples_from_pnl(pnl, cash: float = 1000, sl_pct: float = 1) -> np.ndarray:
+    """R multiples of the per-trade PnL of a run started at `cash`, sized at `sl_pct` of the cash"""
+    pnl = np.asarray(pnl, dtype=np.float64)
+    equity_before = cash + np.concatenate([[0.0], np.cumsum(pnl)[:-1]])
+    if np.any(equity_before <= 0):
+        raise ValueError("Account equity is not positive before a trade.")
+    return pnl / equity_before / (sl_pct / 100)
+
+
+def _sample(log_returns: np.ndarray, rng: np.random.Generator, n_paths: int, n_trades: int, method: str, block: int):
+    n = len(log_returns)
+    if method == "bootstrap":
+        return log_returns[rng.integers(0, n, size=(n_paths, n_trades))]
+    if method == "block":
+        starts = rng.integers(0, n, size=(n_paths, math.ceil(n_trades / block), 1))
+        idx = (starts + np.arange(block)) % n
+        return log_returns[idx.reshape(n_paths, -1)[:, :n_trades]]
+    paths = np.tile(log_returns, (n_paths, 1))
+    rng.permuted(paths, axis=1, out=paths)
+    return paths[:, :n_trades]
+
+
+def _simulate_chunk(
+    log_returns: np.ndarray, n_paths: int, n_trades: int, method: str, block: int, seed: np.random.SeedSequence
+) -> tuple:
+    """(final log equity, max drawdown in log, min log equity) of `n_paths` paths"""
+    equity = _sample(log_returns, np.random.default_rng(seed), n_paths, n_trades, method, block)
+    np.cumsum(equity, axis=1, out=equity)
+    final, low = equity[:, -1].copy(), equity.min(axis=1)
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(peak, 0.0, out=peak)  # the starting equity is the first peak
+    peak -= equity
+    return final, peak.max(axis=1), low
+
+
+def monte_carlo(
+    r: np.ndarray,
+    sl_pct: float = 1,
+    n_paths: int = 10_000,
+    n_trades: int = None,
+    method: str = "bootstrap",
+    block: int = 10,
+    cash: float = 1000,
+    ruin: float = 0.5,
+    seed: int = None,
+    max_workers: int = None,
+    max_chunk_bytes: int = MAX_CHUNK_BYTES,
+) -> pd.DataFrame:
+    """Simulate `n_paths` trade sequences of the R multiples `r`, risking `sl_pct` of the equity on every trade
+
+    n_trades: trades per path, default `len(r)`, at most `len(r)` with "shuffle"
+    method: one of `METHODS`, `block` is the block length of "block"
+    ruin: fraction of `cash` at or below which an account is ruined, a trade losing all the equity always ruins it
+    max_workers: processes, default the CPU count, chunks run in this process with 1
+    max_chunk_bytes: memory of one chunk of paths
+
+    Returns one row per path: final_equity, max_drawdown (pct, as the DrawDown analyzer), ruined.
+    """
+    r = np.asarray(r, dtype=np.float64)
+    n_trades = len(r) if n_trades is None else n_trades
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, must be one of {METHODS}.")
+    if len(r) == 0 or n_trades <= 0 or n_paths <= 0:
+        raise ValueError("Need at least one trade and one path.")
+    if method == "shuffle" and n_trades > len(r):
+        raise ValueError(f"Cannot shuffle {len(r)} trades into paths of {n_trades}.")
+    if block <= 0:
+        raise ValueError("block must be positive.")
+
+    with np.errstate(divide="ignore"):
+        log_returns = np.log1p(np.maximum(r * (sl_pct / 100), -1.0))  # -inf when a trade loses all the equity
+
+    # three float / int matrices of the chunk: sampled indices, equity, running peak
+    chunk = max(1, min(n_paths, max_chunk_bytes // (24 * n_trades)))
+    sizes = [min(chunk, n_paths - start) for start in range(0, n_paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(log_returns, size, n_trades, method, block, s) for size, s in zip(sizes, seeds)]
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if max_workers == 1:
+        parts = [_simulate_chunk(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(_simulate_chunk, *zip(*tasks)))
+    final, drawdown, low = (np.concatenate(part) for part in zip(*parts))
+
+    return pd.DataFrame(
+        {
+            "final_equity": cash * np.exp(final),
+            "max_drawdown": -np.expm1(-drawdown) * 100,
+            "ruined": low <= np.log(ruin),
+        }
+    )
+
+
+def summarize(paths: pd.DataFrame, quantiles: list = QUANTILES) -> pd.Series:
+    """Mean and quantiles of the final equity and max drawdown of `monte_carlo` paths, and the risk of ruin"""
+    stats = {}
+    for col in ["final_equity", "max_drawdown"]:
+        stats[f"{col}_mean"] = paths[col].mean()
+        values = np.quantile(paths[col].to_numpy(), quantiles)
+        stats.update({f"{col}_p{q * 100:g}": v for q, v in zip(quantiles, values)})
+    stats["risk_of_ruin"] = paths["ruined"].mean()
+    return pd.Series(stats)
+
+
+def _read_table(path: str) -> pd.DataFrame:
+    return pd.read_parquet(path) if ".parquet" in os.path.basename(path) else pd.read_csv(path)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness of the MyStrategy trade sequence.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--trade-log", help="parquet (`MyStrategy.trades.to_parquet`) or csv of MyStrategy.trade_log")
+    source.add_argument("--pnl", help="parquet or csv with a `pnl` column, one row per trade")
+    parser.add_argument("--pnl-cash", type=float, default=1000, help="starting cash of the --pnl run")
+    parser.add_argument("--pnl-sl-pct", type=float, default=1, help="sl_pct of the --pnl run")
+    parser.add_argument("--sl-pct", nargs="*", type=float, default=[1], help="sl_pct values to simulate")
+    parser.add_argument("--paths", type=int, default=10_000)
+    parser.add_argument("--trades", type=int, help="trades per path, default the number of trades")
+    parser.add_argument("--method", default="bootstrap", choices=METHODS)
+    parser.add_argument("--block", type=int, default=10, help="block length of --method block")
+    parser.add_argument("--cash", type=float, default=1000)
+    parser.add_argument("--ruin", type=float, default=0.5, help="fraction of --cash counted as ruin")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-workers", type=int)
+    parser.add_argument("--output", help="csv file of the summaries")
+    args = parser.parse_args(argv)
+
+    if args.trade_log is not None:
+        r = r_multiples(_read_table(args.trade_log))
+    else:
+        r = r_multiples_from_pnl(_read_table(args.pnl)["pnl"], cash=args.pnl_cash, sl_pct=args.pnl_sl_pct)
+    logger.info(f"{len(r)} trades, mean R {r.mean():.3f}, win rate {(r > 0).mean():.1%}.")
+
+    summaries = {}
+    for sl_pct in args.sl_pct:
+        paths = monte_carlo(
+            r,
+            sl_pct=sl_pct,
+            n_paths=args.paths,
+            n_trades=args.trades,
+            method=args.method,
+            block=args.block,
+            cash=args.cash,
+            ruin=args.ruin,
+            seed=args.seed,
+            max_workers=args.max_workers,
+        )
+        summaries[sl_pct] = summarize(paths)
+    summary = pd.DataFrame(summaries).rename_axis(columns="sl_pct")
+    if args.output is not None:
+        summary.to_csv(args.output)
+    print(summary.to_string())
+
+
+if __name__ == "__main__":
+    main()
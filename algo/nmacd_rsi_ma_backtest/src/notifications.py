@@ -1,5 +1,23 @@
 import backtrader as bt
 
+ORDER_TYPES = {
+    bt.Order.Market: "MKT",
+    bt.Order.Limit: "LMT",
+    bt.Order.Stop: "STOP",
+    bt.Order.StopLimit: "STOPLMT",
+}
+ORDER_STATUSES = {
+    bt.Order.Created: "CREATED",
+    bt.Order.Submitted: "SUBMITTED",
+    bt.Order.Accepted: "ACCEPTED",
+    bt.Order.Partial: "PARTIALLY EXECUTED",
+    bt.Order.Completed: "EXECUTED",
+    bt.Order.Cancelled: "CANCELLED",
+    bt.Order.Expired: "EXPIRED",
+    bt.Order.Margin: "MARGIN LIMIT",
+    bt.Order.Rejected: "REJECTED",
+}
+
 
 # def log_trade()
 def log_trade(trade: bt.trade.Trade, digits=5, log_func=print) -> None:
@@ -12,24 +30,18 @@ def log_trade(trade: bt.trade.Trade, digits=5, log_func=print) -> None:
 
 
 def log_order(order: bt.order.Order, digits=5, log_func=print) -> None:
+    if order.status in [order.Created, order.Submitted]:
+        return
+
     # extract order type
-    d_order_type = {
-        order.Market: "MKT",
-        order.Limit: "LMT",
-        order.Stop: "STOP",
-        order.StopLimit: "STOPLMT",
-    }
-    if order.exectype in d_order_type:
-        order_type = d_order_type[order.exectype]
+    if order.exectype in ORDER_TYPES:
+        order_type = ORDER_TYPES[order.exectype]
     else:
         order_type = ""
         log_func(f"WARNING: UNKNOWN ORDER TYPEL: {order.exectype}")
     direction = "BUY" if order.isbuy() else "SELL"
     partial = "PARTIALLY " if order.status == order.Partial else ""  # order.executed.exbits has partial fill details
 
-    if order.status in [order.Created, order.Submitted]:
-        return
-
     if order.status == order.Accepted:
         log_func(
             f"{direction} {order_type} ORDER ACCEPTED: "
@@ -0,0 +1,372 @@
+"""
+Parallel parameter sweep of MyStrategy
+
+The bars are loaded once into the memory-mapped bar cache (`src.cache`). Every worker process opens the cache entry
+when it starts, so all workers share the same read-only pages and no frame is pickled per task. Each task only
+sends a dict of strategy params and gets back one result row:
+    params..., final_value, return_pct, sharpe, max_drawdown, trades, error
+
+Results are streamed as runs finish, and appended to a csv file if given. The number of tasks in flight is bounded,
+so a sweep of 10k combinations does not queue 10k futures up front.
+
+With `engine="fastpath"`, runs use `src.fastpath` instead of backtrader (no sharpe / drawdown), on the bars resampled
+once per worker to `compression` minutes, or as they are with compression 0. Each worker keeps an `IndicatorCache`, so indicator series shared by runs, e.g. in a sweep of `rrr` and `sl_pct` only,
+are computed once per worker, or once per sweep with a disk-backed `indicator_cache_dir`.
+
+Usage:
+    python -m src.optimize --data oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz \
+        --grid '{"rsi_period": [14, 21], "ma_period": [13, 21, 34]}' --output sweep.csv
+    python -m src.optimize --data ... --space '{"rrr": [0.5, 3.0], "high_low_period": [4, 16]}' --samples 1000
+    python -m src.optimize --data ... --engine fastpath --grid '{"rrr": [1, 1.5, 2], "sl_pct": [1, 2]}'
+"""
+
+import os
+import json
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import backtrader as bt
+
+from src.defs import BROKER
+from src.utils import logger, resample_bars
+from src.cache import BAR_CACHE_DIR, bar_cache_path, open_bars
+from src.feeds import FastPandasData, BidAskPandasData, IntrabarPandasData
+from src.broker import BidAskBroker, IntrabarBroker
+from src.strategy import MyStrategy
+from src.fastpath import run_fastpath
+from src.profiling import ProfileAnalyzer
+from src.analytics import PerformanceAnalyzer
+from src.indicator_cache import INDICATOR_CACHE_BYTES, IndicatorCache
+
+CASH = 1000
+LEVERAGE = 50
+
+ENGINES = ["backtrader", "fastpath"]
+RESULT_COLS = ["final_value", "return_pct", "sharpe", "max_drawdown", "trades", "error"]
+
+# bars and run settings of a worker process, set once by `_init_worker`
+_worker = {}
+
+
+def param_grid(grid: dict) -> list:
+    """Every combination of a {param: [values]} grid"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def param_samples(space: dict, n: int, seed: int = None) -> list:
+    """`n` random combinations of a space of {param: [choices]} or {param: (low, high)}
+
+    A (low, high) tuple of ints is sampled uniformly in [low, high], of floats in [low, high). Lists are choices.
+    """
+    rng = random.Random(seed)
+
+    def _sample(values):
+        if isinstance(values, tuple):
+            low, high = values
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return rng.uniform(low, high)
+        return rng.choice(values)
+
+    return [{name: _sample(values) for name, values in space.items()} for _ in range(n)]
+
+
+def is_valid(params: dict) -> bool:
+    """False for combinations MyStrategy would run meaningless, e.g. a fast MACD period not below the slow one"""
+    p = {name: default for name, default in MyStrategy.params._getitems()}
+    p.update(params)
+    return p["macd_fast_period"] < p["macd_slow_period"]
+
+
+def slice_bars(df: pd.DataFrame, start_time, end_time) -> pd.DataFrame:
+    """Bars in [start_time, end_time), a view for memory-mapped frames"""
+    start, end = df.index.searchsorted([pd.Timestamp(start_time), pd.Timestamp(end_time)])
+    return df.iloc[start:end]
+
+
+def _init_worker(cache_path: str, settings: dict) -> None:
+    _worker["df"] = open_bars(cache_path)
+    _worker["settings"] = settings
+    if settings["intrabar"] or (settings["engine"] == "fastpath" and settings["compression"] is not None):
+        _worker["bars"] = resample_bars(_worker["df"], settings["compression"])
+    if settings["engine"] == "fastpath":
+        _worker["indicators"] = IndicatorCache(settings["indicator_cache_bytes"], settings["indicator_cache_dir"])
+        # the bar cache key already hashes the source contents and loader arguments
+        _worker["fingerprint"] = f"{os.path.basename(cache_path)}_{settings['compression']}"
+
+
+def run_backtest(
+    df: pd.DataFrame,
+    params: dict,
+    settings: dict,
+    bars: pd.DataFrame = None,
+    equity: bool = False,
+    trade_start=None,
+    profile: dict = None,
+) -> dict:
+    """Run MyStrategy with `params` on `df` quietly, return the result row
+
+    settings: instrument, cash, leverage, compression (None to run the bars as they are), bid_ask, intrabar
+    bars: `resample_bars(df, compression)` for `intrabar`, resampled here if not given
+    equity: add the broker value at the end of every bar, a Series indexed by bar datetime, to the row as "equity"
+    trade_start: MyStrategy `trade_start`, the bars before it only warm up the indicators
+    profile: `ProfileAnalyzer` params, add its report to the row as "profile"
+    """
+    instrument = settings["instrument"]
+    cerebro = bt.Cerebro(stdstats=False)
+    if settings["bid_ask"]:
+        cerebro.setbroker(BidAskBroker())
+    elif settings.get("intrabar"):
+        cerebro.setbroker(IntrabarBroker())
+    cerebro.broker.setcash(settings["cash"])
+    cerebro.broker.setcommission(
+        commission=BROKER.definitions(instrument)["commission"],
+        commtype=bt.CommInfoBase.COMM_PERC,
+        percabs=True,
+        leverage=settings["leverage"],
+    )
+
+    if settings.get("intrabar"):
+        bars = resample_bars(df, settings["compression"]) if bars is None else bars
+        cerebro.adddata(IntrabarPandasData(dataname=bars, intrabar=df, name=instrument))
+    else:
+        feed = BidAskPandasData if settings["bid_ask"] else FastPandasData
+        data = feed(dataname=df, name=instrument)
+        if settings["compression"] is None:
+            cerebro.adddata(data)
+        else:
+            cerebro.replaydata(data, timeframe=bt.TimeFrame.Minutes, compression=settings["compression"])
+
+    cerebro.addstrategy(MyStrategy, verbose=False, trade_start=trade_start, **{**params, "instrument": instrument})
+    cerebro.addanalyzer(PerformanceAnalyzer, _name="Performance")
+    if profile is not None:
+        cerebro.addanalyzer(ProfileAnalyzer, _name="Profile", **profile)
+
+    result = cerebro.run()[0]
+    final_value = cerebro.broker.getvalue()
+    performance = result.analyzers.Performance.get_analysis()
+    row = {
+        **params,
+        "final_value": final_value,
+        "return_pct": (final_value / settings["cash"] - 1) * 100,
+        "sharpe": performance["returns"]["sharpe"],
+        "max_drawdown": performance["drawdown"]["max_drawdown_pct"],
+        "trades": performance["trades"]["trades"] + performance["trades"]["open_trades"],
+        "error": None,
+    }
+    if equity:
+        row["equity"] = result.analyzers.Performance.equity()
+    if profile is not None:
+        row["profile"] = dict(result.analyzers.Profile.get_analysis())
+    return row
+
+
+def run_fast_backtest(
+    df: pd.DataFrame,
+    params: dict,
+    settings: dict,
+    bars: pd.DataFrame = None,
+    cache: IndicatorCache = None,
+    fingerprint: str = None,
+) -> dict:
+    """Run MyStrategy with `params` with `src.fastpath`, return the result row
+
+    The fast path runs plain bars: `df` as it is with compression None, else `bars`, `resample_bars(df, compression)`
+    resampled here if not given.
+    """
+    if settings["compression"] is not None:
+        bars = resample_bars(df, settings["compression"]) if bars is None else bars
+    else:
+        bars = df
+    result = run_fastpath(
+        bars,
+        params,
+        cash=settings["cash"],
+        leverage=settings["leverage"],
+        instrument=settings["instrument"],
+        cache=cache,
+        fingerprint=fingerprint,
+    )
+    final_value = result["final_value"]
+    return {
+        **params,
+        "final_value": final_value,
+        "return_pct": (final_value / settings["cash"] - 1) * 100,
+        "sharpe": None,
+        "max_drawdown": None,
+        "trades": (len(result["trade_log"]) + 1) // 2,
+        "error": None,
+    }
+
+
+def run_task(params: dict, window: tuple = None, equity: bool = False, trade_start=None) -> dict:
+    """Result row of one run in a worker, on the bars in the (start, end) `window` if given"""
+    df, bars, fingerprint = _worker["df"], _worker.get("bars"), _worker.get("fingerprint")
+    if window is not None:
+        df = slice_bars(df, *window)
+        bars = slice_bars(bars, *window) if bars is not None else None
+        fingerprint = f"{fingerprint}_{'_'.join(str(pd.Timestamp(t).value) for t in window)}"
+    try:
+        if _worker["settings"]["engine"] == "fastpath" and not equity:
+            return run_fast_backtest(df, params, _worker["settings"], bars, _worker["indicators"], fingerprint)
+        return run_backtest(df, params, _worker["settings"], bars, equity=equity, trade_start=trade_start)
+    except Exception as e:  # one failed combination must not stop the sweep
+        return {**params, **{col: None for col in RESULT_COLS}, "error": f"{type(e).__name__}: {e}"}
+
+
+def sweep_settings(
+    file: str,
+    instrument: str = "EUR_USD",
+    compression: int = 60,
+    bid_ask: bool = False,
+    intrabar: bool = False,
+    cash: float = CASH,
+    leverage: float = None,
+    cache_dir: str = BAR_CACHE_DIR,
+    engine: str = "backtrader",
+    indicator_cache_dir: str = None,
+    indicator_cache_bytes: int = INDICATOR_CACHE_BYTES,
+    **loader_args,
+) -> tuple:
+    """(bar cache path, worker settings) of a sweep, the bar cache entry is built if missing
+
+    `instrument` must be defined in every `BROKER` table, `leverage` defaults to its `BROKER.LEVERAGE`.
+
+    `file`, `instrument` and `loader_args` are passed to `load_oanda_parquet` through the bar cache. `compression`
+    replays the bars into bars of that many minutes, None runs the bars as they are. With `intrabar`, the bars are
+    resampled to `compression` minutes instead, and stop / limit fills are resolved on the original bars by
+    `IntrabarBroker`, so `next()` runs once per resampled bar.
+
+    `engine="fastpath"` runs mid prices through `src.fastpath`, on plain bars resampled to `compression` minutes
+    (as `intrabar`, but filled on the resampled bars), sharing indicators in an `IndicatorCache` of `indicator_cache_bytes` per worker, backed by `indicator_cache_dir` if given.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, must be one of {ENGINES}.")
+    broker = BROKER.definitions(instrument)  # before any bars are loaded or workers started
+    if engine == "fastpath" and bid_ask:
+        raise ValueError("The fast path runs mid prices only, use bid_ask=False.")
+    if intrabar and (compression is None or bid_ask or engine != "backtrader"):
+        raise ValueError("Intrabar fills need a compression, mid prices and the backtrader engine.")
+
+    cache_path = bar_cache_path(file, instrument=instrument, bid_ask=bid_ask, cache_dir=cache_dir, **loader_args)
+    settings = {
+        "instrument": instrument,
+        "cash": cash,
+        "leverage": broker["leverage"] if leverage is None else leverage,
+        "compression": compression,
+        "bid_ask": bid_ask,
+        "intrabar": intrabar,
+        "engine": engine,
+        "indicator_cache_dir": indicator_cache_dir,
+        "indicator_cache_bytes": indicator_cache_bytes,
+    }
+    return cache_path, settings
+
+
+def worker_pool(cache_path: str, settings: dict, max_workers: int = None) -> ProcessPoolExecutor:
+    """Process pool whose workers open the cached bars once, tasks are submitted as `run_task`"""
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(cache_path, settings))
+
+
+def iter_sweep(file: str, param_sets: list, max_workers: int = None, **kwargs):
+    """Run MyStrategy for every dict of params in `param_sets` across a process pool, yield result rows as they finish
+
+    `kwargs` are the arguments of `sweep_settings`.
+    """
+    cache_path, settings = sweep_settings(file, **kwargs)
+    max_workers = max_workers or os.cpu_count() or 1
+    param_sets = iter(param_sets)
+    with worker_pool(cache_path, settings, max_workers) as executor:
+        pending = set()
+        while True:
+            # keep two tasks per worker in flight, so workers never wait for the next task
+            for params in itertools.islice(param_sets, 2 * max_workers - len(pending)):
+                pending.add(executor.submit(run_task, params))
+            if len(pending) == 0:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def run_sweep(file: str, param_sets: list, output: str = None, **kwargs) -> pd.DataFrame:
+    """`iter_sweep` collected into one results table, rows are appended to the csv `output` as they finish"""
+    param_sets = [params for params in param_sets if is_valid(params)]
+    logger.info(f"Sweeping {len(param_sets)} parameter sets.")
+
+    rows = []
+    for i, row in enumerate(iter_sweep(file, param_sets, **kwargs), 1):
+        rows.append(row)
+        if output is not None:
+            pd.DataFrame([row]).to_csv(output, mode="a", header=not os.path.exists(output), index=False)
+        if row["error"] is not None:
+            logger.warning(f"Run {row} failed.")
+        if i % 100 == 0 or i == len(param_sets):
+            logger.info(f"Finished {i}/{len(param_sets)} runs.")
+
+    return pd.DataFrame(rows)
+
+
+def add_sweep_arguments(parser: argparse.ArgumentParser) -> None:
+    """Data, run and parameter space arguments shared by the sweep command lines"""
+    parser.add_argument("--data", required=True, help="parquet file or MarketDataStore root")
+    parser.add_argument("--instrument", default="EUR_USD")
+    parser.add_argument("--granularity", help="granularity to load from a MarketDataStore")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--compression", type=int, default=60, help="replay into bars of N minutes, 0 to disable")
+    parser.add_argument("--bid-ask", action="store_true", help="fill buys at ask and sells at bid")
+    parser.add_argument("--intrabar", action="store_true", help="run resampled bars, fill stops / limits intrabar")
+    parser.add_argument("--engine", choices=ENGINES, default="backtrader")
+    parser.add_argument("--indicator-cache", help="directory the fast path indicator cache is saved to")
+    space = parser.add_mutually_exclusive_group(required=True)
+    space.add_argument("--grid", help='json {param: [values]}, e.g. {"rsi_period": [14, 21]}')
+    space.add_argument("--space", help="json {param: [choices] or [low, high]}, sampled --samples times")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int)
+
+
+def param_sets_from_args(args: argparse.Namespace) -> list:
+    if args.grid is not None:
+        return param_grid(json.loads(args.grid))
+
+    # json has no tuples: a 2-item list of numbers is a range unless it is a list of choices of another type
+    space = {
+        name: tuple(values) if len(values) == 2 and all(isinstance(v, (int, float)) for v in values) else values
+        for name, values in json.loads(args.space).items()
+    }
+    return param_samples(space, args.samples, seed=args.seed)
+
+
+def sweep_kwargs_from_args(args: argparse.Namespace) -> dict:
+    return dict(
+        instrument=args.instrument,
+        granularity=args.granularity,
+        start_time=args.start,
+        end_time=args.end,
+        compression=args.compression or None,
+        bid_ask=args.bid_ask,
+        intrabar=args.intrabar,
+        max_workers=args.workers,
+        engine=args.engine,
+        indicator_cache_dir=args.indicator_cache,
+    )
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Parallel parameter sweep of MyStrategy.")
+    add_sweep_arguments(parser)
+    parser.add_argument("--output", help="csv file the results are appended to")
+    args = parser.parse_args(argv)
+
+    df = run_sweep(args.data, param_sets_from_args(args), output=args.output, **sweep_kwargs_from_args(args))
+    print(df.sort_values("final_value", ascending=False).head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Multi-instrument bulk loader
+
+Loads many instruments / granularities in parallel and aligns them on one shared DatetimeIndex, with MultiIndex
+columns (source name, field):
+
+                              EUR_USD_H1                      USD_JPY_H1
+                              open  high  low  close  volume  open  high  low  close  volume
+    datetime
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from src.utils import logger, load_oanda_parquet
+from src.cache import load_oanda_bars
+
+GAP_POLICIES = ("nan", "ffill", "drop")
+
+
+def store_sources(root: str, instruments: list, granularities: list) -> dict:
+    """Panel sources for every instrument x granularity of a `MarketDataStore`, named {instrument}_{granularity}"""
+    return {
+        f"{instrument}_{granularity}": {"file": root, "instrument": instrument, "granularity": granularity}
+        for instrument in instruments
+        for granularity in granularities
+    }
+
+
+def _fill_gaps(panel: pd.DataFrame, names: list) -> pd.DataFrame:
+    """Fill missing bars with a flat bar at the previous close and zero volume"""
+    for name in names:
+        close = panel[(name, "close")]
+        missing = close.isna()
+        if not missing.any():
+            continue
+        close = close.ffill()
+        panel[(name, "close")] = close
+        for field in ["open", "high", "low"]:
+            panel[(name, field)] = panel[(name, field)].fillna(close)
+        panel[(name, "volume")] = panel[(name, "volume")].fillna(0).where(close.notna())
+    return panel
+
+
+def load_oanda_panel(
+    sources: dict,
+    start_time: str = None,
+    end_time: str = None,
+    gaps: str = "ffill",
+    cache_dir: str = None,
+    max_workers: int = None,
+) -> pd.DataFrame:
+    """Load many sources in parallel into one time-aligned panel
+
+    sources: {name: file} or {name: {"file": store_root, "instrument": ..., "granularity": ...}}
+    gaps: how to handle timestamps missing in some sources
+        "nan": keep the union of timestamps, missing bars are NaN
+        "ffill": keep the union of timestamps, missing bars are flat at the previous close with zero volume
+        "drop": keep only the timestamps present in every source
+    cache_dir: load through the memory-mapped bar cache in this directory
+    """
+    if gaps not in GAP_POLICIES:
+        raise ValueError(f"Unknown gap policy: {gaps}, expected one of {GAP_POLICIES}.")
+
+    def _load(source) -> pd.DataFrame:
+        kwargs = {"file": source} if isinstance(source, str) else dict(source)
+        if cache_dir is not None:
+            return load_oanda_bars(start_time=start_time, end_time=end_time, cache_dir=cache_dir, **kwargs)
+        return load_oanda_parquet(start_time=start_time, end_time=end_time, **kwargs)
+
+    names = list(sources)
+    # parquet decoding and numpy release the GIL, so threads load in parallel without pickling frames around
+    max_workers = max_workers or min(len(names), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(_load, [sources[name] for name in names]))
+
+    panel = pd.concat(frames, axis=1, keys=names, join="inner" if gaps == "drop" else "outer").sort_index()
+    panel.columns.names = ["source", "field"]
+
+    if gaps == "ffill":
+        panel = _fill_gaps(panel, names)
+
+    logger.debug(
+        f"Loaded panel of {len(names)} sources, {len(panel)} rows, from {panel.index.min()} to {panel.index.max()}."
+    )
+    return panel
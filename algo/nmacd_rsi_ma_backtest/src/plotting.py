@@ -0,0 +1,314 @@
+"""
+Decimated charts of long backtests
+
+`cerebro.plot` sends every bar and indicator point to the browser. `BacktestChart` keeps the full series in Python,
+the bars typically memory-mapped from the bar cache (`src.cache`), and only sends about `max_points` buckets per
+series for the visible range:
+    candles     first open, max high, min low, last close of the bars of each bucket
+    lines       the min and max point of each bucket, in time order, so spikes are kept
+    trades      the entries and exits in the range
+Served by bokeh (`serve`, or `show(chart.app)` in a notebook), every pan / zoom end re-buckets the visible range
+plus a `margin` on each side, so the detail loads down to single bars while the browser holds a bounded number of
+points whatever the length of the history. Saved as a standalone html file, the chart is the overview.
+
+bokeh is only imported to build the chart.
+
+Usage:
+    chart = BacktestChart(bars, lines=strategy_lines(bars, params, compression=60), trades=strategy.trades.to_frame())
+    chart.save("chart.html")
+    show(chart.app)  # notebook, after `bokeh.io.output_notebook()`
+
+    python -m src.plotting --data oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz --compression 60 \
+        --output chart.html
+    python -m src.plotting --data data --instrument EUR_USD --granularity M1 --serve --port 5006
+"""
+
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from src.utils import logger, resample_bars
+from src.fastpath import compute_indicators, run_fastpath
+
+MAX_POINTS = 2000  # buckets of the visible range, about one per pixel of a wide chart
+MARGIN = 0.5  # share of the visible span loaded on each side, so short pans stay drawn
+PRICE_PANEL = "price"
+# panel and name of the MyStrategy indicators drawn, as in `cerebro.plot`
+INDICATOR_PANELS = {
+    "sma": (PRICE_PANEL, "sma"),
+    "rsi": ("rsi", "rsi"),
+    "rsi_ma": ("rsi", "rsi_ma"),
+    "macd": ("macd", "macd"),
+    "macd_signal": ("macd", "signal"),
+}
+COLORS = ["#1f77b4", "#ff7f0e", "#9467bd", "#8c564b", "#17becf"]
+BULLISH_COLOR = "#31a354"
+BEARISH_COLOR = "#e6550d"
+
+
+def _ms(ns: np.ndarray) -> np.ndarray:
+    """Epoch ms of epoch ns, the datetime unit of bokeh"""
+    return ns / 1e6
+
+
+def bucket_starts(start: int, end: int, buckets: int) -> np.ndarray:
+    """First position of each of up to `buckets` runs of bars of equal length in [start, end)"""
+    if end - start <= buckets:
+        return np.arange(start, end)
+    return np.linspace(start, end, buckets, endpoint=False).astype(np.int64)
+
+
+def decimate_ohlc(ns: np.ndarray, open_, high, low, close, start: int, end: int, buckets: int) -> dict:
+    """Candles of up to `buckets` buckets of the bars in [start, end), x at the middle of each bucket"""
+    starts = bucket_starts(start, end, buckets)
+    if len(starts) == 0:
+        return {col: np.empty(0) for col in ["x", "width", "open", "high", "low", "close"]}
+    ends = np.r_[starts[1:], end]
+    relative = starts - start
+    bar_ns = np.median(np.diff(ns[start : min(end, start + 1000)])) if end - start > 1 else 60e9
+    first, last = ns[starts], ns[ends - 1] + bar_ns
+    return {
+        "x": _ms((first + last) / 2),
+        "width": _ms((last - first) * 0.8),
+        "open": np.asarray(open_[starts], dtype=np.float64),
+        "high": np.maximum.reduceat(np.asarray(high[start:end], dtype=np.float64), relative),
+        "low": np.minimum.reduceat(np.asarray(low[start:end], dtype=np.float64), relative),
+        "close": np.asarray(close[ends - 1], dtype=np.float64),
+    }
+
+
+def decimate_line(ns: np.ndarray, values, start: int, end: int, buckets: int) -> dict:
+    """Min and max point of each of up to `buckets` buckets of the values in [start, end), in time order"""
+    starts = bucket_starts(start, end, buckets)
+    values = np.asarray(values[start:end], dtype=np.float64)
+    if len(starts) == end - start:
+        return {"x": _ms(ns[start:end]), "y": values}
+
+    relative = starts - start
+    counts = np.diff(np.r_[relative, end - start])
+    positions = np.arange(end - start)
+
+    def first_position(extreme: np.ndarray) -> np.ndarray:
+        # first position of the bucket extreme, the bucket start if the bucket is all nan
+        matches = np.where(values == np.repeat(extreme, counts), positions, end - start)
+        found = np.minimum.reduceat(matches, relative)
+        return np.where(found < end - start, found, relative)
+
+    low = first_position(np.fmin.reduceat(values, relative))
+    high = first_position(np.fmax.reduceat(values, relative))
+    points = np.column_stack([np.minimum(low, high), np.maximum(low, high)]).ravel()
+    return {"x": _ms(ns[start + points]), "y": values[points]}
+
+
+class BacktestChart:
+    """Bokeh chart of bars, line series and trades, bucketed to the visible range"""
+
+    def __init__(
+        self,
+        bars: pd.DataFrame,
+        lines: dict = None,
+        trades: pd.DataFrame = None,
+        max_points: int = MAX_POINTS,
+        margin: float = MARGIN,
+        title: str = None,
+    ):
+        """
+        bars: open, high, low, close columns, indexed by datetime, e.g. memory-mapped by `src.cache.open_bars`
+        lines: {panel: {name: Series indexed by datetime}}, the "price" panel is drawn over the candles
+        trades: datetime, type, direction, executed_price columns, e.g. `TradeRecorder.to_frame()`
+        """
+        self.ns = bars.index.asi8  # a view of memory-mapped bars
+        self.ohlc = [bars[col].to_numpy() for col in ["open", "high", "low", "close"]]
+        self.lines = {
+            panel: {name: (series.index.asi8, series.to_numpy()) for name, series in series_dict.items()}
+            for panel, series_dict in (lines or {}).items()
+        }
+        self.trades = None
+        if trades is not None and len(trades) > 0:
+            trades = trades.sort_values("datetime", kind="stable")
+            self.trades = {
+                "ns": pd.DatetimeIndex(pd.to_datetime(trades["datetime"])).asi8,
+                "open": (trades["type"] == "open").to_numpy(),
+                "long": (trades["direction"] == "BUY").to_numpy(),
+                "price": trades["executed_price"].to_numpy(dtype=np.float64),
+            }
+        self.max_points = max_points
+        self.margin = margin
+        self.title = title
+
+    def _range(self, ns: np.ndarray, x0: float, x1: float) -> tuple:
+        """Positions [start, end) of the visible range [x0, x1] ms and its margins, the number of buckets"""
+        span = x1 - x0
+        lo, hi = (x0 - self.margin * span) * 1e6, (x1 + self.margin * span) * 1e6
+        start, end = np.searchsorted(ns, [lo, hi])
+        visible = np.searchsorted(ns, [x0 * 1e6, x1 * 1e6])
+        buckets = self.max_points * (end - start) // max(visible[1] - visible[0], 1)
+        return start, end, int(min(buckets, (1 + 2 * self.margin) * self.max_points))
+
+    def candles(self, x0: float, x1: float) -> dict:
+        start, end, buckets = self._range(self.ns, x0, x1)
+        data = decimate_ohlc(self.ns, *self.ohlc, start, end, buckets)
+        data["color"] = np.where(data["close"] >= data["open"], BULLISH_COLOR, BEARISH_COLOR)
+        return data
+
+    def line(self, panel: str, name: str, x0: float, x1: float) -> dict:
+        ns, values = self.lines[panel][name]
+        start, end, buckets = self._range(ns, x0, x1)
+        return decimate_line(ns, values, start, end, buckets)
+
+    def trade_markers(self, x0: float, x1: float) -> dict:
+        trades = self.trades
+        start, end, _ = self._range(trades["ns"], x0, x1)
+        is_open, is_long = trades["open"][start:end], trades["long"][start:end]
+        return {
+            "x": _ms(trades["ns"][start:end]),
+            "y": trades["price"][start:end],
+            "marker": np.where(is_open, np.where(is_long, "triangle", "inverted_triangle"), "x"),
+            "color": np.where(is_long, BULLISH_COLOR, BEARISH_COLOR),
+        }
+
+    def build(self, width: int = 1500, height: int = 500):
+        """(bokeh layout, update(x0, x1) refilling its sources for the visible range in ms)"""
+        from bokeh.layouts import column
+        from bokeh.models import ColumnDataSource, Range1d
+        from bokeh.plotting import figure
+
+        first, last = _ms(self.ns[0]), _ms(self.ns[-1])
+        x_range = Range1d(first, last, bounds=(first, last))
+        updates = []
+
+        def panel_figure(name: str, panel_height: int):
+            fig = figure(
+                x_axis_type="datetime",
+                x_range=x_range,
+                width=width,
+                height=panel_height,
+                title=self.title if name == PRICE_PANEL else None,
+                tools="xpan,xwheel_zoom,box_zoom,reset,crosshair",
+                active_scroll="xwheel_zoom",
+            )
+            fig.yaxis.axis_label = name
+            return fig
+
+        price = panel_figure(PRICE_PANEL, height)
+        candles = ColumnDataSource(self.candles(first, last))
+        price.segment(x0="x", x1="x", y0="low", y1="high", color="color", source=candles)
+        price.vbar(
+            x="x", width="width", top="open", bottom="close", fill_color="color", line_color="color", source=candles
+        )
+        updates.append(lambda x0, x1: setattr(candles, "data", self.candles(x0, x1)))
+        figures = [price]
+
+        for panel, names in self.lines.items():
+            fig = price if panel == PRICE_PANEL else panel_figure(panel, height // 3)
+            for i, name in enumerate(names):
+                source = ColumnDataSource(self.line(panel, name, first, last))
+                fig.line(x="x", y="y", color=COLORS[i % len(COLORS)], legend_label=name, source=source)
+                updates.append(lambda x0, x1, s=source, p=panel, n=name: setattr(s, "data", self.line(p, n, x0, x1)))
+            fig.legend.location = "top_left"
+            if fig is not price:
+                figures.append(fig)
+
+        if self.trades is not None:
+            markers = ColumnDataSource(self.trade_markers(first, last))
+            price.scatter(x="x", y="y", marker="marker", color="color", size=10, source=markers)
+            updates.append(lambda x0, x1: setattr(markers, "data", self.trade_markers(x0, x1)))
+
+        def update(x0: float, x1: float) -> None:
+            for fill in updates:
+                fill(x0, x1)
+
+        return column(*figures), update
+
+    def app(self, doc) -> None:
+        """Bokeh application of the chart, re-bucketing on every pan / zoom end"""
+        from bokeh.events import RangesUpdate
+
+        layout, update = self.build()
+        # the panels share the x range, but a pan / zoom only fires RangesUpdate on the figure it happened in
+        for fig in layout.children:
+            fig.on_event(RangesUpdate, lambda event: update(event.x0, event.x1))
+        doc.add_root(layout)
+
+    def save(self, path: str) -> None:
+        """Standalone html file of the overview"""
+        from bokeh.io import save
+        from bokeh.resources import CDN
+
+        save(self.build()[0], filename=path, resources=CDN, title=self.title or "backtest")
+
+    def serve(self, port: int = 5006) -> None:
+        from bokeh.server.server import Server
+
+        server = Server({"/": self.app}, port=port)
+        server.start()
+        logger.info(f"Serving the chart at http://localhost:{port}/")
+        server.io_loop.start()
+
+
+def strategy_lines(bars: pd.DataFrame, params: dict = None, compression: int = None) -> dict:
+    """MyStrategy indicators as `BacktestChart` lines, on the bars replayed into `compression` minutes if given
+
+    A replayed bar is dated at its last source bar, as the bars of `cerebro.replaydata`.
+    """
+    run_bars, ns = bars, bars.index.asi8
+    if compression is not None:
+        run_bars = resample_bars(bars, compression)
+        period_end = (run_bars.index + pd.Timedelta(minutes=compression)).asi8
+        ns = bars.index.asi8[np.searchsorted(bars.index.asi8, period_end) - 1]
+    close, high, low = (run_bars[col].to_numpy(dtype=np.float64) for col in ["close", "high", "low"])
+    indicators = compute_indicators(close, high, low, params or {})
+    return indicator_lines(indicators, pd.DatetimeIndex(ns.view("datetime64[ns]")))
+
+
+def indicator_lines(indicators: dict, index: pd.DatetimeIndex) -> dict:
+    """`compute_indicators` arrays as `BacktestChart` lines indexed by `index`, the datetimes of their bars"""
+    lines = {}
+    for key, (panel, name) in INDICATOR_PANELS.items():
+        lines.setdefault(panel, {})[name] = pd.Series(indicators[key], index=index)
+    return lines
+
+
+def main(argv: list = None) -> None:
+    from src.cache import load_oanda_bars
+
+    parser = argparse.ArgumentParser(description="Decimated chart of a MyStrategy backtest.")
+    parser.add_argument("--data", required=True, help="MarketDataStore root or parquet file")
+    parser.add_argument("--instrument", default="EUR_USD")
+    parser.add_argument("--granularity", help="granularity of a MarketDataStore root")
+    parser.add_argument("--start", help="start time, UTC")
+    parser.add_argument("--end", help="end time, UTC")
+    parser.add_argument("--compression", type=int, default=60, help="replay into bars of N minutes, 0 to disable")
+    parser.add_argument("--params", default="{}", help='json MyStrategy params, e.g. {"rrr": 1.5}')
+    parser.add_argument("--max-points", type=int, default=MAX_POINTS)
+    parser.add_argument("--output", help="html file of the overview")
+    parser.add_argument("--serve", action="store_true", help="serve the chart, loading detail on zoom")
+    parser.add_argument("--port", type=int, default=5006)
+    args = parser.parse_args(argv)
+    if args.output is None and not args.serve:
+        parser.error("one of --output or --serve is required")
+
+    bars = load_oanda_bars(args.data, args.start, args.end, instrument=args.instrument, granularity=args.granularity)
+    params = json.loads(args.params)
+    compression = args.compression or None
+    run_bars = resample_bars(bars, compression) if compression is not None else bars
+    # the lines and markers of the same fast path run, both dated by the bars it ran
+    result = run_fastpath(run_bars, params, instrument=args.instrument)
+
+    chart = BacktestChart(
+        bars,
+        lines=indicator_lines(result["indicators"], run_bars.index),
+        trades=pd.DataFrame(result["trade_log"]),
+        max_points=args.max_points,
+        title=f"{args.instrument} {len(bars)} bars",
+    )
+    if args.output is not None:
+        chart.save(args.output)
+    if args.serve:
+        chart.serve(args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Opt-in profiling of a backtrader run
+
+`ProfileAnalyzer` wraps, when the run starts, the callbacks of the strategy (`_next`, `_oncepost`, `_notify`,
+`next`, `update_signal`, `notify_order`, `notify_trade`, `log`, `calc_size`) and the `_next` / `_once` of every
+indicator, sub-indicators included. Each call adds its `perf_counter_ns` time to per-callback accumulators:
+    calls, total and self (without wrapped callees) time, max
+    p50 / p90 / p99 of a bounded set of samples, evenly spread over the calls
+    with `allocations`, the net bytes left allocated, traced by `tracemalloc` (slow, off by default)
+and its self time to the stack of wrapped callbacks it runs in, e.g. "MyStrategy._next;MyStrategy.next". A wrapped
+call costs about 1 us.
+
+At the end of `cerebro.run()` the callbacks are unwrapped and the report is written as JSON to `output` and as
+folded stacks (`flamegraph.pl`, speedscope) in microseconds to `folded`, if given.
+
+Usage:
+    cerebro.addanalyzer(ProfileAnalyzer, _name="Profile", output="profile.json", folded="profile.folded")
+    result.analyzers.Profile.get_analysis()
+
+    python -m src.profiling --data oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz --output profile.json \
+        --folded profile.folded
+"""
+
+import json
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import backtrader as bt
+
+STRATEGY_METHODS = [
+    "_next",
+    "_oncepost",
+    "_notify",
+    "next",
+    "update_signal",
+    "notify_order",
+    "notify_trade",
+    "log",
+    "calc_size",
+]
+INDICATOR_METHODS = ["_next", "_once"]
+RESERVOIR_SIZE = 4096
+
+
+class _Stats:
+    __slots__ = ["calls", "total_ns", "self_ns", "max_ns", "alloc_bytes", "samples", "stride"]
+
+    def __init__(self):
+        self.calls = self.total_ns = self.self_ns = self.max_ns = self.alloc_bytes = 0
+        self.samples = []
+        self.stride = 1  # one call in `stride` is sampled
+
+
+class CallProfiler:
+    """Per-callback accumulators of the calls of the functions wrapped by `wrap`"""
+
+    def __init__(self, allocations: bool = False, reservoir_size: int = RESERVOIR_SIZE):
+        self.allocations = allocations
+        self.reservoir_size = reservoir_size
+        self.stats = {}
+        self.stacks = {}
+        self._stack = []  # [stack path, child ns] of the calls in progress
+
+    def wrap(self, name: str, func):
+        """`func` timed under `name`"""
+        stats = self.stats.setdefault(name, _Stats())
+        stack, stacks, clock, reservoir_size = self._stack, self.stacks, time.perf_counter_ns, self.reservoir_size
+        traced_memory = tracemalloc.get_traced_memory if self.allocations else None
+
+        def wrapper(*args, **kwargs):
+            parent = stack[-1] if len(stack) > 0 else None
+            frame = [name if parent is None else f"{parent[0]};{name}", 0]
+            stack.append(frame)
+            memory = traced_memory()[0] if traced_memory is not None else 0
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                if traced_memory is not None:
+                    stats.alloc_bytes += traced_memory()[0] - memory
+                stack.pop()
+                if parent is not None:
+                    parent[1] += elapsed
+                self_ns = elapsed - frame[1]
+                stacks[frame[0]] = stacks.get(frame[0], 0) + self_ns
+
+                stats.calls += 1
+                stats.total_ns += elapsed
+                stats.self_ns += self_ns
+                if elapsed > stats.max_ns:
+                    stats.max_ns = elapsed
+                # samples evenly spread over the calls: a full reservoir drops every other sample
+                if stats.calls % stats.stride == 0:
+                    stats.samples.append(elapsed)
+                    if len(stats.samples) == reservoir_size:
+                        del stats.samples[::2]
+                        stats.stride *= 2
+
+        return wrapper
+
+    def report(self) -> dict:
+        """{name: calls, total_ms, self_ms, mean_us, p50_us, p90_us, p99_us, max_us[, alloc_bytes]} by total time"""
+        callbacks = {}
+        for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].total_ns):
+            if stats.calls == 0:
+                continue
+            p50, p90, p99 = np.percentile(stats.samples, [50, 90, 99]) / 1e3
+            callbacks[name] = {
+                "calls": stats.calls,
+                "total_ms": stats.total_ns / 1e6,
+                "self_ms": stats.self_ns / 1e6,
+                "mean_us": stats.total_ns / stats.calls / 1e3,
+                "p50_us": p50,
+                "p90_us": p90,
+                "p99_us": p99,
+                "max_us": stats.max_ns / 1e3,
+            }
+            if self.allocations:
+                callbacks[name]["alloc_bytes"] = stats.alloc_bytes
+        return callbacks
+
+    def folded(self) -> str:
+        """Self time of every stack in microseconds, one "a;b;c 123" line per stack"""
+        return "".join(f"{path} {ns // 1000}\n" for path, ns in sorted(self.stacks.items()) if ns >= 1000)
+
+
+class ProfileAnalyzer(bt.Analyzer):
+    """Calls and latencies of the strategy and indicator callbacks, see `src.profiling`"""
+
+    params = (
+        ("allocations", False),  # trace net allocated bytes with tracemalloc
+        ("output", None),  # json file of the report
+        ("folded", None),  # folded stacks file for flame graphs
+        ("reservoir_size", RESERVOIR_SIZE),  # latency samples kept per callback for the percentiles
+    )
+
+    def _wrap(self, obj, name: str, method: str) -> None:
+        func = getattr(obj, method, None)
+        if func is None:
+            return
+        setattr(obj, method, self.profiler.wrap(f"{name}.{method}", func))
+        self._wrapped.append((obj, method))
+
+    def _wrap_indicators(self, owner) -> None:
+        # line operations and delays, e.g. `data(-1)`, have no sub-indicators
+        for indicator in getattr(owner, "_lineiterators", {}).get(bt.LineIterator.IndType, []):
+            if id(indicator) in self._seen:  # shared by several owners
+                continue
+            self._seen.add(id(indicator))
+            for method in INDICATOR_METHODS:
+                self._wrap(indicator, type(indicator).__name__, method)
+            self._wrap_indicators(indicator)
+
+    def start(self):
+        self.profiler = CallProfiler(self.p.allocations, self.p.reservoir_size)
+        self._wrapped, self._seen = [], set()
+        self._tracing = self.p.allocations and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+        strategy = self.strategy
+        for method in STRATEGY_METHODS:
+            self._wrap(strategy, type(strategy).__name__, method)
+        self._wrap_indicators(strategy)
+        self.start_ns = time.perf_counter_ns()
+
+    def stop(self):
+        self.wall_ns = time.perf_counter_ns() - self.start_ns
+        for obj, method in self._wrapped:
+            delattr(obj, method)  # back to the class method
+        if self._tracing:
+            tracemalloc.stop()
+
+        self.rets["wall_ms"] = self.wall_ns / 1e6
+        self.rets["callbacks"] = self.profiler.report()
+        self.rets["stacks_us"] = {path: ns / 1e3 for path, ns in self.profiler.stacks.items()}
+        if self.p.output is not None:
+            with open(self.p.output, "w") as f:
+                json.dump(self.rets, f, indent=2)
+        if self.p.folded is not None:
+            with open(self.p.folded, "w") as f:
+                f.write(self.profiler.folded())
+
+
+def main(argv: list = None) -> None:
+    from src.utils import load_oanda_parquet
+    from src.optimize import CASH, LEVERAGE, run_backtest
+
+    parser = argparse.ArgumentParser(description="Profile the callbacks of one MyStrategy run.")
+    parser.add_argument("--data", required=True, help="parquet file")
+    parser.add_argument("--instrument", default="EUR_USD")
+    parser.add_argument("--compression", type=int, default=60, help="replay into bars of N minutes, 0 to disable")
+    parser.add_argument("--intrabar", action="store_true", help="run resampled bars, fill stops / limits intrabar")
+    parser.add_argument("--params", default="{}", help='json MyStrategy params, e.g. {"rrr": 1.5}')
+    parser.add_argument("--allocations", action="store_true", help="trace allocations, slow")
+    parser.add_argument("--output", help="json file of the report")
+    parser.add_argument("--folded", help="folded stacks file, for flamegraph.pl or speedscope")
+    args = parser.parse_args(argv)
+
+    df = load_oanda_parquet(args.data, validate=False)
+    settings = {
+        "instrument": args.instrument,
+        "cash": CASH,
+        "leverage": LEVERAGE,
+        "compression": args.compression or None,
+        "bid_ask": False,
+        "intrabar": args.intrabar,
+    }
+    profile = {"allocations": args.allocations, "output": args.output, "folded": args.folded}
+    report = run_backtest(df, json.loads(args.params), settings, profile=profile)["profile"]
+
+    print(f"wall {report['wall_ms']:.0f} ms")
+    cols = ["calls", "total_ms", "self_ms", "mean_us", "p50_us", "p90_us", "p99_us", "max_us", "alloc_bytes"]
+    print(f"{'callback':<36}" + "".join(f"{col:>12}" for col in cols))
+    for name, stats in report["callbacks"].items():
+        print(f"{name:<36}" + "".join(f"{stats[col]:>12.4g}" if col in stats else f"{'':>12}" for col in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Partitioned market data store
+
+Layout:
+    {root}/manifest.json
+    {root}/{instrument}/{granularity}/{yyyy}/{mm}.parquet
+
+Every partition holds one calendar month (UTC) of candles, sorted by `time` and compressed with zstd.
+The manifest records the rows and time range of every partition, so a date range query only opens the
+partitions it overlaps, and adding a new month never rewrites the existing ones.
+
+Usage:
+    python -m src.store import oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz --root data
+"""
+
+import os
+import re
+import json
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+STORE_COMPRESSION = "zstd"
+ROW_GROUP_SIZE = 8192
+MANIFEST_FILE = "manifest.json"
+
+# e.g. oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz
+OANDA_FILE_PATTERN = re.compile(r"oanda_(?P<instrument>[A-Z0-9]+_[A-Z0-9]+)_(?P<granularity>[A-Z0-9]+)_")
+
+
+def _to_utc(t: str) -> pd.Timestamp:
+    ts = pd.Timestamp(t)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def _atomic_write_table(table: pa.Table, path: str, compression: str, row_group_size: int) -> None:
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression=compression, row_group_size=row_group_size)
+    os.replace(tmp_path, path)
+
+
+class MarketDataStore:
+    def __init__(self, root: str, compression: str = STORE_COMPRESSION, row_group_size: int = ROW_GROUP_SIZE):
+        self.root = root
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"partitions": {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _save_manifest(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def partition_key(instrument: str, granularity: str, year: int, month: int) -> str:
+        return f"{instrument}/{granularity}/{year:04d}/{month:02d}"
+
+    def partition_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.parquet")
+
+    def partitions(self, instrument: str, granularity: str, start_time: str = None, end_time: str = None) -> list:
+        """Manifest entries of the partitions overlapping [start_time, end_time), in time order"""
+        start = _to_utc(start_time) if start_time is not None else None
+        end = _to_utc(end_time) if end_time is not None else None
+
+        entries = []
+        for key, entry in sorted(self.manifest["partitions"].items()):
+            if entry["instrument"] != instrument or entry["granularity"] != granularity:
+                continue
+            if start is not None and pd.Timestamp(entry["end"]) < start:
+                continue
+            if end is not None and pd.Timestamp(entry["start"]) >= end:
+                continue
+            entries.append({"key": key, **entry})
+        return entries
+
+    def paths(self, instrument: str, granularity: str, start_time: str = None, end_time: str = None) -> list:
+        return [self.partition_path(e["key"]) for e in self.partitions(instrument, granularity, start_time, end_time)]
+
+    def last_complete_time(self, instrument: str, granularity: str) -> pd.Timestamp:
+        """Time of the last complete bar stored, None if nothing is stored"""
+        for entry in reversed(self.partitions(instrument, granularity)):
+            last_complete = entry.get("last_complete", entry["end"])
+            if last_complete is not None:
+                return pd.Timestamp(last_complete)
+        return None
+
+    def schema(self, instrument: str, granularity: str) -> pa.Schema:
+        paths = self.paths(instrument, granularity)
+        if len(paths) == 0:
+            raise LookupError(f"No data stored for {instrument} {granularity} in {self.root}.")
+        return pq.read_schema(paths[0])
+
+    def read(
+        self, instrument: str, granularity: str, columns: list = None, filters: list = None, paths: list = None
+    ) -> pa.Table:
+        """Read the given partitions (all partitions by default) into one table"""
+        if paths is None:
+            paths = self.paths(instrument, granularity)
+        if len(paths) == 0:
+            raise LookupError(f"No data stored for {instrument} {granularity} in {self.root}.")
+        return pq.ParquetDataset(paths, filters=filters or None).read(columns=columns)
+
+    def write(self, df: pd.DataFrame, instrument: str, granularity: str) -> list:
+        """Merge candles into the store, rewriting only the months present in `df`
+
+        Rows are deduplicated on `time`, the incoming row wins.
+        """
+        if "time" not in df.columns:
+            raise LookupError("Missing columns: ['time'].")
+
+        df = df.copy()
+        df["time"] = pd.to_datetime(df["time"], utc=True)
+        months = df["time"].dt.year * 100 + df["time"].dt.month
+
+        keys = []
+        for ym, df_month in df.groupby(months, sort=True):
+            key = self.partition_key(instrument, granularity, ym // 100, ym % 100)
+            path = self.partition_path(key)
+
+            if key in self.manifest["partitions"] and os.path.exists(path):
+                df_month = pd.concat([pq.read_table(path).to_pandas(), df_month], ignore_index=True)
+            df_month = df_month.drop_duplicates(subset="time", keep="last").sort_values("time").reset_index(drop=True)
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table = pa.Table.from_pandas(df_month, preserve_index=False)
+            _atomic_write_table(table, path, self.compression, self.row_group_size)
+
+            if "complete" in df_month.columns:
+                complete_times = df_month.loc[df_month["complete"].astype(bool), "time"]
+            else:
+                complete_times = df_month["time"]
+
+            self.manifest["partitions"][key] = {
+                "instrument": instrument,
+                "granularity": granularity,
+                "rows": len(df_month),
+                "start": df_month["time"].iloc[0].isoformat(),
+                "end": df_month["time"].iloc[-1].isoformat(),
+                "last_complete": complete_times.iloc[-1].isoformat() if len(complete_times) > 0 else None,
+            }
+            keys.append(key)
+
+        self._save_manifest()
+        return keys
+
+    def import_parquet(self, file: str, instrument: str = None, granularity: str = None) -> list:
+        """Import a monolithic `oanda_{INSTRUMENT}_{GRANULARITY}_{start}_{end}.parquet.gz` file"""
+        if instrument is None or granularity is None:
+            match = OANDA_FILE_PATTERN.match(os.path.basename(file))
+            if match is None:
+                raise ValueError(f"Cannot infer instrument and granularity from file name: {file}.")
+            instrument = instrument or match["instrument"]
+            granularity = granularity or match["granularity"]
+        return self.write(pd.read_parquet(file), instrument, granularity)
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the partitioned market data store.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_import = subparsers.add_parser("import", help="import monolithic parquet files")
+    parser_import.add_argument("files", nargs="+")
+    parser_import.add_argument("--root", required=True)
+    parser_import.add_argument("--instrument")
+    parser_import.add_argument("--granularity")
+
+    parser_list = subparsers.add_parser("list", help="list stored partitions")
+    parser_list.add_argument("--root", required=True)
+
+    args = parser.parse_args(argv)
+    store = MarketDataStore(args.root)
+
+    if args.command == "import":
+        for file in args.files:
+            keys = store.import_parquet(file, instrument=args.instrument, granularity=args.granularity)
+            print(f"Imported {file} into {len(keys)} partitions.")
+    elif args.command == "list":
+        for key, entry in sorted(store.manifest["partitions"].items()):
+            print(f"{key}: {entry['rows']} rows, from {entry['start']} to {entry['end']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,12 @@ Long Signal:
 
 import numpy as np
 from src.defs import BROKER
-from src.notifications import log_order, log_trade
+from src.events import START, STOP, EventLog, print_sink
+from src.trades import OPEN, CLOSE, TradeRecorder
 from backtrader_bokeh import bt
 
 
-INSTRUMENT = "EUR_USD"
-DIGITS = BROKER.PRICE_DIGITS[INSTRUMENT]
-SPREAD = BROKER.SPREAD[INSTRUMENT]
+INSTRUMENT = "EUR_USD"  # default instrument
 
 
 class MyStrategy(bt.Strategy):
@@ -33,9 +32,27 @@ class MyStrategy(bt.Strategy):
         # ('atr_period', 115),
         ("rrr", 1),  # reward-risk-ratio = take-profit-distance / stop-loss-distance
         ("sl_pct", 1),  # stop-loss pct = stop-loss-amount / total-cash-amount
+        ("verbose", True),  # print order, trade and strategy logs
+        ("event_log", None),  # EventLog the events are recorded into, a new one printed if verbose by default
+        ("trade_start", None),  # no new trade before this datetime (UTC), earlier bars only warm up the indicators
+        ("instrument", INSTRUMENT),  # BROKER instrument, sets price digits, spread and position unit
     )
 
     def __init__(self):
+        # instrument
+        broker = BROKER.definitions(self.params.instrument)
+        self.digits = broker["price_digits"]
+        self.spread = broker["spread"]
+        self.unit = broker["position_unit"]
+
+        # structured event log, formatted only if printed
+        # a given log may be shared by several runs, its sinks are up to the caller
+        self.events = self.params.event_log
+        if self.events is None:
+            self.events = EventLog()
+            if self.params.verbose:
+                self.events.add_sink(print_sink(self.digits))
+
         # indicators
         self.sma = bt.indicators.SimpleMovingAverage(period=self.params.ma_period)
 
@@ -73,7 +90,7 @@ class MyStrategy(bt.Strategy):
         self.take_profit = None
 
         # trade log
-        self.trade_log = []
+        self.trades = TradeRecorder()
         self.is_trade_open = False
         self.trade_num = 0
 
@@ -81,6 +98,11 @@ class MyStrategy(bt.Strategy):
         self.close_price = None
         self.order = None  # to keep track whether there is an open order
 
+    @property
+    def trade_log(self) -> list:
+        """Executed orders as a list of dicts, see `src.trades`"""
+        return self.trades.to_records()
+
     def update_signal(self):
         if self.macd_crossover[0] != 0:
             self.had_macd_cross = self.macd_crossover[0]
@@ -114,16 +136,18 @@ class MyStrategy(bt.Strategy):
         # do not open new trade if there is pending order / open trade / trigger not allowed
         if self.order or self.position or (not self.allow_trigger):
             return
+        if self.params.trade_start is not None and self.data.datetime.datetime(0) < self.params.trade_start:
+            return
 
         self.close_price = self.data.close[0]
         self.leverage = self.broker.getcommissioninfo(self.data).get_leverage()
 
         if self.signal == 1:
-            self.log(f"BUY MKT ORDER TRIGGERED.")
-            sl = self.round(self.recent_low[0] + SPREAD)
+            sl = self.round(self.recent_low[0] + self.spread)
             sl_dist = abs(self.close_price - sl)
             tp_dist = sl_dist * self.params.rrr
             tp = self.round(self.close_price + tp_dist)
+            self.events.trigger(self.data.datetime[0], 1, self.close_price, sl, tp)
 
             size = self.calc_size(sl_dist)
 
@@ -138,11 +162,11 @@ class MyStrategy(bt.Strategy):
                 limitexec=bt.Order.Limit,
             )
         if self.signal == -1:
-            self.log(f"SELL MKT ORDER TRIGGERED.")
-            sl = self.round(self.recent_high[0] + SPREAD)
+            sl = self.round(self.recent_high[0] + self.spread)
             sl_dist = abs(self.close_price - sl)
             tp_dist = sl_dist * self.params.rrr
             tp = self.round(self.close_price - tp_dist)
+            self.events.trigger(self.data.datetime[0], -1, self.close_price, sl, tp)
 
             size = self.calc_size(sl_dist)
 
@@ -158,44 +182,37 @@ class MyStrategy(bt.Strategy):
             )
 
     def notify_order(self, order: bt.order.Order) -> None:
-        log_order(order=order, digits=DIGITS, log_func=self.log)
+        self.events.order(self.data.datetime[0], order)
 
         # log executed order
         if order.status == order.Completed:
             self.is_trade_open = not self.is_trade_open
-            dt = self.data.datetime.datetime(0).strftime("%Y-%m-%d %H:%M:%S")
-            direction = "BUY" if order.isbuy() else "SELL"
+            direction = 1 if order.isbuy() else -1
 
             if self.is_trade_open:
                 # the order execution opened a new trade
                 self.trade_num += 1
-                self.trade_log.append(
-                    {
-                        "datetime": dt,
-                        "trade_num": self.trade_num,
-                        "type": "open",
-                        "direction": direction,
-                        "last_close_price": self.close_price,
-                        "created_price": order.created.price,
-                        "executed_price": order.executed.price,
-                        "stop_lose_price": self.stop_loss,
-                        "take_profit_price": self.take_profit,
-                    }
+                self.trades.append(
+                    self.data.datetime[0],
+                    self.trade_num,
+                    OPEN,
+                    direction,
+                    self.close_price,
+                    order.created.price,
+                    order.executed.price,
+                    self.stop_loss,
+                    self.take_profit,
                 )
             else:
                 # the order execution closed an existing trade
-                self.trade_log.append(
-                    {
-                        "datetime": dt,
-                        "trade_num": self.trade_num,
-                        "type": "close",
-                        "direction": direction,
-                        "last_close_price": self.close_price,
-                        "created_price": order.created.price,
-                        "executed_price": order.executed.price,
-                        "stop_lose_price": np.nan,
-                        "take_profit_price": np.nan,
-                    }
+                self.trades.append(
+                    self.data.datetime[0],
+                    self.trade_num,
+                    CLOSE,
+                    direction,
+                    self.close_price,
+                    order.created.price,
+                    order.executed.price,
                 )
 
         # no pending order unless partially filled
@@ -204,30 +221,21 @@ class MyStrategy(bt.Strategy):
 
     def notify_trade(self, trade: bt.trade.Trade) -> None:
         self.allow_trigger = False
-        log_trade(trade=trade, digits=DIGITS, log_func=self.log)
+        self.events.trade(self.data.datetime[0], trade)
 
     def start(self) -> None:
-        self.log(
-            f"STRATEGY START: value = {round(self.broker.getvalue(), DIGITS)}, cash = {round(self.broker.getcash(), DIGITS)}.",
-            with_dt=False,
-        )
+        self.events.account(np.nan, START, self.broker.getvalue(), self.broker.getcash())
 
     def stop(self) -> None:
-        self.log(
-            f"STRATEGY COMPLETE: value = {round(self.broker.getvalue(), DIGITS)}, cash = {round(self.broker.getcash(), DIGITS)}."
-        )
+        self.events.account(self.data.datetime[0], STOP, self.broker.getvalue(), self.broker.getcash())
 
     def log(self, txt: str, with_dt: bool = True) -> None:
-        if with_dt:
-            dt = self.data.datetime.datetime(0)
-            txt = f"[{dt.strftime('%Y-%m-%d %H:%M:%S')}] {txt}"
-        print(txt)
+        self.events.message(self.data.datetime[0] if with_dt else np.nan, txt)
 
     def round(self, price: float) -> float:
-        return round(price, DIGITS)
+        return round(price, self.digits)
 
     def calc_size(self, sl_dist):
         cash = self.broker.getcash()
         sl_pct = self.params.sl_pct
-        unit = BROKER.POSITION_UNIT[INSTRUMENT]
-        return ((cash * sl_pct / 100 / sl_dist) // unit) * unit
+        return ((cash * sl_pct / 100 / sl_dist) // self.unit) * self.unit
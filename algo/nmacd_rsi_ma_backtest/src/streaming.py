@@ -0,0 +1,376 @@
+"""
+Streaming indicator kernels for live bars
+
+Standalone versions of the indicators of MyStrategy with O(1) state updates per bar, for a live process that
+cannot afford to rebuild backtrader lines on every bar:
+    SMA        ring buffer with a running sum, re-summed exactly once per lap of the ring to stop drift
+    EMA, SMMA  recursive exponential smoothing, seeded with the SMA of the first `period` values
+    RSI        Wilder RSI, two SMMA of the up / down moves
+    MACD       EMA fast - EMA slow, EMA signal
+    Highest, Lowest  monotonic deques
+    CrossOver  1 / -1 when `a` crosses `b` up / down since the last non-zero difference
+
+The definitions follow backtrader, as `src.fastpath` does. Every kernel has:
+    update(...)  feed one bar, return the current value (NaN until there are enough bars). NaN inputs are skipped
+    warmup(...)  feed a whole history in one vectorized call, return the value array, and leave the state as if
+                 every bar was fed with `update`
+
+`StrategyIndicators` combines them into the signal of `MyStrategy.update_signal`.
+
+Usage:
+    indicators = StrategyIndicators({"rsi_period": 14})
+    indicators.warmup(high, low, close)  # history arrays
+    signal = indicators.update(bar_high, bar_low, bar_close)  # then once per new bar
+"""
+
+import abc
+import math
+from array import array
+from collections import deque
+import numpy as np
+
+from src import fastpath
+
+NAN = float("nan")
+
+
+class SMA:
+    __slots__ = ("period", "value", "_ring", "_pos", "_count", "_sum")
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"period must be positive, got {period}.")
+        self.period = period
+        self.value = NAN
+        self._ring = array("d", [0.0] * period)
+        self._pos = 0  # index of the oldest value once the ring is full
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, x: float) -> float:
+        if x != x:  # NaN
+            return self.value
+        self._sum += x - self._ring[self._pos]
+        self._ring[self._pos] = x
+        self._pos += 1
+        if self._pos == self.period:
+            self._pos = 0
+            self._sum = math.fsum(self._ring)
+        if self._count < self.period:
+            self._count += 1
+        if self._count == self.period:
+            self.value = self._sum / self.period
+        return self.value
+
+    def warmup(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        out = fastpath.sma(x, self.period)
+        tail = x[~np.isnan(x)][-self.period :]
+        self.__init__(self.period)
+        self._ring[: len(tail)] = array("d", tail.tolist())
+        self._pos = len(tail) % self.period
+        self._count = len(tail)
+        self._sum = math.fsum(tail)
+        if self._count == self.period:
+            self.value = float(out[-1])
+        return out
+
+
+class EMA:
+    """Exponential smoothing with `alpha`, default 2 / (1 + period)"""
+
+    __slots__ = ("period", "alpha", "value", "_alpha1", "_seed")
+
+    def __init__(self, period: int, alpha: float = None):
+        if period < 1:
+            raise ValueError(f"period must be positive, got {period}.")
+        self.period = period
+        self.alpha = 2.0 / (1.0 + period) if alpha is None else alpha
+        self.value = NAN
+        self._alpha1 = 1.0 - self.alpha
+        self._seed = []  # first values until `period` of them seed the average
+
+    def update(self, x: float) -> float:
+        if x != x:
+            return self.value
+        if self._seed is None:
+            self.value = self.value * self._alpha1 + x * self.alpha
+        else:
+            self._seed.append(x)
+            if len(self._seed) == self.period:
+                self.value = math.fsum(self._seed) / self.period
+                self._seed = None
+        return self.value
+
+    def warmup(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        out = fastpath.exp_smoothing(x, self.period, self.alpha)
+        valid = x[~np.isnan(x)]
+        self.__init__(self.period, self.alpha)
+        if len(valid) >= self.period:
+            self.value = float(out[-1])
+            self._seed = None
+        else:
+            self._seed = valid.tolist()
+        return out
+
+
+class SMMA(EMA):
+    """Smoothed moving average, exponential smoothing with alpha 1 / period"""
+
+    __slots__ = ()
+
+    def __init__(self, period: int, alpha: float = None):
+        super(SMMA, self).__init__(period, 1.0 / period if alpha is None else alpha)
+
+
+def _rsi_value(up: float, down: float) -> float:
+    if down == 0.0:
+        rs = math.inf if up > 0.0 else NAN
+    else:
+        rs = up / down
+    return 100.0 - 100.0 / (1.0 + rs)
+
+
+class RSI:
+    __slots__ = ("period", "value", "_up", "_down", "_prev")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.value = NAN
+        self._up = SMMA(period)
+        self._down = SMMA(period)
+        self._prev = NAN
+
+    def update(self, close: float) -> float:
+        if close != close:
+            return self.value
+        diff = close - self._prev
+        self._prev = close
+        if diff != diff:  # first close
+            return self.value
+        up = self._up.update(diff if diff > 0.0 else 0.0)
+        down = self._down.update(-diff if diff < 0.0 else 0.0)
+        if up == up and down == down:
+            self.value = _rsi_value(up, down)
+        return self.value
+
+    def warmup(self, close: np.ndarray) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        self.__init__(self.period)
+        valid = close[~np.isnan(close)]
+        if len(valid) > 0:
+            diff = np.diff(valid)
+            self._up.warmup(np.maximum(diff, 0.0))
+            self._down.warmup(np.maximum(-diff, 0.0))
+            self._prev = float(valid[-1])
+            if self._up.value == self._up.value:
+                self.value = _rsi_value(self._up.value, self._down.value)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return fastpath.rsi(close, self.period)
+
+
+class MACD:
+    __slots__ = ("macd", "signal", "_fast", "_slow", "_signal")
+
+    def __init__(self, fast_period: int, slow_period: int, signal_period: int):
+        self.macd = NAN
+        self.signal = NAN
+        self._fast = EMA(fast_period)
+        self._slow = EMA(slow_period)
+        self._signal = EMA(signal_period)
+
+    def update(self, close: float) -> tuple:
+        """(macd, signal)"""
+        self.macd = self._fast.update(close) - self._slow.update(close)
+        self.signal = self._signal.update(self.macd)
+        return self.macd, self.signal
+
+    def warmup(self, close: np.ndarray) -> tuple:
+        """(macd array, signal array)"""
+        macd = self._fast.warmup(close) - self._slow.warmup(close)
+        signal = self._signal.warmup(macd)
+        self.macd, self.signal = float(macd[-1]) if len(macd) > 0 else NAN, self._signal.value
+        return macd, signal
+
+
+class _Extreme(abc.ABC):
+    __slots__ = ("period", "value", "_window", "_count")
+
+    def __init__(self, period: int):
+        if period < 1:
+            raise ValueError(f"period must be positive, got {period}.")
+        self.period = period
+        self.value = NAN
+        self._window = deque()  # (bar number, value), values monotonic from the extreme
+        self._count = 0
+
+    @abc.abstractmethod
+    def _dominates(self, new: float, old: float) -> bool:
+        """Whether `new` evicts `old` from the window"""
+
+    def update(self, x: float) -> float:
+        if x != x:
+            return self.value
+        window = self._window
+        while len(window) > 0 and self._dominates(x, window[-1][1]):
+            window.pop()
+        window.append((self._count, x))
+        if window[0][0] <= self._count - self.period:
+            window.popleft()
+        self._count += 1
+        if self._count >= self.period:
+            self.value = window[0][1]
+        return self.value
+
+    @abc.abstractmethod
+    def _batch(self, x: np.ndarray) -> np.ndarray:
+        """Vectorized values of `x`, as `src.fastpath`"""
+
+    def warmup(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        out = self._batch(x)
+        valid = x[~np.isnan(x)]
+        self.__init__(self.period)
+        # only the last `period` values can still be in the window
+        self._count = max(len(valid) - self.period, 0)
+        for value in valid[-self.period :].tolist():
+            self.update(value)
+        return out
+
+
+class Highest(_Extreme):
+    __slots__ = ()
+
+    def _dominates(self, new: float, old: float) -> bool:
+        return new >= old
+
+    def _batch(self, x: np.ndarray) -> np.ndarray:
+        return fastpath.highest(x, self.period)
+
+
+class Lowest(_Extreme):
+    __slots__ = ()
+
+    def _dominates(self, new: float, old: float) -> bool:
+        return new <= old
+
+    def _batch(self, x: np.ndarray) -> np.ndarray:
+        return fastpath.lowest(x, self.period)
+
+
+class CrossOver:
+    __slots__ = ("value", "_nzd")
+
+    def __init__(self):
+        self.value = NAN
+        self._nzd = NAN  # last non-zero a - b, or the first difference
+
+    def update(self, a: float, b: float) -> float:
+        diff = a - b
+        if diff != diff:
+            return self.value
+        if self._nzd == self._nzd:
+            self.value = 1.0 if self._nzd < 0.0 and a > b else -1.0 if self._nzd > 0.0 and a < b else 0.0
+        if diff != 0.0 or self._nzd != self._nzd:
+            self._nzd = diff
+        return self.value
+
+    def warmup(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+        out = fastpath.crossover(a, b)
+        diff = a - b
+        diff = diff[~np.isnan(diff)]
+        self.__init__()
+        if len(diff) > 0:
+            nonzero = diff[diff != 0.0]
+            self._nzd = float(nonzero[-1]) if len(nonzero) > 0 else float(diff[0])
+            self.value = float(out[-1])
+        return out
+
+
+class StrategyIndicators:
+    """Indicators and latched signal of MyStrategy: 1 long, -1 short, 0 none"""
+
+    __slots__ = (
+        "params",
+        "sma",
+        "macd",
+        "rsi",
+        "rsi_ma",
+        "recent_high",
+        "recent_low",
+        "macd_crossover",
+        "rsi_crossover",
+        "had_macd_cross",
+        "signal",
+    )
+
+    def __init__(self, params: dict = None):
+        p = {**fastpath.DEFAULT_PARAMS, **(params or {})}
+        self.params = p
+        self.sma = SMA(p["ma_period"])
+        self.macd = MACD(p["macd_fast_period"], p["macd_slow_period"], p["macd_signal_period"])
+        self.rsi = RSI(p["rsi_period"])
+        self.rsi_ma = SMA(p["rsi_ma_period"])
+        self.recent_high = Highest(p["high_low_period"])
+        self.recent_low = Lowest(p["high_low_period"])
+        self.macd_crossover = CrossOver()
+        self.rsi_crossover = CrossOver()
+        self.had_macd_cross = 0
+        self.signal = 0
+
+    def values(self) -> dict:
+        return {
+            "sma": self.sma.value,
+            "macd": self.macd.macd,
+            "macd_signal": self.macd.signal,
+            "rsi": self.rsi.value,
+            "rsi_ma": self.rsi_ma.value,
+            "recent_high": self.recent_high.value,
+            "recent_low": self.recent_low.value,
+            "macd_crossover": self.macd_crossover.value,
+            "rsi_crossover": self.rsi_crossover.value,
+        }
+
+    def update(self, high: float, low: float, close: float) -> int:
+        """Feed one bar, return the signal"""
+        self.sma.update(close)
+        macd, macd_signal = self.macd.update(close)
+        rsi = self.rsi.update(close)
+        rsi_ma = self.rsi_ma.update(rsi)
+        self.recent_high.update(high)
+        self.recent_low.update(low)
+        macd_crossover = self.macd_crossover.update(macd, macd_signal)
+        rsi_crossover = self.rsi_crossover.update(rsi, rsi_ma)
+
+        # as MyStrategy, the signal starts once every indicator is valid
+        values = (macd_signal, rsi_ma, self.sma.value, self.recent_high.value, macd_crossover, rsi_crossover)
+        if any(value != value for value in values):
+            return self.signal
+        if macd_crossover != 0:
+            self.had_macd_cross = int(macd_crossover)
+        if self.had_macd_cross == 1:
+            self.signal = 1 if rsi_crossover == 1 and close > self.sma.value else 0
+        elif self.had_macd_cross == -1:
+            self.signal = -1 if rsi_crossover == -1 and close < self.sma.value else 0
+        return self.signal
+
+    def warmup(self, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+        """Feed a history, return the signal array"""
+        close = np.asarray(close, dtype=np.float64)
+        indicators = {"sma": self.sma.warmup(close)}
+        indicators["macd"], indicators["macd_signal"] = self.macd.warmup(close)
+        indicators["rsi"] = self.rsi.warmup(close)
+        indicators["rsi_ma"] = self.rsi_ma.warmup(indicators["rsi"])
+        indicators["recent_high"] = self.recent_high.warmup(high)
+        indicators["recent_low"] = self.recent_low.warmup(low)
+        indicators["macd_crossover"] = self.macd_crossover.warmup(indicators["macd"], indicators["macd_signal"])
+        indicators["rsi_crossover"] = self.rsi_crossover.warmup(indicators["rsi"], indicators["rsi_ma"])
+
+        first, signal = fastpath.compute_signal(close, indicators)
+        crosses = indicators["macd_crossover"][first:]
+        crosses = crosses[crosses != 0]
+        self.had_macd_cross = int(crosses[-1]) if len(crosses) > 0 else 0
+        self.signal = int(signal[-1]) if len(signal) > 0 else 0
+        return signal
@@ -0,0 +1,138 @@
+"""
+Columnar recorder of executed orders
+
+`TradeRecorder` keeps the rows of `MyStrategy.trade_log` in typed NumPy columns, preallocated and doubled when full:
+    datetime            int64 epoch ns of the bar, naive UTC
+    trade_num           int64
+    type                int8, 0 open / 1 close
+    direction           int8, 1 buy / -1 sell
+    last_close_price, created_price, executed_price, stop_lose_price, take_profit_price
+                        float64, one (5, capacity) array
+
+Recording a row only writes numbers. `to_frame` and `to_arrow` wrap the filled part of the columns without copying
+the numeric data, `to_parquet` writes the Arrow table. `to_records` rebuilds the former list of dicts, with
+"%Y-%m-%d %H:%M:%S" datetimes, "open" / "close" and "BUY" / "SELL", for the code reading `trade_log`.
+
+Usage:
+    recorder = strategy.trades
+    recorder.to_parquet("trade_log.parquet")
+    df = recorder.to_frame()
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+TRADE_CAPACITY = 1024
+OPEN, CLOSE = 0, 1
+TYPE_NAMES = ["open", "close"]
+DIRECTION_NAMES = {1: "BUY", -1: "SELL"}
+PRICE_COLS = ["last_close_price", "created_price", "executed_price", "stop_lose_price", "take_profit_price"]
+COLUMNS = ["datetime", "trade_num", "type", "direction"] + PRICE_COLS
+
+# backtrader date numbers count days from 0001-01-01 as day 1, 1970-01-01 is day 719163
+EPOCH_NUM = 719163.0
+
+
+def num_to_ns(num: float) -> int:
+    """Epoch ns of a backtrader date number, rounded to ms (date numbers are exact to ~10 us)"""
+    return int(round((num - EPOCH_NUM) * 86400e3)) * 1_000_000
+
+
+class TradeRecorder:
+    def __init__(self, capacity: int = TRADE_CAPACITY):
+        self.n = 0
+        self.datetime = np.empty(capacity, dtype=np.int64)
+        self.trade_num = np.empty(capacity, dtype=np.int64)
+        self.type = np.empty(capacity, dtype=np.int8)
+        self.direction = np.empty(capacity, dtype=np.int8)
+        self.prices = np.empty((len(PRICE_COLS), capacity), dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.datetime)
+        for name in ["datetime", "trade_num", "type", "direction"]:
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.n] = column[: self.n]
+            setattr(self, name, grown)
+        prices = np.empty((len(PRICE_COLS), capacity), dtype=np.float64)
+        prices[:, : self.n] = self.prices[:, : self.n]
+        self.prices = prices
+
+    def append(
+        self,
+        dt: float,
+        trade_num: int,
+        type_: int,
+        direction: int,
+        last_close_price: float,
+        created_price: float,
+        executed_price: float,
+        stop_lose_price: float = np.nan,
+        take_profit_price: float = np.nan,
+    ) -> None:
+        """Record an executed order at the backtrader date number `dt`"""
+        if self.n == len(self.datetime):
+            self._grow()
+        i = self.n
+        self.datetime[i] = num_to_ns(dt)
+        self.trade_num[i] = trade_num
+        self.type[i] = type_
+        self.direction[i] = direction
+        self.prices[:, i] = (last_close_price, created_price, executed_price, stop_lose_price, take_profit_price)
+        self.n += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        """Filled rows as a DataFrame, the numeric columns are views of the recorder arrays"""
+        n = self.n
+        frames = [
+            pd.DataFrame(
+                {
+                    "datetime": self.datetime[:n].view("datetime64[ns]"),
+                    "trade_num": self.trade_num[:n],
+                    "type": pd.Categorical.from_codes(self.type[:n], TYPE_NAMES),
+                    "direction": pd.Categorical.from_codes((self.direction[:n] < 0).view(np.int8), ["BUY", "SELL"]),
+                },
+                copy=False,
+            ),
+            pd.DataFrame(self.prices[:, :n].T, columns=PRICE_COLS, copy=False),
+        ]
+        return pd.concat(frames, axis=1, copy=False)
+
+    def to_arrow(self) -> pa.Table:
+        n = self.n
+        columns = {
+            "datetime": pa.array(self.datetime[:n].view("datetime64[ns]")),
+            "trade_num": pa.array(self.trade_num[:n]),
+            "type": pa.DictionaryArray.from_arrays(pa.array(self.type[:n]), TYPE_NAMES),
+            "direction": pa.DictionaryArray.from_arrays(
+                pa.array((self.direction[:n] < 0).view(np.int8)), ["BUY", "SELL"]
+            ),
+        }
+        columns.update({col: pa.array(self.prices[j, :n]) for j, col in enumerate(PRICE_COLS)})
+        return pa.table(columns)
+
+    def to_parquet(self, path: str, compression: str = "zstd") -> None:
+        pq.write_table(self.to_arrow(), path, compression=compression)
+
+    def to_records(self) -> list:
+        """Rows as the former `MyStrategy.trade_log` list of dicts"""
+        n = self.n
+        datetimes = pd.DatetimeIndex(self.datetime[:n].view("datetime64[ns]")).strftime("%Y-%m-%d %H:%M:%S")
+        prices = [self.prices[j, :n].tolist() for j in range(len(PRICE_COLS))]
+        return [
+            {
+                "datetime": dt,
+                "trade_num": trade_num,
+                "type": TYPE_NAMES[type_],
+                "direction": DIRECTION_NAMES[direction],
+                **{col: prices[j][i] for j, col in enumerate(PRICE_COLS)},
+            }
+            for i, (dt, trade_num, type_, direction) in enumerate(
+                zip(datetimes, self.trade_num[:n].tolist(), self.type[:n].tolist(), self.direction[:n].tolist())
+            )
+        ]
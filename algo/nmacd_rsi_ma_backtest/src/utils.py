@@ -1,5 +1,11 @@
+import os
 import logging
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.defs import BROKER
 
 # logger
 LOGGING_FORMAT = "[%(filename)s:%(lineno)s - %(funcName)s()] %(message)s"
@@ -8,38 +14,195 @@ logging.basicConfig(format=LOGGING_FORMAT, level=LOGGING_LEVEL)
 logger = logging.getLogger(__name__)
 
 
-def load_oanda_parquet(file: str, start_time: str = None, end_time: str = None) -> pd.DataFrame:
-    """Load saved OANDA parquest"""
+INPUT_COLS = ["time", "volume", "bid_o", "bid_h", "bid_l", "bid_c", "ask_o", "ask_h", "ask_l", "ask_c"]
+PRICE_DTYPES = {"float64": np.float64, "float32": np.float32, "ticks": np.int32}
 
-    INPUT_COLS = ["time", "volume", "bid_o", "bid_h", "bid_l", "bid_c", "ask_o", "ask_h", "ask_l", "ask_c"]
 
-    df = pd.read_parquet(file)
+def _to_filter_timestamp(t: str, tz) -> pd.Timestamp:
+    """Convert a time bound to a timestamp comparable with the stored `time` column"""
+    ts = pd.Timestamp(t)
+    if tz is None:
+        return ts.tz_localize(None) if ts.tz is not None else ts
+    return ts.tz_localize(tz) if ts.tz is None else ts.tz_convert(tz)
 
-    # verify columns
-    missing_cols = [c for c in INPUT_COLS if c not in df.columns]
-    if len(missing_cols) > 0:
-        raise LookupError(f"Missing columns: {missing_cols}.")
 
-    df["datetime"] = pd.to_datetime(df["time"])
+def _time_filters(schema: pa.Schema, start_time: str = None, end_time: str = None) -> list:
+    """Build pyarrow filters on the `time` column, so row groups outside the range are skipped"""
+    time_type = schema.field("time").type
+    tz = time_type.tz if pa.types.is_timestamp(time_type) else None
 
+    filters = []
     if start_time is not None:
-        df = df[df["datetime"] >= start_time].reset_index(drop=True)
+        filters.append(("time", ">=", _to_filter_timestamp(start_time, tz)))
     if end_time is not None:
-        df = df[df["datetime"] < end_time].reset_index(drop=True)
+        filters.append(("time", "<", _to_filter_timestamp(end_time, tz)))
+    return filters
+
+
+def _read_oanda_table(
+    file: str, start_time: str = None, end_time: str = None, instrument: str = None, granularity: str = None
+) -> pa.Table:
+    """Read `INPUT_COLS` in [start_time, end_time) from a parquet file or a `MarketDataStore` root"""
+    store = None
+    if os.path.isdir(file):
+        from src.store import MarketDataStore
+
+        if instrument is None or granularity is None:
+            raise ValueError("instrument and granularity are required to load from a data store.")
+        store = MarketDataStore(file)
+        paths = store.paths(instrument, granularity, start_time, end_time)
+        if len(paths) == 0:
+            raise LookupError(f"No data stored for {instrument} {granularity} from {start_time} to {end_time}.")
+        schema = pq.read_schema(paths[0])
+    else:
+        schema = pq.read_schema(file)
+
+    # verify columns from the file footer, before reading any data
+    missing_cols = [c for c in INPUT_COLS if c not in schema.names]
+    if len(missing_cols) > 0:
+        raise LookupError(f"Missing columns: {missing_cols}.")
+
+    filters = _time_filters(schema, start_time, end_time)
+    if store is not None:
+        return store.read(instrument, granularity, columns=INPUT_COLS, filters=filters, paths=paths)
+    return pq.read_table(file, columns=INPUT_COLS, filters=filters or None)
+
+
+def mid_prices(bid: np.ndarray, ask: np.ndarray, dtype: str, digits: int = None) -> np.ndarray:
+    """Mid prices of bid / ask arrays as `dtype` of `PRICE_DTYPES`, "ticks" in half ticks of `digits`"""
+    if dtype == "ticks":
+        # in half ticks, the sum of the bid and ask ticks
+        return (np.rint(bid * 10**digits) + np.rint(ask * 10**digits)).astype(PRICE_DTYPES[dtype])
+    return ((bid + ask) / 2).astype(PRICE_DTYPES[dtype], copy=False)
+
+
+def _side_prices(prices: np.ndarray, dtype: str, digits: int = None) -> np.ndarray:
+    if dtype == "ticks":
+        return (np.rint(prices * 10**digits) * 2).astype(PRICE_DTYPES[dtype])
+    return prices.astype(PRICE_DTYPES[dtype], copy=False)
+
+
+def _bar_columns(columns: dict, bid_ask: bool, dtype: str, digits: int = None) -> dict:
+    """Mid OHLC, then bid and ask OHLC if `bid_ask`, then volume, each converted to `dtype` as it is built"""
+    if dtype == "ticks":
+        limit = np.iinfo(PRICE_DTYPES[dtype]).max / (2 * 10**digits)
+        overflow = [c for c, v in columns.items() if c != "volume" and len(v) > 0 and np.abs(v).max() >= limit]
+        if len(overflow) > 0:
+            raise ValueError(f"Prices of {overflow} overflow int32 half ticks at {digits} digits.")
 
     # use mid prices as OHLC
-    df["open"] = (df["bid_o"] + df["ask_o"]) / 2
-    df["high"] = (df["bid_h"] + df["ask_h"]) / 2
-    df["low"] = (df["bid_l"] + df["ask_l"]) / 2
-    df["close"] = (df["bid_c"] + df["ask_c"]) / 2
+    data = {}
+    for k, field in zip("ohlc", ["open", "high", "low", "close"]):
+        data[field] = mid_prices(columns[f"bid_{k}"], columns[f"ask_{k}"], dtype, digits)
+    if bid_ask:
+        for side in ["bid", "ask"]:
+            for k, field in zip("ohlc", ["open", "high", "low", "close"]):
+                data[f"{side}_{field}"] = _side_prices(columns[f"{side}_{k}"], dtype, digits)
+
+    data["volume"] = columns["volume"] if dtype == "float64" else columns["volume"].astype(np.int32)
+    return data
+
+
+def load_oanda_parquet(
+    file: str,
+    start_time: str = None,
+    end_time: str = None,
+    instrument: str = None,
+    granularity: str = None,
+    validate: bool = True,
+    repair: bool = False,
+    bid_ask: bool = False,
+    dtype: str = "float64",
+    digits: int = None,
+) -> pd.DataFrame:
+    """Load saved OANDA parquest
+
+    `file` is either a single parquet file or the root of a `MarketDataStore`, in which case `instrument` and
+    `granularity` select the partitions. Only `INPUT_COLS` are read, and the [start_time, end_time) range is
+    pushed down to the parquet reader.
+
+    With `validate`, bad bars are flagged and summarized in the log, see `src.validation`. With `repair`, the
+    flagged bars (except gaps) are dropped.
+
+    With `bid_ask`, the bid and ask OHLC are kept as `bid_open` ... `ask_close` next to the mid OHLC, for
+    `src.feeds.BidAskPandasData` and `src.broker.BidAskBroker`.
+
+    `dtype` selects a compact representation for long histories, decoded by the `src.feeds` data feeds:
+        "float64": float64 prices, volume as stored
+        "float32": float32 prices and int32 volume. A price p is off by at most p * 2**-24 (6.6e-8, or 0.007 pip,
+            for EUR_USD at 1.1), enough to move a price derived from it by one tick when rounded to `digits`
+        "ticks": int32 prices in half ticks, 1 / (2 * 10**digits), and int32 volume. Exact for quotes with at most
+            `digits` decimals, mid prices included. `df.attrs["price_scale"]` is the number of half ticks in 1.0.
+            `digits` defaults to `BROKER.PRICE_DIGITS[instrument]`
+    """
+    if dtype not in PRICE_DTYPES:
+        raise ValueError(f"Unknown dtype: {dtype}, expected one of {list(PRICE_DTYPES)}.")
+    if dtype == "ticks" and digits is None:
+        if instrument not in BROKER.PRICE_DIGITS:
+            raise ValueError(f"digits is required for dtype ticks, no PRICE_DIGITS for instrument {instrument}.")
+        digits = BROKER.PRICE_DIGITS[instrument]
 
-    cols = ["datetime", "open", "high", "low", "close", "volume"]
-    df = df[cols].copy()
-    logger.debug(f"Loaded data has {len(df)} rows, from {df['datetime'].min()} to {df['datetime'].max()}.")
+    table = _read_oanda_table(file, start_time, end_time, instrument, granularity)
+    columns = {c: table[c].to_numpy() for c in INPUT_COLS if c != "time"}
+    index = pd.DatetimeIndex(table["time"].to_pandas(), name="datetime")
 
-    df = df.set_index("datetime", verify_integrity=True)
+    if validate or repair:
+        from src.validation import validate_bars, repair_mask, log_report
+
+        flags, report = validate_bars(index, columns)
+        if repair:
+            keep = repair_mask(flags)
+            log_report(report, len(index), dropped=len(index) - int(keep.sum()))
+            index = index[keep]
+            columns = {c: v[keep] for c, v in columns.items()}
+        else:
+            log_report(report, len(index))
+
+    data = _bar_columns(columns, bid_ask, dtype, digits)
+    del table, columns
+    df = pd.DataFrame(data, index=index, copy=False)
+    if dtype == "ticks":
+        df.attrs["price_scale"] = 2 * 10**digits
+    logger.debug(f"Loaded data has {len(df)} rows, from {df.index.min()} to {df.index.max()}.")
+
+    if not df.index.is_unique:
+        raise ValueError(f"Index has duplicate keys: {df.index[df.index.duplicated()].unique().tolist()}")
 
     return df
 
 
+def _bar_field(col: str) -> str:
+    """open / high / low / close / volume part of a bar column name, e.g. "high" for "ask_high" """
+    return col.rsplit("_", 1)[-1]
+
+
+def resample_bars(df: pd.DataFrame, minutes: int) -> pd.DataFrame:
+    """Aggregate the bars of `load_oanda_parquet` into bars of `minutes`, labelled by their open time
+
+    Works on every column layout and dtype of the loader, bid / ask and compact dtypes included. Periods without
+    bars are skipped, as in `cerebro.replaydata`.
+    """
+    period = df.index.floor(f"{minutes}min")
+    starts = np.flatnonzero(np.r_[True, period.asi8[1:] != period.asi8[:-1]]) if len(df) > 0 else np.array([], int)
+    ends = np.r_[starts[1:], len(df)]
+
+    data = {}
+    for col in df.columns:
+        values = df[col].to_numpy()
+        field = _bar_field(col)
+        if len(starts) == 0:
+            data[col] = values[:0]
+        elif field == "open":
+            data[col] = values[starts]
+        elif field == "close":
+            data[col] = values[ends - 1]
+        elif field == "high":
+            data[col] = np.maximum.reduceat(values, starts)
+        elif field == "low":
+            data[col] = np.minimum.reduceat(values, starts)
+        else:
+            data[col] = np.add.reduceat(values, starts).astype(values.dtype, copy=False)
 
+    bars = pd.DataFrame(data, index=period[starts], copy=False)
+    bars.attrs.update(df.attrs)
+    return bars
@@ -0,0 +1,137 @@
+"""
+Data quality validation of OANDA bid/ask bars
+
+All checks are vectorized over the raw columns, so validation stays on by default in `load_oanda_parquet`:
+    crossed: bid above ask on any of o/h/l/c
+    high_low: high below low, or open/close outside [low, high], on the bid or ask side
+    zero_volume: bars without ticks
+    weekend: bars inside the FX weekend close, Friday 17:00 to Sunday 17:00 New York time
+    spike: isolated mid close jumps that revert on the next bar, beyond `spike_k` robust deviations
+    gap: bars missing inside the trading week (flagged on the bar after the gap, never repaired)
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.utils import logger
+
+FX_TIMEZONE = "US/Eastern"
+FX_WEEKEND_CLOSE_HOUR = 17  # Friday close and Sunday open, New York time
+SPIKE_K = 12.0
+
+REPAIRABLE_CHECKS = ["crossed", "high_low", "zero_volume", "weekend", "spike"]
+
+
+def _to_fx_time(index: pd.DatetimeIndex) -> pd.DatetimeIndex:
+    """Bar times in New York time, naive times are read as UTC"""
+    if index.tz is None:
+        index = index.tz_localize("UTC")
+    return index.tz_convert(FX_TIMEZONE)
+
+
+def _weekend_mask(local: pd.DatetimeIndex) -> np.ndarray:
+    weekday = local.dayofweek.to_numpy()
+    hour = local.hour.to_numpy()
+    return (
+        (weekday == 5)
+        | ((weekday == 4) & (hour >= FX_WEEKEND_CLOSE_HOUR))
+        | ((weekday == 6) & (hour < FX_WEEKEND_CLOSE_HOUR))
+    )
+
+
+def _spike_mask(close: np.ndarray, spike_k: float) -> np.ndarray:
+    """Bars whose log return and the next bar's log return are both extreme and of opposite sign"""
+    mask = np.zeros(len(close), dtype=bool)
+    if len(close) < 3:
+        return mask
+
+    ret = np.diff(np.log(close))
+    med = np.median(ret)
+    mad = np.median(np.abs(ret - med)) * 1.4826  # robust standard deviation
+    if mad == 0:
+        return mask
+
+    extreme = np.abs(ret - med) > spike_k * mad
+    reverts = extreme[:-1] & extreme[1:] & (np.sign(ret[:-1]) != np.sign(ret[1:]))
+    mask[1:-1] = reverts
+    return mask
+
+
+def _gap_mask(local: pd.DatetimeIndex, step_ns: int = None) -> np.ndarray:
+    """Bars preceded by missing bars, ignoring the weekend close"""
+    mask = np.zeros(len(local), dtype=bool)
+    if len(local) < 2:
+        return mask
+
+    dt = np.diff(local.asi8)
+    if step_ns is None:
+        step_ns = int(np.median(dt))
+
+    weekday = local.dayofweek.to_numpy()
+    # a jump from Friday/Saturday to Sunday/Monday spans the weekend close
+    spans_weekend = (
+        ((weekday[:-1] == 4) | (weekday[:-1] == 5))
+        & ((weekday[1:] == 6) | (weekday[1:] == 0))
+        & (dt < 4 * 86400 * 10**9)
+    )
+    mask[1:] = (dt > step_ns) & ~spans_weekend
+    return mask
+
+
+def validate_bars(index: pd.DatetimeIndex, columns: dict, step_ns: int = None, spike_k: float = SPIKE_K) -> tuple:
+    """Flag bad bars
+
+    index: bar times
+    columns: numpy arrays of `volume`, `bid_o` ... `bid_c`, `ask_o` ... `ask_c`
+    step_ns: bar interval in ns, inferred from the median time difference if None
+
+    Returns (flags, report), flags is {check: boolean array}, report is {check: number of flagged bars}.
+    """
+    bid = [columns[f"bid_{k}"] for k in "ohlc"]
+    ask = [columns[f"ask_{k}"] for k in "ohlc"]
+
+    crossed = np.zeros(len(index), dtype=bool)
+    for b, a in zip(bid, ask):
+        crossed |= b > a
+
+    high_low = np.zeros(len(index), dtype=bool)
+    for o, h, l, c in (bid, ask):
+        high_low |= (h < l) | (o > h) | (o < l) | (c > h) | (c < l)
+
+    mid_close = (bid[3] + ask[3]) / 2
+    local = _to_fx_time(index)
+
+    flags = {
+        "crossed": crossed,
+        "high_low": high_low,
+        "zero_volume": columns["volume"] <= 0,
+        "weekend": _weekend_mask(local),
+        "spike": _spike_mask(mid_close, spike_k),
+        "gap": _gap_mask(local, step_ns),
+    }
+    report = {check: int(mask.sum()) for check, mask in flags.items()}
+    return flags, report
+
+
+def repair_mask(flags: dict) -> np.ndarray:
+    """Rows to keep after dropping every bar flagged by a repairable check"""
+    keep = np.ones(len(flags["crossed"]), dtype=bool)
+    for check in REPAIRABLE_CHECKS:
+        keep &= ~flags[check]
+    return keep
+
+
+def log_report(report: dict, n_bars: int, dropped: int = None) -> None:
+    """Warn of repairable issues left in the bars, report dropped bars, the rest at debug level
+
+    dropped: bars removed by `repair_mask`, None if the bars were not repaired
+    """
+    issues = {check: n for check, n in report.items() if n > 0}
+    if len(issues) == 0:
+        logger.debug(f"Validated {n_bars} bars, no issue found.")
+    elif dropped is not None and dropped > 0:
+        logger.info(f"Validated {n_bars} bars, flagged: {issues}, dropped {dropped} bars.")
+    elif dropped is None and any(check in REPAIRABLE_CHECKS for check in issues):
+        logger.warning(f"Validated {n_bars} bars, flagged: {issues}.")
+    else:
+        logger.debug(f"Validated {n_bars} bars, flagged: {issues}.")
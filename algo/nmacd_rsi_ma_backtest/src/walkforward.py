@@ -0,0 +1,220 @@
+"""
+Walk-forward optimization of MyStrategy
+
+History is split into rolling windows of `train` in-sample bars followed by `test` out-of-sample bars, moved by
+`step` (default `test`). For every window, all param sets run on the in-sample bars and the best one by `metric`
+runs on the out-of-sample bars, after a `warmup` of earlier bars that only feeds the indicators (MyStrategy
+`trade_start`). The out-of-sample equity curves are chained into one curve starting at `cash`.
+
+All runs of all windows share one process pool whose workers open the memory-mapped bar cache once (see
+`src.optimize`). In-sample runs are queued window by window, and the out-of-sample run of a window is queued ahead
+of them as soon as its last in-sample run finishes, so windows overlap and the pool never idles between them.
+
+Usage:
+    python -m src.walkforward --data oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz --train 6D --test 2D \
+        --warmup 4D --intrabar --grid '{"rrr": [1, 1.5, 2], "sl_pct": [0.5, 1]}' --output walkforward.csv
+"""
+
+import os
+import argparse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+from src.utils import logger
+from src.cache import open_bars
+from src.optimize import (
+    CASH,
+    RESULT_COLS,
+    is_valid,
+    sweep_settings,
+    worker_pool,
+    run_task,
+    add_sweep_arguments,
+    param_sets_from_args,
+    sweep_kwargs_from_args,
+)
+
+METRICS = ["final_value", "return_pct", "sharpe"]
+
+
+def walk_forward_windows(start, end, train: str, test: str, step: str = None) -> list:
+    """Rolling (train_start, test_start, test_end) windows over [start, end), the last test window is cut at `end`
+
+    train, test, step: pandas time deltas, e.g. "90D", `step` defaults to `test`
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    train, test = pd.Timedelta(train), pd.Timedelta(test)
+    step = pd.Timedelta(step) if step is not None else test
+    if min(train, test, step) <= pd.Timedelta(0):
+        raise ValueError("train, test and step must be positive.")
+
+    windows = []
+    train_start = start
+    while train_start + train < end:
+        test_start = train_start + train
+        windows.append((train_start, test_start, min(test_start + test, end)))
+        train_start += step
+    return windows
+
+
+def _naive_utc(t: pd.Timestamp) -> pd.Timestamp:
+    """Bar time as backtrader sees it, naive UTC"""
+    return t.tz_convert("UTC").tz_localize(None) if t.tz is not None else t
+
+
+def _score(row: dict, metric: str) -> float:
+    value = row.get(metric) if row["error"] is None else None
+    return -np.inf if value is None or np.isnan(value) else value
+
+
+def chain_equity(curves: list, cash: float = CASH) -> pd.Series:
+    """Out-of-sample equity curves, each starting at `cash`, chained into one compounded curve"""
+    level, parts = 1.0, []
+    for curve in curves:
+        if len(curve) == 0:
+            continue
+        parts.append(curve / cash * level)
+        level *= curve.iloc[-1] / cash
+    return pd.concat(parts) * cash if len(parts) > 0 else pd.Series(dtype=float)
+
+
+def walk_forward(
+    file: str,
+    param_sets: list,
+    train: str,
+    test: str,
+    step: str = None,
+    warmup: str = "7D",
+    metric: str = "final_value",
+    max_workers: int = None,
+    **kwargs,
+) -> tuple:
+    """Walk-forward optimization of MyStrategy over the bars of `file`
+
+    param_sets: candidate params, the invalid ones are dropped
+    train, test, step: window sizes, see `walk_forward_windows`
+    warmup: bars before each test window run without trading, to warm up the indicators
+    metric: result column maximized in-sample, e.g. "final_value" or "sharpe"
+    kwargs: arguments of `src.optimize.sweep_settings`. With `engine="fastpath"` only the in-sample runs use the fast
+        path, out-of-sample runs need the equity curve from backtrader.
+
+    Returns (one row per window: window bounds, best params, in-sample metric, out-of-sample results;
+    chained out-of-sample equity curve).
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, must be one of {METRICS}.")
+    param_sets = [params for params in param_sets if is_valid(params)]
+    if len(param_sets) == 0:
+        raise ValueError("No valid param sets.")
+
+    cache_path, settings = sweep_settings(file, **kwargs)
+    index = open_bars(cache_path).index
+    if len(index) == 0:
+        raise LookupError(f"No bars in {file}.")
+    windows = walk_forward_windows(index[0], index[-1] + pd.Timedelta(1, "ns"), train, test, step)
+    logger.info(f"Walking forward over {len(windows)} windows x {len(param_sets)} parameter sets.")
+
+    warmup = pd.Timedelta(warmup)
+    best = [None] * len(windows)
+    remaining = [len(param_sets)] * len(windows)
+    results = [None] * len(windows)
+    errors = [None] * len(windows)
+    in_sample = ((i, params) for i in range(len(windows)) for params in param_sets)
+    out_of_sample = deque()
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with worker_pool(cache_path, settings, max_workers) as executor:
+        pending = {}
+        while True:
+            # keep two tasks per worker in flight, out-of-sample runs first
+            while len(pending) < 2 * max_workers:
+                if len(out_of_sample) > 0:
+                    i = out_of_sample.popleft()
+                    _, test_start, test_end = windows[i]
+                    window = (max(test_start - warmup, index[0]), test_end)
+                    trade_start = _naive_utc(test_start).to_pydatetime()
+                    future = executor.submit(run_task, best[i][0], window, True, trade_start)
+                    pending[future] = ("test", i)
+                    continue
+                task = next(in_sample, None)
+                if task is None:
+                    break
+                i, params = task
+                train_start, test_start, _ = windows[i]
+                pending[executor.submit(run_task, params, (train_start, test_start))] = ("train", i)
+            if len(pending) == 0:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, i = pending.pop(future)
+                row = future.result()
+                if kind == "test":
+                    results[i] = row
+                    logger.info(f"Window {i + 1}/{len(windows)} out-of-sample value {row['final_value']}.")
+                    continue
+
+                if row["error"] is not None:
+                    errors[i] = row["error"]
+                score = _score(row, metric)
+                if score > -np.inf and (best[i] is None or score > best[i][1]):
+                    best[i] = ({name: row[name] for name in param_sets[0]}, score)
+                remaining[i] -= 1
+                if remaining[i] == 0:
+                    if best[i] is not None:
+                        out_of_sample.append(i)
+                    else:
+                        logger.warning(f"Window {i + 1}/{len(windows)} has no successful in-sample run: {errors[i]}")
+
+    rows, curves = [], []
+    for i, (train_start, test_start, test_end) in enumerate(windows):
+        row = {"train_start": train_start, "test_start": test_start, "test_end": test_end}
+        if best[i] is not None:
+            row.update(best[i][0])
+            row[f"train_{metric}"] = best[i][1]
+        if results[i] is not None:
+            equity = results[i].pop("equity", None)
+            row.update({f"test_{col}": results[i][col] for col in RESULT_COLS})
+            if equity is not None:
+                curves.append(equity[equity.index >= _naive_utc(test_start)])
+        rows.append(row)
+
+    return pd.DataFrame(rows), chain_equity(curves, settings["cash"])
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description="Walk-forward optimization of MyStrategy.")
+    add_sweep_arguments(parser)
+    parser.add_argument("--train", required=True, help="in-sample window, e.g. 90D")
+    parser.add_argument("--test", required=True, help="out-of-sample window, e.g. 30D")
+    parser.add_argument("--step", help="window step, default --test")
+    parser.add_argument("--warmup", default="7D", help="indicator warm-up before each out-of-sample window")
+    parser.add_argument("--metric", default="final_value", choices=METRICS)
+    parser.add_argument("--output", help="csv file of the windows")
+    parser.add_argument("--equity-output", help="csv file of the chained out-of-sample equity")
+    args = parser.parse_args(argv)
+
+    windows, equity = walk_forward(
+        args.data,
+        param_sets_from_args(args),
+        train=args.train,
+        test=args.test,
+        step=args.step,
+        warmup=args.warmup,
+        metric=args.metric,
+        **sweep_kwargs_from_args(args),
+    )
+    if args.output is not None:
+        windows.to_csv(args.output, index=False)
+    if args.equity_output is not None:
+        equity.rename("value").to_csv(args.equity_output, index_label="datetime")
+    print(windows.to_string(index=False))
+    if len(equity) > 0:
+        print(f"Out-of-sample: {equity.iloc[0]:.2f} -> {equity.iloc[-1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Fill prices of `BidAskBroker` and `IntrabarBroker` on hand-built bars
+
+Usage:
+    python -m pytest tests/test_broker.py
+"""
+
+import pandas as pd
+import pytest
+import backtrader as bt
+
+from src.utils import resample_bars
+from src.feeds import BidAskPandasData, IntrabarPandasData
+from src.broker import BidAskBroker, IntrabarBroker
+
+HALF_SPREAD = 0.0001
+START = "2022-12-20"  # a Tuesday
+# mid open, high, low, close of the H1 bars of the bid / ask cases, the orders are placed at the close of bar 0
+MID_BARS = [
+    (1.1000, 1.1000, 1.1000, 1.1000),
+    (1.1010, 1.1050, 1.0950, 1.1000),
+    (1.1000, 1.1000, 1.1000, 1.1000),
+]
+
+
+class ScriptedOrders(bt.Strategy):
+    """Places `orders` at the close of bar 0 and records every fill and cancellation"""
+
+    params = (("orders", ()), ("bracket", None))
+
+    def __init__(self):
+        self.events = []
+
+    def next(self):
+        if len(self) != 1:
+            return
+        for side, exectype, price in self.p.orders:
+            getattr(self, side)(size=1, exectype=exectype, price=price)
+        if self.p.bracket is not None:
+            side, stop_price, limit_price = self.p.bracket
+            getattr(self, f"{side}_bracket")(
+                size=1,
+                exectype=bt.Order.Market,
+                stopprice=stop_price,
+                stopexec=bt.Order.Stop,
+                limitprice=limit_price,
+                limitexec=bt.Order.Limit,
+            )
+
+    def notify_order(self, order):
+        name = bt.Order.ExecTypes[order.exectype]
+        if order.status == order.Completed:
+            self.events.append((name, "BUY" if order.isbuy() else "SELL", round(order.executed.price, 5)))
+        elif order.status == order.Canceled:
+            self.events.append((name, "canceled"))
+
+
+def bid_ask_bars(mid_bars: list) -> pd.DataFrame:
+    """H1 bars with a bid / ask `HALF_SPREAD` below / above the mid prices"""
+    index = pd.date_range(START, periods=len(mid_bars), freq="H", tz="UTC", name="datetime")
+    mid = pd.DataFrame(mid_bars, index=index, columns=["open", "high", "low", "close"])
+    df = mid.copy()
+    for side, offset in [("bid", -HALF_SPREAD), ("ask", HALF_SPREAD)]:
+        for col in mid.columns:
+            df[f"{side}_{col}"] = mid[col] + offset
+    df["volume"] = 10
+    return df
+
+
+def run(data, broker, **params) -> list:
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.setbroker(broker)
+    cerebro.broker.setcash(1000)
+    cerebro.adddata(data)
+    cerebro.addstrategy(ScriptedOrders, **params)
+    return cerebro.run()[0].events
+
+
+def run_bid_ask(orders: list) -> list:
+    return run(BidAskPandasData(dataname=bid_ask_bars(MID_BARS)), BidAskBroker(), orders=orders)
+
+
+@pytest.mark.parametrize(
+    "order, fill",
+    [
+        (("buy", bt.Order.Market, None), 1.1011),  # ask open
+        (("sell", bt.Order.Market, None), 1.1009),  # bid open
+        (("buy", bt.Order.Stop, 1.1040), 1.1040),  # ask high 1.1051 through the stop
+        (("buy", bt.Order.Stop, 1.1005), 1.1011),  # ask opens above the stop
+        (("sell", bt.Order.Stop, 1.0960), 1.0960),  # bid low 1.0949 through the stop
+        (("buy", bt.Order.Limit, 1.0960), 1.0960),  # ask low 1.0951 below the limit
+        (("buy", bt.Order.Limit, 1.1020), 1.1011),  # ask opens below the limit
+        (("sell", bt.Order.Limit, 1.1040), 1.1040),  # bid high 1.1049 above the limit
+        (("sell", bt.Order.Limit, 1.1000), 1.1009),  # bid opens above the limit
+    ],
+)
+def test_bid_ask_fill_prices(order, fill):
+    side, exectype, _ = order
+    assert run_bid_ask([order]) == [(bt.Order.ExecTypes[exectype], side.upper(), fill)]
+
+
+@pytest.mark.parametrize(
+    "order",
+    [
+        ("buy", bt.Order.Stop, 1.1050),  # mid high touches, ask high 1.1051 too
+        ("sell", bt.Order.Stop, 1.0950),
+        ("buy", bt.Order.Limit, 1.0950),  # mid low touches, ask low 1.0951 does not
+        ("sell", bt.Order.Limit, 1.1050),  # mid high touches, bid high 1.1049 does not
+    ],
+)
+def test_bid_ask_side_decides_the_touch(order):
+    side, exectype, price = order
+    events = run_bid_ask([order])
+    if exectype == bt.Order.Stop:
+        assert events == [("Stop", side.upper(), price)]
+    else:
+        assert events == []
+
+
+def intrabar_data(touches: dict) -> IntrabarPandasData:
+    """H1 bars of flat M1 bars at 1.1000, with the M1 bars of `touches` {minute of hour 1: (o, h, l, c)}"""
+    index = pd.date_range(START, periods=180, freq="min", tz="UTC", name="datetime")
+    m1 = pd.DataFrame(1.1000, index=index, columns=["open", "high", "low", "close"])
+    for minute, bar in touches.items():
+        m1.iloc[60 + minute] = bar
+    m1["volume"] = 1
+    return IntrabarPandasData(dataname=resample_bars(m1, 60), intrabar=m1)
+
+
+SL, TP = 1.0980, 1.1020
+# M1 bars touching the long stop-loss / take-profit, the short take-profit / stop-loss
+DIP, SPIKE = (1.1000, 1.1000, 1.0970, 1.1000), (1.1000, 1.1030, 1.1000, 1.1000)
+
+
+@pytest.mark.parametrize(
+    "touches, exit_",
+    [
+        ({10: SPIKE, 20: DIP}, ("Limit", "SELL", TP)),
+        ({10: DIP, 20: SPIKE}, ("Stop", "SELL", SL)),
+        ({10: (1.1000, 1.1030, 1.0970, 1.1000)}, ("Stop", "SELL", SL)),  # both in one M1 bar, the stop first
+        ({10: (1.0950, 1.0960, 1.0940, 1.0950)}, ("Stop", "SELL", 1.0950)),  # gap through the stop, at the open
+        ({0: DIP, 5: SPIKE}, ("Limit", "SELL", TP)),  # the children are active after the entry M1 bar
+    ],
+)
+def test_intrabar_first_touch_of_a_long_bracket(touches, exit_):
+    events = run(intrabar_data(touches), IntrabarBroker(), bracket=("buy", SL, TP))
+    assert events[0] == ("Market", "BUY", 1.1000)
+    assert exit_ in events
+    canceled = "Limit" if exit_[0] == "Stop" else "Stop"
+    assert (canceled, "canceled") in events and len(events) == 3
+
+
+def test_intrabar_short_bracket():
+    events = run(
+        intrabar_data({10: DIP, 20: SPIKE}),
+        IntrabarBroker(),
+        bracket=("sell", 1.1020, 1.0980),
+    )
+    assert events[:2] == [("Market", "SELL", 1.1000), ("Limit", "BUY", 1.0980)]
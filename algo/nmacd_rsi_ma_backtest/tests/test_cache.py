@@ -0,0 +1,58 @@
+"""
+Keys of the memory-mapped bar cache over a `MarketDataStore`
+
+Usage:
+    python -m pytest tests/test_cache.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.store import MarketDataStore
+from src.cache import bar_cache_path, open_bars, source_files
+
+
+def candles(start: str, periods: int) -> pd.DataFrame:
+    """M1 OANDA candles with bid / ask columns, from `start` UTC"""
+    times = pd.date_range(start, periods=periods, freq="min", tz="UTC")
+    bid = 1.1 + np.arange(periods) * 1e-5
+    df = pd.DataFrame({"time": times, "volume": 10, "complete": True})
+    for side, price in [("bid", bid), ("ask", bid + 2e-5)]:
+        for col in "ohlc":
+            df[f"{side}_{col}"] = price
+    return df
+
+
+@pytest.fixture
+def store(tmp_path) -> MarketDataStore:
+    store = MarketDataStore(str(tmp_path / "data"))
+    store.write(candles("2022-11-30 23:00", 60), "EUR_USD", "M1")
+    return store
+
+
+def _cache_path(store: MarketDataStore, start: str, end: str, cache_dir: str) -> str:
+    return bar_cache_path(store.root, start, end, instrument="EUR_USD", granularity="M1", cache_dir=cache_dir)
+
+
+def test_source_files_of_a_range(store):
+    store.write(candles("2022-12-01", 60), "EUR_USD", "M1")
+    assert len(source_files(store.root, "EUR_USD", "M1")) == 2
+    assert source_files(store.root, "EUR_USD", "M1", "2022-11-01", "2022-12-01") == [
+        store.partition_path("EUR_USD/M1/2022/11")
+    ]
+
+
+def test_appending_a_month_keeps_the_cached_ranges_before(store, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    november = _cache_path(store, "2022-11-01", "2022-12-01", cache_dir)
+
+    store.write(candles("2022-12-01", 60), "EUR_USD", "M1")
+    assert _cache_path(store, "2022-11-01", "2022-12-01", cache_dir) == november
+
+    both = _cache_path(store, "2022-11-01", "2023-01-01", cache_dir)
+    assert both != november and len(open_bars(both)) == 120
+
+    # rewriting a month read by the range invalidates it
+    store.write(candles("2022-11-30 23:59", 1), "EUR_USD", "M1")
+    assert _cache_path(store, "2022-11-01", "2022-12-01", cache_dir) != november
@@ -0,0 +1,155 @@
+"""
+`CandleDownloader` against a local fake OANDA candles endpoint
+
+Usage:
+    python -m pytest tests/test_downloader.py
+"""
+
+import os
+import json
+import threading
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import requests
+
+from src.downloader import (
+    BAR_COUNT_LIMIT,
+    CandleDownloader,
+    incomplete_chunk_path,
+    merge_chunks_to_file,
+    retry_after_seconds,
+    split_chunks,
+)
+
+START = pd.Timestamp("2022-01-03", tz="UTC")
+N_CHUNKS = 3
+END = START + pd.Timedelta(minutes=N_CHUNKS * BAR_COUNT_LIMIT)
+
+
+class FakeOanda:
+    """M1 candles of every requested range, with scripted failures per chunk `from`"""
+
+    def __init__(self):
+        self.requests = []  # `from` of every request
+        self.failures = {}  # from -> [(status, headers)] returned before the page, in order
+        self.broken = set()  # from -> HTTP 400, not retried
+        self.incomplete_after = None  # unix seconds, bars from then on are incomplete
+        self.lock = threading.Lock()
+
+    def page(self, from_unix: int, to_unix: int) -> bytes:
+        times = pd.date_range(
+            pd.Timestamp(from_unix, unit="s", tz="UTC"), periods=(to_unix - from_unix) // 60, freq="min"
+        )
+        prices = 1.1 + np.arange(len(times)) * 1e-5
+        candles = [
+            {
+                "time": t.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"),
+                "complete": self.incomplete_after is None or t.timestamp() < self.incomplete_after,
+                "volume": 10,
+                "bid": {k: f"{p:.5f}" for k in "ohlc"},
+                "ask": {k: f"{p + 2e-5:.5f}" for k in "ohlc"},
+            }
+            for t, p in zip(times, prices)
+        ]
+        return json.dumps({"instrument": "EUR_USD", "granularity": "M1", "candles": candles}).encode()
+
+    def respond(self, query: dict) -> tuple:
+        from_unix, to_unix = int(query["from"][0]), int(query["to"][0])
+        with self.lock:
+            self.requests.append(from_unix)
+            if from_unix in self.broken:
+                return 400, {}, b'{"errorMessage": "broken"}'
+            failures = self.failures.get(from_unix, [])
+            if len(failures) > 0:
+                status, headers = failures.pop(0)
+                return status, headers, b"{}"
+        return 200, {"Content-Type": "application/json"}, self.page(from_unix, to_unix)
+
+
+@pytest.fixture
+def oanda():
+    fake = FakeOanda()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            assert url.path == "/v3/instruments/EUR_USD/candles"
+            status, headers, body = fake.respond(parse_qs(url.query))
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def _downloader(url: str) -> CandleDownloader:
+    return CandleDownloader("token", base_url=url, max_workers=2, max_retries=3, backoff=0.01, timeout=5)
+
+
+def _chunk_starts() -> list:
+    return [start for start, _ in split_chunks(int(START.timestamp()), int(END.timestamp()), "M1")]
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("2") == 2.0
+    assert retry_after_seconds(format_datetime(datetime.now(timezone.utc) - timedelta(minutes=1), usegmt=True)) == 0
+    assert 25 < retry_after_seconds(format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True))
+    assert retry_after_seconds("soon") is None
+
+
+def test_retries_and_resume_after_crash(oanda, tmp_path):
+    first, second, third = _chunk_starts()
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(seconds=5), usegmt=True)
+    oanda.failures = {first: [(429, {"Retry-After": past}), (429, {"Retry-After": "0"})], second: [(503, {})]}
+    oanda.broken = {third}
+
+    chunk_dir = str(tmp_path / "chunks")
+    with pytest.raises(requests.HTTPError):
+        _downloader(oanda.url).download("EUR_USD", "M1", START, END, chunk_dir)
+    assert oanda.requests.count(first) == 3 and oanda.requests.count(second) == 2
+    assert len(os.listdir(chunk_dir)) == 2  # the chunks fetched before the crash are checkpointed
+
+    oanda.requests, oanda.broken = [], set()
+    paths = _downloader(oanda.url).download("EUR_USD", "M1", START, END, chunk_dir)
+    assert oanda.requests == [third]
+
+    output = str(tmp_path / "merged.parquet")
+    assert merge_chunks_to_file(paths, output) == N_CHUNKS * BAR_COUNT_LIMIT
+    times = pq.read_table(output)["time"].to_numpy()
+    assert times[0] == START.tz_localize(None).to_datetime64() and np.all(np.diff(times) == np.timedelta64(1, "m"))
+
+
+def test_incomplete_chunk_is_fetched_again(oanda, tmp_path):
+    last = _chunk_starts()[-1]
+    oanda.incomplete_after = END.timestamp() - 60
+
+    chunk_dir = str(tmp_path / "chunks")
+    paths = _downloader(oanda.url).download("EUR_USD", "M1", START, END, chunk_dir)
+    assert paths[-1] == incomplete_chunk_path(os.path.join(chunk_dir, f"{last}_{int(END.timestamp())}.parquet"))
+    assert not pq.read_table(paths[-1])["complete"].to_numpy()[-1]
+
+    oanda.requests, oanda.incomplete_after = [], None
+    paths = _downloader(oanda.url).download("EUR_USD", "M1", START, END, chunk_dir)
+    assert oanda.requests == [last]
+    assert all(os.path.exists(path) and ".incomplete" not in path for path in paths)
+    assert not os.path.exists(incomplete_chunk_path(paths[-1]))
+    assert pq.read_table(paths[-1])["complete"].to_numpy().all()
@@ -0,0 +1,90 @@
+"""
+`EventLog` ring buffer, levels, sinks and exports, and the event log of a MyStrategy run
+
+Usage:
+    python -m pytest tests/test_events.py
+"""
+
+import numpy as np
+import pandas as pd
+import backtrader as bt
+
+from src.events import DEBUG, INFO, WARNING, EventLog, format_event
+from src.utils import load_oanda_parquet
+from src.strategy import MyStrategy
+from src.feeds import FastPandasData
+
+DATA_FILE = "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz"
+
+
+def _dt(hour: int) -> float:
+    return bt.date2num(pd.Timestamp("2022-12-19") + pd.Timedelta(hours=hour))
+
+
+def test_ring_buffer_wraps_around():
+    events = EventLog(capacity=4)
+    for i in range(10):
+        events.message(_dt(i), f"message {i}")
+    assert events.count == 10 and len(events) == 4
+
+    texts = [record[-1] for record in events.iter_records()]
+    assert texts == ["message 6", "message 7", "message 8", "message 9"]
+    df = events.to_frame()
+    assert df["text"].tolist() == texts
+    assert df["datetime"].tolist() == [pd.Timestamp("2022-12-19") + pd.Timedelta(hours=h) for h in range(6, 10)]
+
+
+def test_ring_buffer_below_and_at_capacity():
+    events = EventLog(capacity=3)
+    assert len(events) == 0 and len(events.to_frame()) == 0
+    for i in range(3):
+        events.message(np.nan, f"message {i}")
+    assert [record[-1] for record in events.iter_records()] == ["message 0", "message 1", "message 2"]
+    assert events.to_frame()["datetime"].isna().all()
+
+
+def test_levels_and_sinks():
+    events = EventLog(level=INFO, capacity=2)
+    printed, warnings = [], []
+    events.add_sink(printed.append)
+    events.add_sink(warnings.append, level=WARNING)
+
+    events.message(_dt(0), "debug", DEBUG)  # below the log level, not recorded
+    events.message(_dt(0), "info")
+    events.message(_dt(1), "warning", WARNING)
+    events.message(_dt(2), "info again")
+
+    assert events.count == 3
+    assert [record[-1] for record in printed] == ["info", "warning", "info again"]  # overwritten ones included
+    assert [record[-1] for record in warnings] == ["warning"]
+    assert format_event(printed[0]) == "[2022-12-19 00:00:00] info"
+
+
+def test_strategy_events(tmp_path, capsys):
+    events = EventLog()
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(1000)
+    cerebro.adddata(FastPandasData(dataname=load_oanda_parquet(DATA_FILE, validate=False)))
+    cerebro.addstrategy(MyStrategy, event_log=events, verbose=True)
+    strategy = cerebro.run()[0]
+    assert capsys.readouterr().out == ""  # a given log keeps the sinks of the caller
+
+    df = events.to_frame()
+    assert df["kind"].iloc[0] == "start" and df["kind"].iloc[-1] == "stop"
+    assert (df["kind"] == "trade").sum() == len(strategy.trade_log) // 2
+
+    path = str(tmp_path / "events.parquet")
+    events.to_parquet(path)
+    assert len(pd.read_parquet(path)) == len(df)
+
+
+def test_verbose_strategy_prints_its_own_log(capsys):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(1000)
+    cerebro.adddata(FastPandasData(dataname=load_oanda_parquet(DATA_FILE, validate=False)))
+    cerebro.addstrategy(MyStrategy, verbose=True)
+    strategy = cerebro.run()[0]
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("STRATEGY START") and "STRATEGY COMPLETE" in lines[-1]
+    assert sum("CLOSED" in line for line in lines) == len(strategy.trade_log) // 2
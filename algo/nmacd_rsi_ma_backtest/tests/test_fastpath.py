@@ -0,0 +1,39 @@
+"""
+Parity of `src.fastpath.run_fastpath` with MyStrategy in backtrader on the bundled EUR_USD files
+
+Usage:
+    python -m pytest tests/test_fastpath.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils import load_oanda_parquet
+from src.fastpath import run_fastpath, run_backtrader, parity_param_sets
+
+DATA_FILES = [
+    "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz",
+    "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz",
+]
+PARAM_SETS = parity_param_sets(samples=5, seed=0)
+
+
+@pytest.fixture(scope="module", params=DATA_FILES)
+def bars(request) -> pd.DataFrame:
+    return load_oanda_parquet(request.param, validate=False)
+
+
+@pytest.mark.parametrize("params", PARAM_SETS, ids=[str(i) for i in range(len(PARAM_SETS))])
+def test_same_trades_and_final_value(bars, params):
+    with np.errstate(all="ignore"):
+        try:
+            expected = run_backtrader(bars, params)
+        except Exception as e:  # e.g. a zero stop distance, the fast path must fail the same way
+            with pytest.raises(type(e)):
+                run_fastpath(bars, params)
+            return
+        result = run_fastpath(bars, params)
+
+    pd.testing.assert_frame_equal(pd.DataFrame(result["trade_log"]), pd.DataFrame(expected["trade_log"]))
+    assert result["final_value"] == expected["final_value"]
@@ -0,0 +1,104 @@
+"""
+Monte Carlo paths: R multiples, seed and worker count invariance, hand-computed paths
+
+Usage:
+    python -m pytest tests/test_montecarlo.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.montecarlo import r_multiples, r_multiples_from_pnl, monte_carlo, summarize
+
+R = np.array([2.0, -1.0, -1.0, 1.5, -1.0, 3.0, -1.0, 0.5])
+
+
+def test_r_multiples_of_a_trade_log():
+    trade_log = [
+        {
+            "trade_num": 1,
+            "type": "open",
+            "direction": "BUY",
+            "last_close_price": 1.10,
+            "executed_price": 1.10,
+            "stop_lose_price": 1.09,
+        },
+        {
+            "trade_num": 1,
+            "type": "close",
+            "direction": "SELL",
+            "last_close_price": 1.10,
+            "executed_price": 1.12,
+            "stop_lose_price": np.nan,
+        },
+        {
+            "trade_num": 2,
+            "type": "open",
+            "direction": "SELL",
+            "last_close_price": 1.12,
+            "executed_price": 1.12,
+            "stop_lose_price": 1.13,
+        },
+        {
+            "trade_num": 2,
+            "type": "close",
+            "direction": "BUY",
+            "last_close_price": 1.12,
+            "executed_price": 1.13,
+            "stop_lose_price": np.nan,
+        },
+        {
+            "trade_num": 3,
+            "type": "open",
+            "direction": "BUY",
+            "last_close_price": 1.13,
+            "executed_price": 1.13,
+            "stop_lose_price": 1.12,
+        },  # still open at the end, dropped
+    ]
+    r = r_multiples(trade_log, commission=0.0)
+    np.testing.assert_allclose(r, [2.0, -1.0])
+    np.testing.assert_allclose(r_multiples(pd.DataFrame(trade_log), commission=0.001), [2.0 - 0.222, -1.0 - 0.225])
+    assert len(r_multiples([])) == 0
+
+
+def test_r_multiples_from_pnl():
+    np.testing.assert_allclose(r_multiples_from_pnl([20.0, -10.2], cash=1000, sl_pct=1), [2.0, -1.0])
+    with pytest.raises(ValueError):
+        r_multiples_from_pnl([-1000.0, 10.0])
+
+
+@pytest.mark.parametrize("method", ["bootstrap", "block", "shuffle"])
+def test_same_seed_same_paths_whatever_the_workers(method):
+    # a chunk of 8 paths of 8 trades, 4 chunks
+    kwargs = dict(sl_pct=2, n_paths=32, method=method, block=3, seed=7, max_chunk_bytes=24 * 8 * 8)
+    single = monte_carlo(R, max_workers=1, **kwargs)
+    pd.testing.assert_frame_equal(monte_carlo(R, max_workers=1, **kwargs), single)
+    pd.testing.assert_frame_equal(monte_carlo(R, max_workers=3, **kwargs), single)
+    assert not monte_carlo(R, max_workers=1, **{**kwargs, "seed": 8}).equals(single)
+
+
+def test_hand_computed_paths():
+    paths = monte_carlo(np.array([1.0]), sl_pct=1, n_paths=3, n_trades=5, seed=0, max_workers=1)
+    np.testing.assert_allclose(paths["final_equity"], 1000 * 1.01**5)
+    assert (paths["max_drawdown"] == 0).all() and not paths["ruined"].any()
+
+    # every shuffled path ends at the same equity, the drawdowns depend on the order
+    paths = monte_carlo(R, sl_pct=1, n_paths=200, method="shuffle", seed=0, max_workers=1)
+    np.testing.assert_allclose(paths["final_equity"], 1000 * np.prod(1 + R / 100))
+    assert paths["max_drawdown"].nunique() > 1
+
+    # a trade losing more than the equity ruins the account
+    paths = monte_carlo(np.array([-200.0]), sl_pct=1, n_paths=2, seed=0, max_workers=1)
+    assert paths["ruined"].all() and (paths["final_equity"] == 0).all()
+    assert summarize(paths)["risk_of_ruin"] == 1.0
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        monte_carlo(R, method="jackknife")
+    with pytest.raises(ValueError):
+        monte_carlo(R, method="shuffle", n_trades=len(R) + 1)
+    with pytest.raises(ValueError):
+        monte_carlo(np.array([]))
@@ -0,0 +1,48 @@
+"""
+Fast path sweep workers on M1 bars resampled to H1, sharing an `IndicatorCache`
+
+Usage:
+    python -m pytest tests/test_optimize.py
+"""
+
+import pytest
+
+from src import optimize
+from src.utils import resample_bars
+from src.fastpath import run_fastpath
+
+DATA_FILE = "oanda_EUR_USD_M1_2022-12-19_2022-12-31.parquet.gz"
+RISK_PARAMS = [{"rrr": rrr, "sl_pct": sl_pct} for rrr in [1, 1.5, 2] for sl_pct in [1, 2]]
+
+
+@pytest.fixture
+def worker(tmp_path):
+    cache_path, settings = optimize.sweep_settings(
+        DATA_FILE, compression=60, engine="fastpath", cache_dir=str(tmp_path / "bars")
+    )
+    optimize._init_worker(cache_path, settings)
+    yield optimize._worker
+    optimize._worker.clear()
+
+
+def test_bars_are_resampled_once_per_worker(worker):
+    bars = resample_bars(worker["df"], 60)
+    assert worker["bars"].equals(bars)
+    assert worker["fingerprint"].endswith("_60")
+
+    row = optimize.run_task(RISK_PARAMS[0])
+    assert row["error"] is None
+    assert row["final_value"] == run_fastpath(bars, RISK_PARAMS[0])["final_value"]
+
+
+def test_risk_sweep_computes_indicators_once(worker):
+    optimize.run_task(RISK_PARAMS[0])
+    cache = worker["indicators"]
+    misses = cache.misses
+
+    rows = [optimize.run_task(params) for params in RISK_PARAMS[1:]]
+    assert all(row["error"] is None for row in rows)
+    assert cache.misses == misses and cache.hits > 0
+
+    optimize.run_task({**RISK_PARAMS[0], "rsi_period": 14})
+    assert cache.misses > misses
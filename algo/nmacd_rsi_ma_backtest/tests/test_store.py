@@ -0,0 +1,84 @@
+"""
+`MarketDataStore` partitions, and loading ranges from a store or a single file
+
+Usage:
+    python -m pytest tests/test_store.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.store import MarketDataStore
+from src.utils import load_oanda_parquet
+
+
+def candles(start: str, periods: int, complete: bool = True) -> pd.DataFrame:
+    """M1 OANDA candles with bid / ask columns, from `start` UTC"""
+    times = pd.date_range(start, periods=periods, freq="min", tz="UTC")
+    bid = 1.1 + np.arange(periods) * 1e-5
+    df = pd.DataFrame({"time": times, "volume": 10, "complete": complete})
+    for side, price in [("bid", bid), ("ask", bid + 2e-5)]:
+        for col in "ohlc":
+            df[f"{side}_{col}"] = price
+    return df
+
+
+@pytest.fixture
+def store(tmp_path) -> MarketDataStore:
+    store = MarketDataStore(str(tmp_path / "data"))
+    # two months: 2022-11-30 23:00 to 2022-12-01 00:59
+    store.write(candles("2022-11-30 23:00", 120), "EUR_USD", "M1")
+    return store
+
+
+def test_write_partitions_by_month(store):
+    assert sorted(store.manifest["partitions"]) == ["EUR_USD/M1/2022/11", "EUR_USD/M1/2022/12"]
+    november = store.manifest["partitions"]["EUR_USD/M1/2022/11"]
+    assert november["rows"] == 60 and november["end"] == "2022-11-30T23:59:00+00:00"
+    assert [e["key"] for e in store.partitions("EUR_USD", "M1", "2022-12-01")] == ["EUR_USD/M1/2022/12"]
+    assert MarketDataStore(store.root).manifest == store.manifest
+
+
+def test_write_merges_and_keeps_other_months(store):
+    november_path = store.partition_path("EUR_USD/M1/2022/11")
+    mtime = os.stat(november_path).st_mtime_ns
+
+    update = candles("2022-12-01 00:30", 60, complete=False)
+    update["bid_c"] = 2.0
+    assert store.write(update, "EUR_USD", "M1") == ["EUR_USD/M1/2022/12"]
+    assert os.stat(november_path).st_mtime_ns == mtime
+
+    december = store.read("EUR_USD", "M1", paths=[store.partition_path("EUR_USD/M1/2022/12")]).to_pandas()
+    assert len(december) == 90 and december["time"].is_unique
+    assert (december["bid_c"].iloc[30:] == 2.0).all()  # the incoming row wins
+    assert store.last_complete_time("EUR_USD", "M1") == pd.Timestamp("2022-12-01 00:29", tz="UTC")
+
+
+def test_load_a_range_reads_the_overlapping_months(store):
+    df = load_oanda_parquet(store.root, "2022-11-30 23:30", "2022-12-01 00:30", "EUR_USD", "M1", validate=False)
+    assert len(df) == 60
+    assert df.index[0] == pd.Timestamp("2022-11-30 23:30", tz="UTC")
+
+
+def test_empty_range_of_a_store_raises(store):
+    with pytest.raises(LookupError):
+        load_oanda_parquet(store.root, "2023-01-01", "2023-02-01", "EUR_USD", "M1")
+    with pytest.raises(LookupError):
+        store.read("USD_JPY", "M1")
+    with pytest.raises(ValueError):
+        load_oanda_parquet(store.root)  # instrument and granularity are required
+
+
+def test_empty_range_of_a_file_is_an_empty_frame(tmp_path):
+    path = str(tmp_path / "oanda_EUR_USD_M1_2022-11-30_2022-12-01.parquet")
+    candles("2022-11-30 23:00", 120).to_parquet(path)
+    df = load_oanda_parquet(path, "2023-01-01", "2023-02-01", validate=False)
+    assert len(df) == 0 and list(df.columns) == ["open", "high", "low", "close", "volume"]
+
+    store = MarketDataStore(str(tmp_path / "data"))
+    assert store.import_parquet(path) == ["EUR_USD/M1/2022/11", "EUR_USD/M1/2022/12"]
+    with pytest.raises(ValueError):
+        store.import_parquet(str(tmp_path / "bars.parquet"))
@@ -0,0 +1,96 @@
+"""
+`TradeRecorder` growth and exports, and `MyStrategy.trade_log` compatibility with the former list of dicts
+
+Usage:
+    python -m pytest tests/test_trades.py
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import backtrader as bt
+
+from src.trades import OPEN, CLOSE, COLUMNS, TradeRecorder
+from src.utils import load_oanda_parquet
+from src.strategy import MyStrategy
+from src.feeds import FastPandasData
+
+DATA_FILE = "oanda_EUR_USD_H1_2022-12-19_2022-12-31.parquet.gz"
+
+
+def _record(recorder: TradeRecorder, n_trades: int) -> None:
+    for i in range(n_trades):
+        dt = bt.date2num(pd.Timestamp("2022-12-19") + pd.Timedelta(hours=2 * i))
+        recorder.append(dt, i + 1, OPEN, 1, 1.1 + i, 1.1 + i, 1.1001 + i, 1.09 + i, 1.12 + i)
+        recorder.append(dt + 1 / 24, i + 1, CLOSE, -1, 1.1 + i, 1.12 + i, 1.12 + i)
+
+
+def test_grows_past_its_capacity():
+    recorder = TradeRecorder(capacity=2)
+    _record(recorder, 5)
+    assert len(recorder) == 10 and len(recorder.datetime) == 16
+
+    df = recorder.to_frame()
+    assert list(df.columns) == COLUMNS
+    assert df["trade_num"].tolist() == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert df["type"].tolist() == ["open", "close"] * 5
+    assert df["direction"].tolist() == ["BUY", "SELL"] * 5
+    assert df["datetime"].iloc[-1] == pd.Timestamp("2022-12-19 09:00")
+    assert df["executed_price"].iloc[-2] == 1.1001 + 4
+    assert df["stop_lose_price"].iloc[1::2].isna().all()
+
+
+def test_exports_agree(tmp_path):
+    recorder = TradeRecorder(capacity=3)
+    _record(recorder, 3)
+    path = str(tmp_path / "trades.parquet")
+    recorder.to_parquet(path)
+
+    df = recorder.to_frame()
+    table = pq.read_table(path).to_pandas()
+    pd.testing.assert_frame_equal(table, df, check_categorical=False)
+
+    records = recorder.to_records()
+    assert records[0]["datetime"] == "2022-12-19 00:00:00"
+    expected = df.drop(columns="datetime").astype({"type": object, "direction": object})
+    assert pd.DataFrame(records).drop(columns="datetime").equals(expected)
+
+
+class LegacyTradeLog(MyStrategy):
+    """MyStrategy also recording executed orders as the former `trade_log` list of dicts"""
+
+    def __init__(self):
+        super(LegacyTradeLog, self).__init__()
+        self.legacy_log = []
+
+    def notify_order(self, order):
+        opened = not self.is_trade_open
+        super(LegacyTradeLog, self).notify_order(order)
+        if order.status != order.Completed:
+            return
+        self.legacy_log.append(
+            {
+                "datetime": self.data.datetime.datetime(0).strftime("%Y-%m-%d %H:%M:%S"),
+                "trade_num": self.trade_num,
+                "type": "open" if opened else "close",
+                "direction": "BUY" if order.isbuy() else "SELL",
+                "last_close_price": self.close_price,
+                "created_price": order.created.price,
+                "executed_price": order.executed.price,
+                "stop_lose_price": self.stop_loss if opened else np.nan,
+                "take_profit_price": self.take_profit if opened else np.nan,
+            }
+        )
+
+
+def test_trade_log_matches_the_former_list_of_dicts():
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.broker.setcash(1000)
+    cerebro.broker.setcommission(commission=0.000075, commtype=bt.CommInfoBase.COMM_PERC, percabs=True, leverage=50)
+    cerebro.adddata(FastPandasData(dataname=load_oanda_parquet(DATA_FILE, validate=False)))
+    cerebro.addstrategy(LegacyTradeLog, verbose=False)
+    strategy = cerebro.run()[0]
+
+    assert len(strategy.legacy_log) > 0
+    assert [list(row) for row in strategy.trade_log] == [list(row) for row in strategy.legacy_log]  # key order
+    assert pd.DataFrame(strategy.trade_log).equals(pd.DataFrame(strategy.legacy_log))